@@ -1,30 +1,96 @@
+import importlib
 import os
-from flask import Flask
-from config import PLUGINS_DIR, DATABASE_PATH, UPLOAD_FOLDER, LAYOUT_JSON, SECRET_KEY
+from . import startup_profile
+
+with startup_profile.step("import", "app core modules"):
+    from flask import Flask
+    from functools import partial
+    from config import (PLUGINS_DIR, DATABASE_PATH, UPLOAD_FOLDER, LAYOUT_JSON, SECRET_KEY, SHARED_CACHE_PATH,
+                        BASE_DIR, VELIKA_MONTAZA_DB_PATH, ACTUAL_HOURS_DB_PATH, METRICS_ENABLED, SLOW_REQUEST_MS,
+                        SSE_MAX_STREAMS, EVENTS_POLL_WAIT)
+    from .db import register_snapshot_database, init_velika_montaza_db, open_database
+    from .schema import ensure_database_indexes, master_schema_current
+    from .purchase_eta import ensure_eta_index
+    from .extensions import db, shared_cache
+    from .shared_cache import invalidate_for_change
+    from .data_version import add_listener
+    from . import project_snapshot, metrics
+
+# Every module defines `bp`; registered in this order.
+# Heavy modules (ORM, time calculation, allocation) are imported by the views on first use.
+BLUEPRINT_MODULES = (
+    'auth',
+    'views_core',
+    'views_layout',
+    'views_project',
+    'views_photos',
+    'views_admin',
+    'views_plugins',
+    'views_plugins_ui',
+    'views_parts',
+    'views_timetable',
+    'views_events',
+)
 
 def create_app():
     # We rename 'app' to 'flask_app' here to avoid shadowing issues
     flask_app = Flask(__name__, template_folder="../", static_folder="../")
-    
+
     flask_app.config["SECRET_KEY"] = SECRET_KEY
+    flask_app.config["APP_ROOT"] = BASE_DIR
     flask_app.config["PLUGINS_DIR"] = PLUGINS_DIR
     flask_app.config["DATABASE_PATH"] = DATABASE_PATH
+    flask_app.config["VELIKA_MONTAZA_DB_PATH"] = VELIKA_MONTAZA_DB_PATH
+    flask_app.config["ACTUAL_HOURS_DB_PATH"] = ACTUAL_HOURS_DB_PATH
     flask_app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
     flask_app.config["LAYOUT_JSON"] = LAYOUT_JSON
-    
+    flask_app.config["LAYOUT_DATA_FILE_PATH"] = LAYOUT_JSON
+    flask_app.config["SHARED_CACHE_PATH"] = SHARED_CACHE_PATH
+    flask_app.config["METRICS_ENABLED"] = METRICS_ENABLED
+    flask_app.config["SLOW_REQUEST_MS"] = SLOW_REQUEST_MS
+    flask_app.config["SSE_MAX_STREAMS"] = SSE_MAX_STREAMS
+    flask_app.config["EVENTS_POLL_WAIT"] = EVENTS_POLL_WAIT
+    # ERP tables come from master_unified.db; users and notes from velika_montaza.db
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DATABASE_PATH}"
+    flask_app.config["SQLALCHEMY_BINDS"] = {"velika_montaza": f"sqlite:///{VELIKA_MONTAZA_DB_PATH}"}
+
+    with startup_profile.step("init", "extensions"):
+        db.init_app(flask_app)  # imports SQLAlchemy; modules that only import app.extensions don't, see extensions.py
+        shared_cache.init_app(flask_app)
+        add_listener(partial(invalidate_for_change, shared_cache))
+        # Registered after the cache listener: drop the stale snapshot first, then rebuild it
+        project_snapshot.init_app(flask_app)
+        add_listener(project_snapshot.on_data_change)
+        metrics.init_app(flask_app)
+
+    # master_unified.db is replaced wholesale by erp_import; see db.register_snapshot_database
+    register_snapshot_database(DATABASE_PATH)
+    # The ERP export ships without indexes; see schema.py and check_query_plans.py.
+    # Runs only when a read-only check finds something missing (imports build both)
+    with startup_profile.step("init", "master schema check"):
+        master_current = master_schema_current(DATABASE_PATH)
+    if not master_current:
+        with startup_profile.step("init", "master indexes"):
+            ensure_database_indexes(DATABASE_PATH)
+        with startup_profile.step("init", "purchase ETA index"):
+            ensure_eta_index(DATABASE_PATH)
+
     # FIX: Define the PLUGINS_STATE_FILE path explicitly
     # This points to 'plugins_state.json' in the main folder (one level up from this file)
     flask_app.config["PLUGINS_STATE_FILE"] = os.path.join(os.path.dirname(os.path.dirname(__file__)), "plugins_state.json")
 
     # We import views here using the app context
     with flask_app.app_context():
-        import app.views_core
-        import app.views_layout
-        import app.views_project
-        import app.views_admin
-        import app.views_plugins
-        import app.views_plugins_ui
-        import app.views_parts
-        import app.views_timetable
-
-    return flask_app
\ No newline at end of file
+        # Runs only when velika_montaza.db's user_version is behind the schema
+        with startup_profile.step("init", "velika_montaza schema"):
+            init_velika_montaza_db()
+        # Before anything computes the data version: a first connection switches the file to WAL
+        with startup_profile.step("init", "velika_montaza connection"):
+            open_database(VELIKA_MONTAZA_DB_PATH)
+        for name in BLUEPRINT_MODULES:
+            with startup_profile.step("import", f"app.{name}"):
+                module = importlib.import_module(f"app.{name}")
+            with startup_profile.step("blueprint", module.bp.name):
+                flask_app.register_blueprint(module.bp)
+
+    return flask_app
@@ -0,0 +1,486 @@
+# app/actual_hours.py
+"""
+Materialized actual hours.
+
+actual_hours.db keeps the computed seconds per worker-day/DNI plus the
+per-DNI and per-worker+DNI sums, and the planned (allocated nominal) hours
+per project and day, so readers -- the DNI and project endpoints, the
+snapshots and the planning board -- do lookups instead of rerunning
+calculate_actual_time_totals over time_entries. refresh() brings the tables up to
+date incrementally: it diffs time_entries rows against a ledger of processed
+Time Entry GUIDs and recalculates only the worker-days the changed entries
+touch. Which rows it diffs depends on what happened to master_unified.db
+since the last run (see refresh).
+
+The tables are derived data, so they live in their own file that the data
+version doesn't watch: a refresh never changes ETags or sends SSE events.
+Refreshes run after imports (import_erp.py), from the snapshot worker's ERP
+poll and, when a reader finds the tables behind, in a background thread;
+readers never refresh inline (see ensure_fresh).
+"""
+import datetime
+import os
+import sqlite3
+import threading
+from flask import current_app
+from .db import get_db_connection
+from .erp_import import changed_time_entries_since
+from .time_calculator import parse_timestamp, calculate_worker_day_totals, time_entry_events
+
+# Stored in actual_hours.db's PRAGMA user_version; a file at an older version
+# has its tables dropped and rebuilt (they are derived data)
+SCHEMA_VERSION = 2
+_TABLES = ('actual_time_entries', 'actual_time_worker_day', 'actual_time_dni', 'actual_time_worker_dni',
+           'actual_time_planned', 'actual_time_workers', 'actual_time_state')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS actual_time_entries (
+    guid TEXT PRIMARY KEY,
+    worker_no INTEGER,
+    worker_name TEXT,
+    dni TEXT,
+    project TEXT,
+    from_ts TEXT,
+    to_ts TEXT,
+    nominal REAL,
+    cancelled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_actual_time_entries_project ON actual_time_entries (project, from_ts);
+CREATE INDEX IF NOT EXISTS idx_actual_time_entries_dni ON actual_time_entries (dni);
+CREATE TABLE IF NOT EXISTS actual_time_worker_day (
+    worker_no INTEGER NOT NULL,
+    work_date TEXT NOT NULL,
+    dni TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (worker_no, work_date, dni)
+) WITHOUT ROWID;  -- sums read it in key order, so they don't depend on the order rows were written
+CREATE INDEX IF NOT EXISTS idx_actual_time_worker_day_dni ON actual_time_worker_day (dni, worker_no);
+CREATE INDEX IF NOT EXISTS idx_actual_time_worker_day_date ON actual_time_worker_day (work_date);
+CREATE TABLE IF NOT EXISTS actual_time_dni (
+    dni TEXT PRIMARY KEY,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS actual_time_worker_dni (
+    worker_no INTEGER NOT NULL,
+    dni TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (worker_no, dni)
+);
+CREATE INDEX IF NOT EXISTS idx_actual_time_worker_dni_dni ON actual_time_worker_dni (dni);
+CREATE TABLE IF NOT EXISTS actual_time_planned (
+    project TEXT NOT NULL,
+    work_date TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (project, work_date)
+);
+CREATE TABLE IF NOT EXISTS actual_time_workers (
+    worker_no INTEGER PRIMARY KEY,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS actual_time_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_ENTRY_COLUMNS = '''rowid, "Time Entry GUID", "Št. delavca", "Ime delavca", "DNI", "Št.Projektne naloge",
+                    "Od datuma in ure", "Do datuma in ure", "Alociran nominalni čas", COALESCE("Preklican", 0)'''
+# Queries refresh() runs on time_entries (audited by schema.hot_queries)
+ENTRIES_AFTER_SQL = f'SELECT {_ENTRY_COLUMNS} FROM time_entries WHERE rowid > ?'
+ENTRIES_BY_GUID_SQL = f'SELECT {_ENTRY_COLUMNS} FROM time_entries WHERE "Time Entry GUID" IN (%s)'
+WORKER_DAY_SQL = (
+    'SELECT "Št. delavca", "Ime delavca", "Od datuma in ure", "Do datuma in ure", "DNI" FROM time_entries'
+    ' WHERE "Št. delavca" IS ? AND COALESCE("Preklican", 0) = 0 AND "DNI" IS NOT NULL AND "DNI" != \'\''
+    ' AND (("Od datuma in ure" >= ? AND "Od datuma in ure" < ?) OR ("Do datuma in ure" >= ? AND "Do datuma in ure" < ?))'
+    ' ORDER BY "Od datuma in ure"')
+
+_schema_ready = set()  # actual_hours.db paths whose schema this process has created
+_fresh_stamp = {"value": None}  # master stamp this process last found processed
+_refresher = {"thread": None, "pid": None}
+_refresher_lock = threading.Lock()
+
+
+def _ts_text(value):
+    ts = parse_timestamp(value)
+    return ts.isoformat(' ') if ts else None
+
+
+def _entry_days(worker_no, from_ts, to_ts):
+    return {(worker_no, ts[:10]) for ts in (from_ts, to_ts) if ts}
+
+
+def _planned_key(project, from_ts):
+    """(project, day) whose planned hours an entry counts towards; undated entries use ''."""
+    return {(project, from_ts[:10] if from_ts else '')} if project else set()
+
+
+def _get_state(app_conn, key, default=None):
+    row = app_conn.execute("SELECT value FROM actual_time_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_state(app_conn, key, value):
+    app_conn.execute("INSERT OR REPLACE INTO actual_time_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+class _Affected:
+    """What a refresh has to recompute: worker-days and (project, day) planned hours."""
+
+    def __init__(self):
+        self.days = set()
+        self.planned = set()
+
+    def add(self, worker_no, project, from_ts, to_ts):
+        self.days |= _entry_days(worker_no, from_ts, to_ts)
+        self.planned |= _planned_key(project, from_ts)
+
+
+_LEDGER_COLUMNS = "worker_no, worker_name, dni, project, from_ts, to_ts, nominal, cancelled"
+
+
+def _drop_entry(app_conn, guid, affected):
+    """Removes a ledger entry whose time_entries row is gone; notes what it counted towards."""
+    old = app_conn.execute("SELECT worker_no, project, from_ts, to_ts FROM actual_time_entries WHERE guid = ?",
+                           (guid,)).fetchone()
+    if old is not None:
+        affected.add(*old)
+        app_conn.execute("DELETE FROM actual_time_entries WHERE guid = ?", (guid,))
+
+
+def _collect_changes(master_conn, app_conn, rows, affected):
+    """Diffs time_entries rows against the ledger; notes the worker-days and planned hours they touch."""
+    for rowid, guid, worker_no, worker_name, dni, project, from_ts, to_ts, nominal, cancelled in rows:
+        guid = guid or f"rowid:{rowid}"
+        entry = (worker_no, worker_name, dni, project, _ts_text(from_ts), _ts_text(to_ts), nominal,
+                 1 if cancelled else 0)
+        old = app_conn.execute(f"SELECT {_LEDGER_COLUMNS} FROM actual_time_entries WHERE guid = ?",
+                               (guid,)).fetchone()
+        if old is not None and tuple(old) == entry:
+            continue
+        if old is not None:
+            affected.add(old[0], old[3], old[4], old[5])
+        affected.add(worker_no, project, entry[4], entry[5])
+        app_conn.execute(
+            f"INSERT OR REPLACE INTO actual_time_entries (guid, {_LEDGER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (guid,) + entry)
+        if worker_name:
+            app_conn.execute("INSERT OR REPLACE INTO actual_time_workers (worker_no, name) VALUES (?, ?)",
+                             (worker_no, worker_name))
+
+
+def _collect_guid_changes(master_conn, app_conn, guids, affected):
+    """Diffs the entries with the given GUIDs; ledger entries of deleted rows are dropped."""
+    guids = list(guids)
+    for i in range(0, len(guids), 500):
+        chunk = guids[i:i + 500]
+        rows = master_conn.execute(ENTRIES_BY_GUID_SQL % ",".join("?" * len(chunk)), chunk).fetchall()
+        _collect_changes(master_conn, app_conn, rows, affected)
+        found = {row[1] for row in rows}
+        for guid in chunk:
+            if guid not in found:
+                _drop_entry(app_conn, guid, affected)
+
+
+def _recompute_day(master_conn, app_conn, worker_no, work_date):
+    """Recalculates one worker-day; returns the DNIs whose stored seconds changed."""
+    day = datetime.date.fromisoformat(work_date)
+    lo, hi = day.isoformat(), (day + datetime.timedelta(days=1)).isoformat()
+    rows = master_conn.execute(WORKER_DAY_SQL, (worker_no, lo, hi, lo, hi))
+    events = [e for row in rows for e in time_entry_events(tuple(row)) if e[2].date() == day]
+    totals = calculate_worker_day_totals(day, events) if events else {}
+
+    old = dict(app_conn.execute(
+        "SELECT dni, seconds FROM actual_time_worker_day WHERE worker_no IS ? AND work_date = ?",
+        (worker_no, work_date)).fetchall())
+    if old == totals:
+        return set()
+    app_conn.execute("DELETE FROM actual_time_worker_day WHERE worker_no IS ? AND work_date = ?",
+                     (worker_no, work_date))
+    app_conn.executemany(
+        "INSERT INTO actual_time_worker_day (worker_no, work_date, dni, seconds) VALUES (?, ?, ?, ?)",
+        [(worker_no, work_date, dni, seconds) for dni, seconds in totals.items()])
+    return set(old) | set(totals)
+
+
+def _rebuild_sums(app_conn, dnis):
+    for dni in dnis:
+        app_conn.execute("DELETE FROM actual_time_dni WHERE dni = ?", (dni,))
+        app_conn.execute("DELETE FROM actual_time_worker_dni WHERE dni = ?", (dni,))
+        app_conn.execute(
+            "INSERT INTO actual_time_worker_dni (worker_no, dni, seconds)"
+            " SELECT worker_no, dni, SUM(seconds) FROM actual_time_worker_day WHERE dni = ? GROUP BY worker_no",
+            (dni,))
+        app_conn.execute(
+            "INSERT INTO actual_time_dni (dni, seconds)"
+            " SELECT dni, SUM(seconds) FROM actual_time_worker_day WHERE dni = ? GROUP BY dni", (dni,))
+
+
+def _recompute_planned(app_conn, project, work_date):
+    """Recalculates the planned hours of one project on one day (work_date '' = undated entries) from the ledger."""
+    if work_date:
+        day = datetime.date.fromisoformat(work_date)
+        where, params = "from_ts >= ? AND from_ts < ?", (work_date, (day + datetime.timedelta(days=1)).isoformat())
+    else:
+        where, params = "from_ts IS NULL", ()
+    hours, count = app_conn.execute(
+        f"SELECT SUM(nominal), COUNT(*) FROM actual_time_entries WHERE project = ? AND {where} AND cancelled = 0",
+        (project,) + params).fetchone()
+    if count:
+        app_conn.execute("INSERT OR REPLACE INTO actual_time_planned (project, work_date, hours) VALUES (?, ?, ?)",
+                         (project, work_date, hours or 0.0))
+    else:
+        app_conn.execute("DELETE FROM actual_time_planned WHERE project = ? AND work_date = ?", (project, work_date))
+
+
+def refresh(master_conn, app_conn, full=False, master_identity=None, master_stamp=None):
+    """
+    Incrementally updates the materialized tables. The user_version and file
+    identity (inode, passed by the caller) of master_unified.db are recorded
+    per run, and the next run diffs
+      * rows above the last processed rowid, when the version didn't move;
+      * additionally every entry the delta imports since then inserted,
+        updated, cancelled or deleted (erp_changed_time_entries);
+      * every row (full=True), when anything else happened: a snapshot swap,
+        a replaced file or versions no delta log covers. Ledger entries whose
+        rows vanished are dropped.
+    So a run only reads the rows that changed. A writer other than
+    import_erp.py that edits rows in place must bump user_version (the next
+    run is then a full one); without that only appended rows are seen.
+    master_stamp (see _master_stamp) is stored with the result for ensure_fresh.
+    Returns a summary dict.
+    """
+    user_version = master_conn.execute("PRAGMA user_version").fetchone()[0]
+    seen_version = _get_state(app_conn, 'master_user_version')
+    seen_identity = _get_state(app_conn, 'master_identity')
+    last_rowid = int(_get_state(app_conn, 'last_rowid', 0))
+    changed_guids = set()
+    if seen_version is None:
+        # Tables filled before versions were recorded: nothing says what changed since
+        full = full or last_rowid > 0
+    elif master_identity is not None and seen_identity not in (None, str(master_identity)):
+        full = True  # a different file, rowids and versions mean nothing
+    elif int(seen_version) != user_version and not full:
+        changed_guids = changed_time_entries_since(master_conn, int(seen_version))
+        if changed_guids is None:
+            full, changed_guids = True, set()
+    max_rowid = master_conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM time_entries").fetchone()[0]
+    if max_rowid < last_rowid:
+        full = True
+    start_rowid = 0 if full else last_rowid
+
+    affected = _Affected()
+    _collect_changes(master_conn, app_conn, master_conn.execute(ENTRIES_AFTER_SQL, (start_rowid,)), affected)
+    if not full:
+        _collect_guid_changes(master_conn, app_conn, changed_guids, affected)
+    else:
+        live = {row[0] or f"rowid:{row[1]}" for row in master_conn.execute(
+            'SELECT "Time Entry GUID", rowid FROM time_entries')}
+        for (guid,) in app_conn.execute("SELECT guid FROM actual_time_entries").fetchall():
+            if guid not in live:
+                _drop_entry(app_conn, guid, affected)
+
+    changed_dnis = set()
+    for worker_no, work_date in sorted(affected.days, key=repr):
+        changed_dnis |= _recompute_day(master_conn, app_conn, worker_no, work_date)
+    _rebuild_sums(app_conn, changed_dnis)
+    for project, work_date in sorted(affected.planned):
+        _recompute_planned(app_conn, project, work_date)
+    _set_state(app_conn, 'last_rowid', max_rowid)
+    _set_state(app_conn, 'master_user_version', user_version)
+    if master_identity is not None:
+        _set_state(app_conn, 'master_identity', master_identity)
+    if master_stamp is not None:
+        _set_state(app_conn, 'master_stamp', master_stamp)
+    app_conn.commit()
+    return {"worker_days": len(affected.days), "dnis": len(changed_dnis), "planned_days": len(affected.planned),
+            "last_rowid": max_rowid,
+            "changed_entries": len(changed_guids), "full": full}
+
+
+def _master_stamp(path):
+    try:
+        st = os.stat(path)
+        wal = os.stat(f"{path}-wal") if os.path.exists(f"{path}-wal") else None
+    except OSError:
+        return None
+    return repr((st.st_ino, st.st_mtime_ns, st.st_size, wal and (wal.st_mtime_ns, wal.st_size)))
+
+
+def connect(db_path=None):
+    """Pooled connection to actual_hours.db; the file and its tables are created on first use."""
+    db_path = db_path or current_app.config['ACTUAL_HOURS_DB_PATH']
+    if db_path not in _schema_ready:
+        conn = sqlite3.connect(db_path, timeout=5)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                conn.executescript("".join(f"DROP TABLE IF EXISTS {table};" for table in _TABLES) + SCHEMA +
+                                   f"PRAGMA user_version = {SCHEMA_VERSION};")
+            else:
+                conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _schema_ready.add(db_path)
+    return get_db_connection(db_path)
+
+
+def refresh_actual_hours(full=False, database_path=None, db_path=None):
+    """
+    Runs refresh() against the configured databases (or the given paths) unless
+    actual_hours.db already reflects master_unified.db as it is now. The check
+    and the refresh run in one write transaction, so of several processes that
+    try at once one refreshes and the rest find nothing to do. Returns the
+    summary, or None when there was nothing to do.
+    """
+    database_path = database_path or current_app.config['DATABASE_PATH']
+    stamp = _master_stamp(database_path)
+    app_conn = connect(db_path)
+    try:
+        app_conn.execute("BEGIN IMMEDIATE")
+        if not full and stamp is not None and _get_state(app_conn, 'master_stamp') == stamp:
+            app_conn.rollback()
+            return None
+        master_conn = get_db_connection(database_path)
+        try:
+            return refresh(master_conn, app_conn, full=full,
+                           master_identity=os.stat(database_path).st_ino, master_stamp=stamp)
+        finally:
+            master_conn.close()
+    finally:
+        app_conn.close()
+
+
+def _refresh_in_background(app):
+    with app.app_context():
+        try:
+            refresh_actual_hours()
+        except Exception as e:
+            print(f"⚠️ Actual hours refresh failed: {e}")
+
+
+def schedule_refresh(app):
+    """Starts a background refresh in this process unless one is already running."""
+    with _refresher_lock:
+        thread = _refresher["thread"]
+        # After a fork the parent's thread doesn't exist in this process
+        if thread is not None and thread.is_alive() and _refresher["pid"] == os.getpid():
+            return
+        _refresher["pid"] = os.getpid()
+        _refresher["thread"] = threading.Thread(target=_refresh_in_background, args=(app,),
+                                                name="actual-hours-refresh", daemon=True)
+        _refresher["thread"].start()
+
+
+def ensure_fresh():
+    """
+    True when the tables reflect the current master_unified.db. Otherwise a
+    background refresh is scheduled and False returned; the caller answers
+    from the tables as they are and must not cache the result.
+    """
+    stamp = _master_stamp(current_app.config['DATABASE_PATH'])
+    if stamp is not None and stamp == _fresh_stamp["value"]:
+        return True
+    conn = connect()
+    try:
+        recorded = _get_state(conn, 'master_stamp')
+    finally:
+        conn.close()
+    if stamp is not None and recorded == stamp:
+        _fresh_stamp["value"] = stamp
+        return True
+    schedule_refresh(current_app._get_current_object())
+    return False
+
+
+def get_dni_seconds(dnis):
+    """{dni: seconds} for the given DNIs, straight from actual_time_dni."""
+    dnis = [d for d in dict.fromkeys(dnis) if d]
+    if not dnis:
+        return {}
+    conn = connect()
+    try:
+        result = {}
+        for i in range(0, len(dnis), 500):
+            chunk = dnis[i:i + 500]
+            result.update(conn.execute(
+                "SELECT dni, seconds FROM actual_time_dni WHERE dni IN (%s)" % ','.join('?' * len(chunk)),
+                chunk).fetchall())
+        return result
+    finally:
+        conn.close()
+
+
+def get_worker_seconds(dni):
+    """{worker_no: seconds} booked on one DNI."""
+    conn = connect()
+    try:
+        return dict(conn.execute(
+            "SELECT worker_no, seconds FROM actual_time_worker_dni WHERE dni = ?", (dni,)).fetchall())
+    finally:
+        conn.close()
+
+
+def _date_range(start_date, end_date):
+    """SQL fragment and params limiting work_date to [start_date, end_date] (dates, inclusive)."""
+    sql, params = "", []
+    if start_date:
+        sql += " AND work_date >= ?"
+        params.append(start_date.isoformat())
+    if end_date:
+        sql += " AND work_date <= ?"
+        params.append(end_date.isoformat())
+    return sql, params
+
+
+def get_worker_dni_seconds(start_date=None, end_date=None):
+    """
+    [(worker_no, dni, seconds)] for all workers and DNIs; with a window the
+    seconds of the worker-days in it (dates, inclusive) are summed instead.
+    """
+    conn = connect()
+    try:
+        if not (start_date or end_date):
+            return conn.execute("SELECT worker_no, dni, seconds FROM actual_time_worker_dni").fetchall()
+        sql, params = _date_range(start_date, end_date)
+        return conn.execute(
+            f"SELECT worker_no, dni, SUM(seconds) FROM actual_time_worker_day WHERE 1 = 1{sql}"
+            " GROUP BY worker_no, dni", params).fetchall()
+    finally:
+        conn.close()
+
+
+def get_planned_hours(start_date=None, end_date=None):
+    """{project: allocated nominal hours} of the uncancelled entries starting in the window (all without one)."""
+    sql, params = _date_range(start_date, end_date)
+    conn = connect()
+    try:
+        return dict(conn.execute(
+            f"SELECT project, SUM(hours) FROM actual_time_planned WHERE 1 = 1{sql} GROUP BY project",
+            params).fetchall())
+    finally:
+        conn.close()
+
+
+def get_worker_names():
+    """{worker_no: name} as last seen on their time entries."""
+    conn = connect()
+    try:
+        return dict(conn.execute("SELECT worker_no, name FROM actual_time_workers").fetchall())
+    finally:
+        conn.close()
+
+
+def get_entry_projects(dnis):
+    """{dni: project} from the time entries booked on the given DNIs, for DNIs without a work order."""
+    dnis = [d for d in dict.fromkeys(dnis) if d]
+    conn = connect()
+    try:
+        result = {}
+        for i in range(0, len(dnis), 500):
+            chunk = dnis[i:i + 500]
+            result.update(conn.execute(
+                "SELECT dni, MIN(project) FROM actual_time_entries"
+                " WHERE dni IN (%s) AND project != '' AND cancelled = 0 GROUP BY dni" % ','.join('?' * len(chunk)),
+                chunk).fetchall())
+        return result
+    finally:
+        conn.close()
@@ -0,0 +1,210 @@
+# app/allocation.py
+"""
+Inventory allocation across competing projects.
+
+The per-component "missing" test only compares one component with its own
+stock figure, so two projects needing the same article both look covered
+when the stock covers only one of them. simulate() loads the free stock
+(inventory.Prosta zaloga) and all open component demand in bulk
+and hands the stock out in priority order: project_notes.priority first,
+then the work order's due date. What is left uncovered is the project's
+shortage list.
+
+Articles are numbered once and the free stock lives in a flat array indexed
+by that number; demand articles and quantities are parallel arrays, so a
+whole-plant run is a few bulk queries, one sort and one pass. Descriptions
+are only fetched when a project's shortage list is requested.
+"""
+import threading
+import time
+from array import array
+from flask import current_app
+from .db import get_db_connection
+from .data_version import get_data_version
+from .purchase_eta import item_key
+from .helpers import priority_rank
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEMAND_SQL = '''
+    SELECT "Št. Artikla", "Št.Projektne naloge", "DNI", "Preostala količina", "Datum zapadlosti", rowid
+    FROM components
+    WHERE "Preostala količina" > 0 AND "Št. Artikla" IS NOT NULL
+'''
+DUE_SQL = 'SELECT "Št.", "Datum zapadlosti" FROM work_orders WHERE "Datum zapadlosti" IS NOT NULL'
+DETAIL_SQL = 'SELECT rowid, "Opis", "Šifra regala" FROM components WHERE rowid IN (%s)'
+_IN_CHUNK = 500
+STOCK_SQL = 'SELECT "Št. Artikla", "Prosta zaloga" FROM inventory WHERE "Prosta zaloga" > 0'
+
+# Last result per process, keyed on the data version (see get_allocation)
+_result = {"version": None, "value": None}
+_result_lock = threading.Lock()
+
+
+def _allocate_loop(free, articles, needs, keys):
+    """
+    Hands out stock line by line in key order: a line gets its article's stock
+    minus the demand queued before it, summed per article from zero. Returns
+    [(line, allocated)] for the short lines.
+    """
+    queued = {}
+    short = []
+    for i in sorted(range(len(keys)), key=keys.__getitem__):
+        a, need = articles[i], needs[i]
+        before = queued.get(a, 0.0)
+        queued[a] = before + need
+        available = free[a] - before
+        if available < need:
+            short.append((i, available if available > 0 else 0.0))
+    return short
+
+
+def _allocate_arrays(free, articles, needs, keys):
+    """
+    Same result as _allocate_loop, bit for bit (see check_allocation.py),
+    without the per-line Python loop: lines are grouped by article in key
+    order and each group's queued demand is one cumsum. A cumsum over all
+    lines minus each group's start would round differently from the loop.
+    """
+    art = np.asarray(articles, dtype=np.int64)
+    need = np.asarray(needs, dtype=np.float64)
+    order = np.lexsort((np.asarray(keys, dtype=np.int64), art))
+    art_sorted, need_sorted = art[order], need[order]
+    bounds = np.flatnonzero(np.r_[True, art_sorted[1:] != art_sorted[:-1], True])
+    queued = np.zeros_like(need_sorted)
+    for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        if hi - lo > 1:
+            np.cumsum(need_sorted[lo:hi - 1], out=queued[lo + 1:hi])
+    available = np.asarray(free, dtype=np.float64)[art_sorted] - queued
+    is_short = available < need_sorted
+    take = np.maximum(available[is_short], 0.0)
+    return [(int(i), float(t)) for i, t in zip(order[is_short], take)]
+
+
+def simulate(master_conn, priorities):
+    """
+    Allocates free stock to open demand. priorities is {project: priority text}.
+    Returns {"projects": {project: [line, ...]}, "stats": {...}} where a line is
+    the compact tuple (item_no, dni, due_date, needed, allocated, component rowid);
+    shortage_details() turns one project's lines into response dicts.
+    """
+    started = time.perf_counter()
+
+    # Article number -> slot in the free-stock array; raw values are memoized
+    # because item_key() normalization is the expensive part
+    slots, slot_of_raw = {}, {}
+    free = array('d')
+
+    def article(value):
+        slot = slot_of_raw.get(value)
+        if slot is None:
+            key = item_key(value)
+            slot = slots.get(key)
+            if slot is None:
+                slot = slots[key] = len(free)
+                free.append(0.0)
+            slot_of_raw[value] = slot
+        return slot
+
+    for item, qty in master_conn.execute(STOCK_SQL):
+        free[article(item)] += qty
+
+    due_by_dni = dict(master_conn.execute(DUE_SQL).fetchall())
+    rows = master_conn.execute(DEMAND_SQL).fetchall()
+    articles = array('l', [article(row[0]) for row in rows])
+    needs = array('d', [row[3] for row in rows])
+
+    # One integer sort key per line: priority rank, then due date; ties keep table order
+    dues = [due_by_dni.get(row[2]) or row[4] or '9999-12-31' for row in rows]
+    due_index = {due: n for n, due in enumerate(sorted(set(dues)))}
+    rank_of = {project: priority_rank(priorities.get(project)) for project in {row[1] for row in rows}}
+    width = len(due_index)
+    keys = [rank_of[row[1]] * width + due_index[due] for row, due in zip(rows, dues)]
+
+    if np is not None and rows:
+        short = _allocate_arrays(free, articles, needs, keys)
+    else:
+        short = _allocate_loop(free, articles, needs, keys)
+    short.sort(key=lambda entry: (keys[entry[0]], entry[0]))
+
+    shortages = {}
+    for i, take in short:
+        item, project, dni, need, _, rowid = rows[i]
+        shortages.setdefault(project, []).append((item, dni, dues[i], need, take, rowid))
+
+    return {
+        "projects": shortages,
+        "stats": {
+            "articles": len(free),
+            "demand_lines": len(rows),
+            "short_lines": len(short),
+            "seconds": round(time.perf_counter() - started, 4),
+        },
+    }
+
+
+def shortage_details(master_conn, lines):
+    """Response dicts for one project's shortage lines, with descriptions looked up by rowid."""
+    details = {}
+    rowids = [line[5] for line in lines]
+    for start in range(0, len(rowids), _IN_CHUNK):
+        chunk = rowids[start:start + _IN_CHUNK]
+        for rowid, description, shelf in master_conn.execute(DETAIL_SQL % ','.join('?' * len(chunk)), chunk):
+            details[rowid] = (description, shelf)
+    result = []
+    for item, dni, due, need, take, rowid in lines:
+        description, shelf = details.get(rowid, (None, None))
+        result.append({
+            "item_no": item,
+            "description": description,
+            "dni": dni,
+            "sifra_regala": shelf or "N/A",
+            "due_date": None if due == '9999-12-31' else due,
+            "quantity_needed": need,
+            "allocated": take,
+            "shortage": need - take,
+        })
+    return result
+
+
+def get_project_shortages(project_id):
+    """Shortage dicts for one project from the current allocation."""
+    lines = get_allocation()["projects"].get(project_id, [])
+    if not lines:
+        return []
+    conn = get_db_connection(current_app.config['DATABASE_PATH'])
+    try:
+        return shortage_details(conn, lines)
+    finally:
+        conn.close()
+
+
+def _load_priorities():
+    db_path = current_app.config.get('VELIKA_MONTAZA_DB_PATH')
+    conn = get_db_connection(db_path) if db_path else None
+    if conn is None:
+        return {}
+    try:
+        return dict(conn.execute("SELECT project_task_no, priority FROM project_notes").fetchall())
+    finally:
+        conn.close()
+
+
+def get_allocation():
+    """simulate() over the whole plant, recomputed only when the data version changes (imports, priority edits)."""
+    version = get_data_version()
+    with _result_lock:
+        if _result["version"] == version:
+            return _result["value"]
+        conn = get_db_connection(current_app.config['DATABASE_PATH'])
+        if conn is None:
+            raise RuntimeError("Master database is not available")
+        try:
+            value = simulate(conn, _load_priorities())
+        finally:
+            conn.close()
+        _result["version"], _result["value"] = version, value
+        return value
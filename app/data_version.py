@@ -0,0 +1,65 @@
+import hashlib
+import os
+from flask import current_app
+
+# The data version is made of file stamps only, so every worker process
+# computes the same version (and ETag) for the same data. Every app write path
+# writes one of these files: notes, DNI status and photos go to
+# velika_montaza.db, the layout to layout_data.json, ERP imports to master_unified.db.
+_listeners = []
+
+# Files whose stamps make up the data version
+_WATCHED_PATHS = ('DATABASE_PATH', 'VELIKA_MONTAZA_DB_PATH', 'LAYOUT_DATA_FILE_PATH')
+
+
+def add_listener(callback):
+    """Registers callback(kind, project_id) to be called after every mark_changed()."""
+    _listeners.append(callback)
+
+
+def mark_changed(kind, project_id=None):
+    """
+    Records a data change of the given kind ('layout', 'project_notes', 'dni_status', ...)
+    by notifying the listeners (cache invalidation, snapshot rebuilds, SSE events) in this
+    process. The data version itself moves with the file the write went to.
+    """
+    for callback in list(_listeners):
+        try:
+            callback(kind, project_id)
+        except Exception as e:
+            print(f"⚠️ Data change listener failed for '{kind}': {e}")
+
+
+def _file_stamp(path):
+    # SQLite in WAL mode only touches the main file on checkpoint, so stamp the -wal file too.
+    # An empty -wal, which merely opening (or last closing) a connection leaves, counts as none:
+    # only written frames mean changed data
+    stamp = []
+    for p in (path, f"{path}-wal"):
+        try:
+            st = os.stat(p)
+        except OSError:
+            stamp.append(None)
+            continue
+        stamp.append((st.st_ino, st.st_mtime_ns, st.st_size) if st.st_size or p == path else None)
+    return stamp
+
+
+def get_data_version(app=None):
+    """
+    Cheap fingerprint of everything the dashboard endpoints read: file stamps
+    of the databases and the layout file, identical in every worker process.
+    Costs a handful of stat() calls and never touches the database.
+    """
+    config = (app or current_app).config
+    parts = []
+    for key in _WATCHED_PATHS:
+        path = config.get(key)
+        parts.append(repr(_file_stamp(path)) if path else '-')
+    return hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def get_erp_version(app=None):
+    """Stamp of master_unified.db alone: changes with every ERP import, not with app-side writes."""
+    path = (app or current_app).config.get('DATABASE_PATH')
+    return hashlib.blake2b(repr(_file_stamp(path)).encode('utf-8'), digest_size=8).hexdigest() if path else '-'
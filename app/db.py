@@ -1,11 +1,210 @@
 import sqlite3
 import os
+import threading
+import time
 from flask import current_app
 
+# Applied once to every new connection; pooled connections keep them.
+# WAL lets readers run while another process writes, NORMAL sync is safe with WAL.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",    # ~16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",  # map up to 256 MB of the file
+    "PRAGMA temp_store=MEMORY",
+)
+POOL_MAX_IDLE = 8
+
+# Stored in velika_montaza.db's PRAGMA user_version once init_velika_montaza_db()
+# has run; bump it whenever the schema below changes so the check runs again.
+VELIKA_MONTAZA_SCHEMA_VERSION = 2
+
+# Files that are replaced wholesale by erp_import (rename over the old file).
+# They keep a rollback journal: a -wal file left behind by the old inode must
+# never be applied to the new one. Everything else runs in WAL mode.
+_snapshot_databases = set()
+
+
+# Callables (sql, seconds, params, db_file_path) told about every statement run
+# through a pooled connection, e.g. per-request query counters (see metrics.py).
+# params is None for executemany/executescript. Without observers nothing is timed.
+_statement_observers = []
+
+
+def add_statement_observer(callback):
+    _statement_observers.append(callback)
+
+
+def remove_statement_observer(callback):
+    if callback in _statement_observers:
+        _statement_observers.remove(callback)
+
+
+def register_snapshot_database(db_file_path):
+    _snapshot_databases.add(os.path.abspath(db_file_path))
+
+
+def _file_identity(db_file_path):
+    try:
+        st = os.stat(db_file_path)
+        return (st.st_dev, st.st_ino)
+    except OSError:
+        return None
+
+
+class PooledConnection:
+    """
+    Wrapper handed out by get_db_connection(). It behaves like the sqlite3
+    connection it wraps, but close() hands the connection back to its pool.
+    A connection that raised a database error is discarded instead of reused.
+    """
+
+    def __init__(self, pool, conn, generation):
+        self._pool = pool
+        self._conn = conn
+        self._generation = generation
+        self.broken = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def _guard(self, method, *args):
+        try:
+            return method(*args)
+        except (sqlite3.OperationalError, sqlite3.DatabaseError) as e:
+            if not isinstance(e, sqlite3.IntegrityError):
+                self.broken = True
+            raise
+
+    def _observed(self, method, single, *args):
+        if not _statement_observers:
+            return self._guard(method, *args)
+        started = time.perf_counter()
+        try:
+            return self._guard(method, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            params = (args[1] if len(args) > 1 else ()) if single else None
+            for callback in list(_statement_observers):
+                callback(args[0] if args else '', elapsed, params, self._pool.db_file_path)
+
+    def execute(self, *args):
+        return self._observed(self._conn.execute, True, *args)
+
+    def executemany(self, *args):
+        return self._observed(self._conn.executemany, False, *args)
+
+    def executescript(self, *args):
+        return self._observed(self._conn.executescript, False, *args)
+
+    def commit(self):
+        return self._guard(self._conn.commit)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn, self.broken, self._generation)
+            self._conn = None
+
+
+class ConnectionPool:
+    """Idle connections for one database file, reused LIFO."""
+
+    def __init__(self, db_file_path, max_idle=POOL_MAX_IDLE):
+        self.db_file_path = db_file_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.snapshot = os.path.abspath(db_file_path) in _snapshot_databases
+        # Inode the pooled connections were opened on; a swapped file invalidates them
+        self._identity = _file_identity(db_file_path) if self.snapshot else None
+        self._generation = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_file_path,
+            check_same_thread=False,
+            # Only PARSE_COLNAMES: a query opts in per column with AS "name [timestamp]",
+            # every other row is returned without converter overhead.
+            detect_types=sqlite3.PARSE_COLNAMES
+        )
+        conn.row_factory = sqlite3.Row
+        journal = "PRAGMA journal_mode=DELETE" if self.snapshot else "PRAGMA journal_mode=WAL"
+        for pragma in (journal,) + CONNECTION_PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.OperationalError:
+                pass  # e.g. WAL on a read-only file; the connection is still usable
+        return conn
+
+    def acquire(self):
+        if self.snapshot:
+            identity = _file_identity(self.db_file_path)
+            if identity != self._identity:
+                # The file was swapped by an import; drop connections to the old one
+                self._identity = identity
+                self._generation += 1
+                self.close_all()
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        return PooledConnection(self, conn or self._connect(), self._generation)
+
+    def release(self, conn, broken=False, generation=None):
+        if generation is not None and generation != self._generation:
+            broken = True  # opened on a file that has since been replaced
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                broken = True
+        if not broken:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(db_file_path):
+    pool = _pools.get(db_file_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_file_path, ConnectionPool(db_file_path))
+    return pool
+
+
+def close_all_connections():
+    """Closes every idle pooled connection (e.g. after fork or before replacing a DB file)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
 def get_db_connection(db_file_path):
+    pool = _pools.get(db_file_path)
+    if pool is not None and pool._idle:
+        return pool.acquire()
     if not os.path.exists(db_file_path):
         print(f"ERROR: Database file not found at '{db_file_path}'.")
-        if db_file_path == current_app.config['CAS_DATABASE_FILE_PATH']:
+        if db_file_path == current_app.config.get('CAS_DATABASE_FILE_PATH'):
             print(f"Warning: '{os.path.basename(db_file_path)}' not found. Worker names cannot be fetched.")
             return None
         if db_file_path == current_app.config.get('CAS_RAZPOREDJEN_DB_PATH'):
@@ -13,16 +212,10 @@ def get_db_connection(db_file_path):
             return None
         raise FileNotFoundError(f"Database file not found at '{db_file_path}'.")
     try:
-        conn = sqlite3.connect(
-            db_file_path,
-            check_same_thread=False,
-            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
-        )
-        conn.row_factory = sqlite3.Row
-        return conn
+        return _get_pool(db_file_path).acquire()
     except sqlite3.OperationalError as e:
         print(f"ERROR: Could not connect to database '{db_file_path}': {e}")
-        if db_file_path == current_app.config['CAS_DATABASE_FILE_PATH']:
+        if db_file_path == current_app.config.get('CAS_DATABASE_FILE_PATH'):
             print("Warning: Could not connect. Worker names cannot be fetched.")
             return None
         if db_file_path == current_app.config.get('CAS_RAZPOREDJEN_DB_PATH'):
@@ -30,11 +223,41 @@ def get_db_connection(db_file_path):
             return None
         raise e
 
-def init_velika_montaza_db():
-    """Initializes/updates schema for velika_montaza.db if tables/columns are missing."""
+def open_database(db_file_path):
+    """
+    Opens a pooled connection now, which puts the file in its journal mode
+    (WAL) and creates its -wal file, so nothing that stamps the file (see
+    data_version.py) sees it change on the first request.
+    """
+    conn = get_db_connection(db_file_path)
+    if conn is not None:
+        conn.close()
+
+def velika_montaza_schema_version(db_path):
+    """PRAGMA user_version of velika_montaza.db; 0 when the file is missing or unreadable."""
+    if not os.path.exists(db_path):
+        return 0
+    try:
+        conn = sqlite3.connect(db_path, timeout=5)
+        try:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return 0
+
+
+def init_velika_montaza_db(force=False, db_path=None):
+    """
+    Initializes/updates schema for velika_montaza.db if tables/columns are missing.
+    Skipped when the file is already at VELIKA_MONTAZA_SCHEMA_VERSION unless force=True.
+    db_path defaults to the app's VELIKA_MONTAZA_DB_PATH. Returns True when the schema check ran.
+    """
     conn = None
     try:
-        db_path = current_app.config['VELIKA_MONTAZA_DB_PATH']
+        db_path = db_path or current_app.config['VELIKA_MONTAZA_DB_PATH']
+        if not force and velika_montaza_schema_version(db_path) >= VELIKA_MONTAZA_SCHEMA_VERSION:
+            return False
         # Create file if it doesn't exist
         if not os.path.exists(db_path):
             open(db_path, 'a').close()
@@ -96,8 +319,15 @@ def init_velika_montaza_db():
             )
         """)
 
+        # Materialized actual hours moved to actual_hours.db (see actual_hours.py)
+        for table in ("actual_time_entries", "actual_time_worker_day", "actual_time_dni",
+                      "actual_time_worker_dni", "actual_time_state"):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+        cursor.execute(f"PRAGMA user_version = {VELIKA_MONTAZA_SCHEMA_VERSION}")
         conn.commit()
         print("Velika Montaza database schema is verified.")
+        return True
     except sqlite3.OperationalError as e:
         print(f"ERROR initializing Velika Montaza database: {e}")
     except Exception as e:
@@ -0,0 +1,469 @@
+# app/erp_import.py
+"""
+ERP snapshot import into master_unified.db.
+
+The export files (one CSV per table, e.g. work_orders.csv) are streamed in
+chunks into a shadow copy of the database inside a single transaction.
+Indexes are built after the data is loaded (the app's own plus any the live
+database has, e.g. ones added by hand), then the shadow file is renamed
+over the live one. Readers keep the old file open until they are done and
+pick up the new one on their next connection, so they never see a half-
+loaded table and never wait on the import's write lock.
+
+import_delta() is the incremental path for frequent syncs: rows are matched
+on their natural keys and only inserts, updates and deletes are written, in
+place, with the affected projects and time entries logged per data version.
+"""
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from itertools import islice
+from urllib.request import pathname2url
+
+from .purchase_eta import rebuild_eta_index
+from .schema import ensure_indexes
+
+ERP_TABLES = ('work_orders', 'components', 'time_entries', 'purchase_orders', 'inventory')
+CHUNK_SIZE = 5000
+
+# Natural keys used by the delta import to match export rows to stored rows
+NATURAL_KEYS = {
+    'work_orders': ('Št.',),
+    'components': ('DNI', 'Št. vrstice delovnega naloga'),
+    'time_entries': ('Time Entry GUID',),
+    'purchase_orders': ('Št. dokumenta', 'Št. Artikla', 'DNI', 'Št. vrstice delovnega naloga'),
+    'inventory': ('Št. Artikla', 'Šifra lokacije'),
+}
+PROJECT_COLUMN = 'Št.Projektne naloge'
+TIME_ENTRY_KEY = 'Time Entry GUID'
+ARTICLE_COLUMN = 'Št. Artikla'
+# Tables without a project column; a change affects every project whose components use the article
+ARTICLE_TABLES = ('purchase_orders', 'inventory')
+
+# Bookkeeping tables of the delta import; row hashes refer to rowids and are not carried over a snapshot swap
+_DELTA_STATE_TABLES = ('erp_row_hashes',)
+
+_DECIMAL_COMMA = re.compile(r'^-?\d+,\d+$')
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sniff_dialect(path, encoding):
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        sample = f.read(64 * 1024)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        return csv.excel
+
+
+def _live_tables(conn):
+    """{table: [(column, declared type), ...]} of the attached live database."""
+    tables = {}
+    for (name,) in conn.execute("SELECT name FROM live.sqlite_master WHERE type = 'table'"):
+        if name.startswith('sqlite_'):
+            continue
+        tables[name] = [(row[1], row[2]) for row in conn.execute(f"PRAGMA live.table_info({_quote(name)})")]
+    return tables
+
+
+def _converter(declared_type):
+    numeric = any(t in (declared_type or '').upper() for t in ('INT', 'REAL', 'FLOA', 'DOUB', 'NUM'))
+
+    def convert(value):
+        if value == '':
+            return None
+        if numeric and _DECIMAL_COMMA.match(value):
+            return value.replace(',', '.')
+        return value
+    return convert
+
+
+def _load_table(conn, table, path, live_columns, encoding, chunk_size):
+    dialect = _sniff_dialect(path, encoding)
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        reader = csv.reader(f, dialect)
+        header = next(reader)
+        types = dict(live_columns or [])
+        conn.execute(f"CREATE TABLE {_quote(table)} (" +
+                     ', '.join(f"{_quote(col)} {types.get(col, '')}".rstrip() for col in header) + ")")
+        converters = [_converter(types.get(col)) for col in header]
+        insert = f"INSERT INTO {_quote(table)} VALUES ({', '.join('?' * len(header))})"
+        width = len(header)
+        rows = 0
+        while True:
+            chunk = [
+                [convert(value) for convert, value in zip(converters, (row + [''] * width)[:width])]
+                for row in islice(reader, chunk_size)
+            ]
+            if not chunk:
+                break
+            conn.executemany(insert, chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _copy_live_indexes(conn):
+    """
+    Recreates the live database's own indexes (ad-hoc ones included) on the
+    shadow copy; indexes whose table or columns the new export lacks, or whose
+    UNIQUE constraint the new data violates, are reported and left out.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'index'")}
+    tables = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+    created = []
+    for name, table, sql in conn.execute(
+            "SELECT name, tbl_name, sql FROM live.sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+        if name in existing or table not in tables:
+            continue
+        # Checked up front: sqlite would read a quoted column the new table lacks as a string literal
+        wanted = {row[2] for row in conn.execute(f"PRAGMA live.index_xinfo({_quote(name)})") if row[1] >= 0 and row[5]}
+        missing = wanted - {row[1] for row in conn.execute(f"PRAGMA main.table_info({_quote(table)})")}
+        if missing:
+            print(f"WARNING: index {name} on {table} not carried over: no column {', '.join(sorted(missing))}")
+            continue
+        try:
+            conn.execute(sql)
+        except (sqlite3.OperationalError, sqlite3.IntegrityError) as e:
+            print(f"WARNING: index {name} on {table} not carried over: {e}")
+            continue
+        created.append(name)
+    return created
+
+
+def import_snapshot(export_dir, db_path, encoding='utf-8-sig', chunk_size=CHUNK_SIZE, tables=ERP_TABLES):
+    """
+    Builds a new master_unified.db from <export_dir>/<table>.csv and swaps it in.
+    Tables without an export file (and any non-ERP tables) are copied from the
+    live database. Returns a summary with row counts, the new data version
+    (PRAGMA user_version) and the elapsed time.
+    """
+    started = time.perf_counter()
+    shadow_path = f"{db_path}.importing"
+    for stale in (shadow_path, f"{shadow_path}-journal"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    conn = sqlite3.connect(f"file:{pathname2url(shadow_path)}", uri=True, isolation_level=None)
+    try:
+        # The shadow file is disposable until the swap: no journal, no fsync per page
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-64000")
+        live_exists = os.path.exists(db_path)
+        live_tables, version = {}, 0
+        if live_exists:
+            conn.execute("ATTACH DATABASE ? AS live", (f"file:{pathname2url(db_path)}?mode=ro",))
+            live_tables = _live_tables(conn)
+            version = conn.execute("PRAGMA live.user_version").fetchone()[0]
+
+        counts = {}
+        conn.execute("BEGIN")
+        for table in tables:
+            path = os.path.join(export_dir, f"{table}.csv")
+            if os.path.exists(path):
+                counts[table] = _load_table(conn, table, path, live_tables.get(table), encoding, chunk_size)
+        for table, columns in live_tables.items():
+            if table in counts or table in _DELTA_STATE_TABLES:
+                continue
+            sql = conn.execute("SELECT sql FROM live.sqlite_master WHERE type = 'table' AND name = ?",
+                               (table,)).fetchone()[0]
+            conn.execute(sql)
+            conn.execute(f"INSERT INTO main.{_quote(table)} SELECT * FROM live.{_quote(table)}")
+        rebuild_eta_index(conn)
+        ensure_indexes(conn, analyze=False)
+        conn.execute(f"PRAGMA user_version = {int(version) + 1}")
+        conn.execute("COMMIT")
+        if live_exists:
+            # A statement can only be undone with a journal (a UNIQUE index the new data violates
+            # would be left half-built); a memory journal costs next to nothing for new index pages
+            conn.execute("PRAGMA journal_mode=MEMORY")
+            conn.execute("BEGIN")
+            _copy_live_indexes(conn)
+            conn.execute("COMMIT")
+            conn.execute("DETACH DATABASE live")
+        conn.execute("ANALYZE")
+        # Readers open the swapped-in file with a rollback journal (see db.register_snapshot_database)
+        conn.execute("PRAGMA journal_mode=DELETE")
+    except Exception:
+        conn.close()
+        os.remove(shadow_path)
+        raise
+    conn.close()
+
+    with open(shadow_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(shadow_path, db_path)
+    return {
+        "rows": counts,
+        "data_version": int(version) + 1,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# --- DELTA IMPORT ---
+
+def _row_hash(*values):
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class _KeyBuilder:
+    """SQL function row_key(...): natural key text, made unique with #n for repeated keys."""
+
+    def __init__(self):
+        self.seen = {}
+
+    def __call__(self, *values):
+        key = '\x1f'.join('' if v is None else str(v) for v in values)
+        n = self.seen.get(key, 0)
+        self.seen[key] = n + 1
+        return key if n == 0 else f"{key}#{n}"
+
+
+def _ensure_delta_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS erp_row_hashes (
+            tbl TEXT NOT NULL,
+            natural_key TEXT NOT NULL,
+            row_hash TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            PRIMARY KEY (tbl, natural_key)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS erp_changed_projects (
+            data_version INTEGER NOT NULL,
+            project_task_no TEXT NOT NULL,
+            PRIMARY KEY (data_version, project_task_no)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS erp_changed_time_entries (
+            data_version INTEGER NOT NULL,
+            guid TEXT NOT NULL,
+            PRIMARY KEY (data_version, guid)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS erp_delta_log (
+            data_version INTEGER PRIMARY KEY,
+            imported_at TEXT NOT NULL,
+            project_count INTEGER NOT NULL
+        )
+    """)
+
+
+def _seed_hashes(conn, table, columns, key_columns):
+    """First delta run for a table: hash the rows that are already stored."""
+    if conn.execute("SELECT 1 FROM erp_row_hashes WHERE tbl = ? LIMIT 1", (table,)).fetchone():
+        return
+    conn.create_function('row_key', -1, _KeyBuilder())
+    conn.execute(
+        f"INSERT INTO erp_row_hashes (tbl, natural_key, row_hash, row_id) "
+        f"SELECT ?, row_key({', '.join(_quote(c) for c in key_columns)}), "
+        f"row_hash({', '.join(_quote(c) for c in columns)}), rowid FROM {_quote(table)} ORDER BY rowid",
+        (table,))
+
+
+def _stage_export(conn, table, path, columns, types, encoding, chunk_size):
+    """Loads the export into TEMP table stage with the live column types, so values hash like stored ones."""
+    conn.execute("DROP TABLE IF EXISTS temp.stage")
+    conn.execute("CREATE TEMP TABLE stage (" +
+                 ', '.join(f"{_quote(c)} {types.get(c, '')}".rstrip() for c in columns) +
+                 ", _key TEXT, _hash TEXT)")
+    dialect = _sniff_dialect(path, encoding)
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        reader = csv.reader(f, dialect)
+        header = next(reader)
+        positions = {col: i for i, col in enumerate(header)}
+        picks = [(positions.get(col), _converter(types.get(col))) for col in columns]
+        insert = f"INSERT INTO temp.stage VALUES ({', '.join('?' * len(columns))}, NULL, NULL)"
+        while True:
+            chunk = [
+                [convert(row[i]) if i is not None and i < len(row) else None for i, convert in picks]
+                for row in islice(reader, chunk_size)
+            ]
+            if not chunk:
+                break
+            conn.executemany(insert, chunk)
+
+
+def _apply_table_delta(conn, table, path, encoding, chunk_size, tracked):
+    """
+    Applies one table's export. tracked maps column names to sets that collect
+    the old and new values of every inserted, updated or deleted row
+    (e.g. the project numbers); columns the table lacks are ignored.
+    """
+    info = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+    if not info:
+        raise ValueError(f"Table '{table}' does not exist yet; run a full snapshot import first.")
+    columns = [row[1] for row in info]
+    types = {row[1]: row[2] for row in info}
+    key_columns = NATURAL_KEYS[table]
+    quoted = ', '.join(_quote(c) for c in columns)
+
+    _seed_hashes(conn, table, columns, key_columns)
+    _stage_export(conn, table, path, columns, types, encoding, chunk_size)
+    conn.create_function('row_key', -1, _KeyBuilder())
+    conn.execute(f"UPDATE temp.stage SET _key = row_key({', '.join(_quote(c) for c in key_columns)}), "
+                 f"_hash = row_hash({quoted})")
+    conn.execute("CREATE INDEX temp.idx_stage_key ON stage (_key)")
+
+    tracked = {column: values for column, values in tracked.items() if column in columns}
+    tracked_sql = ', '.join(_quote(c) for c in tracked)
+    tracked_positions = [(columns.index(column), values) for column, values in tracked.items()]
+
+    def note_stored(row_id):
+        if tracked:
+            row = conn.execute(f"SELECT {tracked_sql} FROM {_quote(table)} WHERE rowid = ?", (row_id,)).fetchone()
+            for value, values in zip(row or (), tracked.values()):
+                if value:
+                    values.add(value)
+
+    def note_values(row_values):
+        for position, values in tracked_positions:
+            if row_values[position]:
+                values.add(row_values[position])
+
+    counts = {"inserted": 0, "updated": 0, "deleted": 0}
+
+    # Deletes: stored keys missing from the export
+    for natural_key, row_id in conn.execute(
+            "SELECT h.natural_key, h.row_id FROM erp_row_hashes h WHERE h.tbl = ? "
+            "AND NOT EXISTS (SELECT 1 FROM temp.stage s WHERE s._key = h.natural_key)", (table,)).fetchall():
+        note_stored(row_id)
+        conn.execute(f"DELETE FROM {_quote(table)} WHERE rowid = ?", (row_id,))
+        conn.execute("DELETE FROM erp_row_hashes WHERE tbl = ? AND natural_key = ?", (table, natural_key))
+        counts["deleted"] += 1
+
+    # Updates and inserts: keys that are new or whose content hash changed
+    update = f"UPDATE {_quote(table)} SET ({quoted}) = ({', '.join('?' * len(columns))}) WHERE rowid = ?"
+    insert = f"INSERT INTO {_quote(table)} ({quoted}) VALUES ({', '.join('?' * len(columns))})"
+    changed = conn.execute(
+        f"SELECT {', '.join('s.' + _quote(c) for c in columns)}, s._key, s._hash, h.row_id FROM temp.stage s "
+        "LEFT JOIN erp_row_hashes h ON h.tbl = ? AND h.natural_key = s._key "
+        "WHERE h.row_hash IS NULL OR h.row_hash != s._hash", (table,)).fetchall()
+    for row in changed:
+        values, natural_key, row_hash, row_id = list(row[:len(columns)]), row[-3], row[-2], row[-1]
+        if row_id is None:
+            row_id = conn.execute(insert, values).lastrowid
+            counts["inserted"] += 1
+        else:
+            note_stored(row_id)
+            conn.execute(update, values + [row_id])
+            counts["updated"] += 1
+        note_values(values)
+        conn.execute("INSERT OR REPLACE INTO erp_row_hashes (tbl, natural_key, row_hash, row_id) VALUES (?, ?, ?, ?)",
+                     (table, natural_key, row_hash, row_id))
+
+    conn.execute("DROP TABLE temp.stage")
+    return counts
+
+
+def _projects_using_articles(conn, articles):
+    """Projects with components of the given articles, i.e. whose availability and ETAs they feed."""
+    articles = list(articles)
+    projects = set()
+    for i in range(0, len(articles), 500):
+        chunk = articles[i:i + 500]
+        projects.update(row[0] for row in conn.execute(
+            f'SELECT DISTINCT {_quote(PROJECT_COLUMN)} FROM components'
+            f' WHERE {_quote(ARTICLE_COLUMN)} IN ({",".join("?" * len(chunk))})', chunk) if row[0])
+    return projects
+
+
+def import_delta(export_dir, db_path, encoding='utf-8-sig', chunk_size=CHUNK_SIZE, tables=ERP_TABLES):
+    """
+    Applies an ERP export to master_unified.db in place, touching only rows
+    whose content changed. Rows are matched on NATURAL_KEYS and compared by a
+    content hash kept in erp_row_hashes. All tables are applied in one
+    transaction, which also bumps PRAGMA user_version and records the affected
+    'Št.Projektne naloge' values in erp_changed_projects (changes to
+    ARTICLE_TABLES count for the projects using the article) and the changed time
+    entries (by GUID) in erp_changed_time_entries for that version.
+    Returns a summary including the sorted list of affected projects.
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.create_function('row_hash', -1, _row_hash, deterministic=True)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _ensure_delta_tables(conn)
+        affected, time_entries, articles = set(), set(), set()
+        counts = {}
+        for table in tables:
+            path = os.path.join(export_dir, f"{table}.csv")
+            if os.path.exists(path):
+                tracked = {PROJECT_COLUMN: affected}
+                if table == 'time_entries':
+                    tracked[TIME_ENTRY_KEY] = time_entries
+                elif table in ARTICLE_TABLES:
+                    tracked = {ARTICLE_COLUMN: articles}
+                counts[table] = _apply_table_delta(conn, table, path, encoding, chunk_size, tracked)
+        # After all tables: components reflect this export when the articles are mapped
+        affected |= _projects_using_articles(conn, articles)
+        if any(counts.get('purchase_orders', {}).values()):
+            rebuild_eta_index(conn)
+        version = conn.execute("PRAGMA user_version").fetchone()[0] + 1
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.executemany("INSERT OR IGNORE INTO erp_changed_projects (data_version, project_task_no) VALUES (?, ?)",
+                         [(version, p) for p in affected])
+        conn.executemany("INSERT OR IGNORE INTO erp_changed_time_entries (data_version, guid) VALUES (?, ?)",
+                         [(version, guid) for guid in time_entries])
+        conn.execute("INSERT OR REPLACE INTO erp_delta_log (data_version, imported_at, project_count) "
+                     "VALUES (?, datetime('now'), ?)", (version, len(affected)))
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return {
+        "rows": counts,
+        "data_version": version,
+        "projects": sorted(affected),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _only_deltas_since(conn, data_version):
+    """True when every data version after data_version was written by a logged delta import."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    logged = {row[0] for row in conn.execute(
+        "SELECT data_version FROM erp_delta_log WHERE data_version > ?", (data_version,))}
+    return logged == set(range(data_version + 1, current + 1))
+
+
+def changed_projects_since(conn, data_version):
+    """
+    Projects touched by delta imports after data_version, or None when that
+    can't be told (a full snapshot was swapped in since): callers then flush everything.
+    """
+    try:
+        if not _only_deltas_since(conn, data_version):
+            return None
+        rows = conn.execute(
+            "SELECT DISTINCT project_task_no FROM erp_changed_projects WHERE data_version > ?",
+            (data_version,)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {row[0] for row in rows}
+
+
+def changed_time_entries_since(conn, data_version):
+    """GUIDs of time entries inserted, updated or deleted by delta imports after data_version; None when unknown."""
+    try:
+        if not _only_deltas_since(conn, data_version):
+            return None
+        rows = conn.execute(
+            "SELECT DISTINCT guid FROM erp_changed_time_entries WHERE data_version > ?", (data_version,)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {row[0] for row in rows}
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from collections import deque
+from .data_version import add_listener, get_data_version
+
+# How often (at most) the broker stats the database files for changes made by
+# other processes, e.g. an ERP import or another server worker.
+EXTERNAL_CHECK_INTERVAL = 5.0
+
+
+class EventBroker:
+    """
+    Fan-out of change notifications to all open /api/events streams.
+
+    Subscribers do not get their own queue: every stream waits on one shared
+    condition and reads from a small ring buffer of recent events. The wait
+    blocks the serving thread, so an open stream holds one OS thread for its
+    whole life, except under the gevent worker class (see serve.py), where
+    the patched condition suspends a greenlet instead. Without gevent pages
+    use poll_changes, which holds a thread for EVENTS_POLL_WAIT at most.
+    """
+
+    def __init__(self, history=256):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)  # (seq, kind, project_id)
+        self._seq = 0
+        # Guards _last_version/_last_check and _streams, which every stream's thread reads and writes
+        self._check_lock = threading.Lock()
+        self._last_version = None
+        self._last_check = 0.0
+        self._streams = 0
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    @property
+    def open_streams(self):
+        return self._streams
+
+    def open_stream(self, limit=None):
+        """Counts a new stream; False when limit (None = no limit) streams are already open in this process."""
+        with self._check_lock:
+            if limit is not None and self._streams >= limit:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._check_lock:
+            self._streams -= 1
+
+    def publish(self, kind, project_id=None):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, kind, project_id))
+            self._cond.notify_all()
+
+    def events_since(self, seq):
+        with self._cond:
+            return [e for e in self._events if e[0] > seq]
+
+    def wait(self, seq, timeout):
+        """Blocks until an event newer than seq exists or timeout elapses; returns the new events."""
+        with self._cond:
+            if self._seq <= seq:
+                self._cond.wait(timeout)
+            return [e for e in self._events if e[0] > seq]
+
+    def check_external(self, app):
+        """Publishes a 'data' event when the data version moved without a local mark_changed()."""
+        with self._check_lock:
+            now = time.monotonic()
+            if now - self._last_check < EXTERNAL_CHECK_INTERVAL:
+                return
+            self._last_check = now
+            version = get_data_version(app)
+            moved = self._last_version is not None and version != self._last_version
+            self._last_version = version
+        if moved:
+            self.publish('data')
+
+    def note_local_change(self, app):
+        # Local writes are published directly; don't report them a second time as external
+        version = get_data_version(app)
+        with self._check_lock:
+            self._last_version = version
+
+
+broker = EventBroker()
+add_listener(broker.publish)
+
+
+def format_sse(seq, kind, project_id=None):
+    payload = json.dumps({"kind": kind, "project_id": project_id})
+    return f"id: {seq}\nevent: change\ndata: {payload}\n\n"
+
+
+def event_stream(app, last_seq=None, heartbeat=15.0):
+    """Generator of SSE frames; sends a comment line as keep-alive when nothing happens."""
+    # Tell EventSource how long to wait before reconnecting
+    yield "retry: 3000\n\n"
+    if last_seq is not None and last_seq != broker.last_seq:
+        # Reconnect after a drop or a server restart: events may have been missed, refresh once
+        yield format_sse(broker.last_seq, 'resync')
+    last_seq = broker.last_seq
+    idle = 0.0
+    while True:
+        broker.check_external(app)
+        events = broker.wait(last_seq, EXTERNAL_CHECK_INTERVAL)
+        if events:
+            broker.note_local_change(app)
+            idle = 0.0
+            for seq, kind, project_id in events:
+                last_seq = seq
+                yield format_sse(seq, kind, project_id)
+        else:
+            idle += EXTERNAL_CHECK_INTERVAL
+            if idle >= heartbeat:
+                idle = 0.0
+                yield ": ping\n\n"
+
+
+def poll_changes(app, since, timeout):
+    """
+    Long-poll counterpart of event_stream: returns the current data version,
+    after waiting up to timeout seconds for a change in this process when it
+    still equals since. The version is the same in every worker process, so
+    consecutive polls may land on different workers; changes made elsewhere
+    show up on the next poll.
+    """
+    version = get_data_version(app)
+    if since == version and timeout > 0:
+        broker.wait(broker.last_seq, timeout)
+        version = get_data_version(app)
+    return version
@@ -1,9 +1,69 @@
-from flask_sqlalchemy import SQLAlchemy
-from flask_caching import Cache
+import threading
+from .shared_cache import SharedCache
 
-# Initialize the Database Manager
-db = SQLAlchemy()
 
-# Initialize the Cache Manager (This makes it run faster)
-# It stores data in RAM (memory) for 60 seconds so it doesn't read the disk constantly.
-cache = Cache(config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 60})
\ No newline at end of file
+class LazySQLAlchemy:
+    """
+    Stands in for flask_sqlalchemy.SQLAlchemy so that importing app modules
+    (models, helpers, the CLI scripts) doesn't import SQLAlchemy, which is the
+    largest part of a cold start. The real extension is created by the first
+    init_app() -- inside create_app, before the app serves anything -- or by
+    the first attribute access (db.Model, db.session, ...), whichever comes
+    first. serve.py pays that cost once in the master before forking.
+    """
+
+    def __init__(self):
+        self._real = None
+        self._on_load = []
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        """Creates the real extension if needed and initializes it for app (sessions, engines, teardown)."""
+        self._resolve().init_app(app)
+
+    @property
+    def loaded(self):
+        return self._real is not None
+
+    def on_load(self, callback):
+        """Calls callback(real_extension) once SQLAlchemy is loaded (right away if it already is)."""
+        with self._lock:
+            if self._real is None:
+                self._on_load.append(callback)
+                return
+        callback(self._real)
+
+    def _resolve(self):
+        with self._lock:
+            if self._real is None:
+                from flask_sqlalchemy import SQLAlchemy
+                self._real = SQLAlchemy(add_models_to_shell=False)
+                callbacks, self._on_load = self._on_load, []
+                for callback in callbacks:
+                    callback(self._real)
+            return self._real
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+# Initialize the Database Manager (SQLAlchemy is imported by create_app or on first use)
+db = LazySQLAlchemy()
+
+# Cache shared by all worker processes (SQLite file, see shared_cache.py).
+# Entries are tagged per project and dropped when that project's data changes.
+shared_cache = SharedCache()
+
+_cache = None
+
+
+def __getattr__(name):
+    # In-process Flask-Caching cache, created on first access:
+    # it stores data in RAM (memory) for 60 seconds so it doesn't read the disk constantly.
+    global _cache
+    if name == 'cache':
+        if _cache is None:
+            from flask_caching import Cache
+            _cache = Cache(config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 60})
+        return _cache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,24 +1,31 @@
+from functools import lru_cache
 from .extensions import db
-from .models import WorkOrder, ProjectNote
+from .data_version import mark_changed
+from .metrics import timed
+
+# sqlalchemy and the models are imported inside the functions below, so
+# importing helpers doesn't load the ORM (see extensions.LazySQLAlchemy)
+
+# Completion keywords (Slovenian & English), compared against the lower-cased status
+COMPLETED_STATUSES = frozenset(['zaključeno', 'completed', 'finished', 'izdano', 'closed', 'potrjeno'])
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+_IN_CHUNK = 500
+
+# project_notes.priority in scheduling order; anything else ranks last
+PRIORITY_RANKS = {'Urgent': 0, 'High': 1, 'Normal': 2}
+
+
+def priority_rank(priority):
+    return PRIORITY_RANKS.get(priority, len(PRIORITY_RANKS))
 
 # --- 1. GLOBAL STATUS FETCH (Fixes Core Page Crash) ---
 def get_project_statuses_from_db():
     """
     Fetches statuses for ALL projects. Used by the Home Page.
+    Errors propagate: the view answers them with error_response() rather than an empty 200.
     """
-    try:
-        # Get unique project IDs from the WorkOrder table
-        projects = db.session.query(WorkOrder.project_task_no).distinct().all()
-        
-        statuses = {}
-        for proj in projects:
-            p_id = proj[0] # Extract string from tuple
-            if p_id:
-                statuses[p_id] = get_project_inventory_status(p_id)
-        return statuses
-    except Exception as e:
-        print(f"⚠️ Error fetching global statuses: {e}")
-        return {}
+    return get_project_statuses()
 
 # --- 2. SINGLE PROJECT STATUS (Fixes Layout Page) ---
 def get_project_inventory_status(project_id):
@@ -26,47 +33,171 @@ def get_project_inventory_status(project_id):
     Calculates % complete for a single project.
     """
     try:
-        # Query using the SQLAlchemy Model
-        orders = WorkOrder.query.filter_by(project_task_no=project_id).all()
-        
-        total = len(orders)
-        if total == 0:
-            # Check if it's in notes even if no work orders exist
-            note = ProjectNote.query.get(project_id)
-            status_text = note.status if note and note.status else "No Data"
-            return {"status": status_text, "percentage": 0, "total": 0, "completed": 0}
-
-        completed = 0
-        for wo in orders:
-            # Check for various completion keywords (Slovenian & English)
-            s = str(wo.status).lower() if wo.status else ""
-            if s in ['zaključeno', 'completed', 'finished', 'izdano', 'closed', 'potrjeno']:
-                completed += 1
-        
-        percent = (completed / total) * 100
-        
-        # Logic for text status
-        if percent == 100: status_text = "Finished"
-        elif percent > 0: status_text = "In Progress"
-        else: status_text = "Planned"
-        
-        return {
-            "status": status_text,
-            "percentage": round(percent, 1),
-            "total": total,
-            "completed": completed
-        }
-
+        return get_project_statuses([project_id])[project_id]
     except Exception as e:
         print(f"⚠️ Helper Error for {project_id}: {e}")
         return {"status": "Error", "percentage": 0, "error": str(e)}
 
-# --- 3. PERMISSIONS ---
+# --- 3. BATCHED STATUS ENGINE ---
+# The statements are built here once, for the helpers below and for the
+# query-plan audit (schema.hot_queries), which compiles them to SQL.
+def status_counts_query():
+    """Work orders counted per (project, status)."""
+    from sqlalchemy import func, select
+    from .models import WorkOrder
+    return select(WorkOrder.project_task_no, WorkOrder.status, func.count()).group_by(
+        WorkOrder.project_task_no, WorkOrder.status)
+
+def work_orders_query(project_id):
+    from sqlalchemy import select
+    from .models import WorkOrder
+    return select(WorkOrder).filter_by(project_task_no=project_id)
+
+def project_parts_query(project_id):
+    """(state, item_no, description, shelf_code, quantity_remaining) of a project's missing/arrived components."""
+    from sqlalchemy import select
+    from .models import Component
+    part_state = _part_state()
+    return select(
+        part_state, Component.item_no, Component.description,
+        Component.shelf_code, Component.quantity_remaining
+    ).where(Component.project_task_no == project_id, part_state.isnot(None))
+
+def _is_completed_status(status):
+    s = str(status).lower() if status else ""
+    return s in COMPLETED_STATUSES
+
+def _chunks(values, size=_IN_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _build_status(total, completed):
+    percent = (completed / total) * 100
+
+    # Logic for text status
+    if percent == 100: status_text = "Finished"
+    elif percent > 0: status_text = "In Progress"
+    else: status_text = "Planned"
+
+    return {
+        "status": status_text,
+        "percentage": round(percent, 1),
+        "total": total,
+        "completed": completed
+    }
+
+@timed('orm')
+def get_project_statuses(project_ids=None):
+    """
+    Calculates % complete for many projects at once.
+
+    Work orders are counted per (project, status) in one grouped query, so the
+    cost no longer depends on how many work orders each project has. The
+    completion test runs once per distinct status string instead of per row.
+    With project_ids=None every project that has work orders is returned;
+    otherwise exactly the requested ids are returned (projects without work
+    orders fall back to their note status, like the single-project lookup).
+    Raises on database errors; callers decide how to degrade.
+    """
+    from .models import WorkOrder, ProjectNote
+    base = status_counts_query()
+
+    if project_ids is None:
+        rows = db.session.execute(base).all()
+    else:
+        wanted = list(dict.fromkeys(project_ids))
+        rows = []
+        for chunk in _chunks([p_id for p_id in wanted if p_id is not None]):
+            rows.extend(db.session.execute(base.where(WorkOrder.project_task_no.in_(chunk))).all())
+        if None in wanted:
+            # filter_by(project_task_no=None) matched NULL rows; keep that behaviour
+            rows.extend(db.session.execute(base.where(WorkOrder.project_task_no.is_(None))).all())
+
+    completed_cache = {}
+    counts = {}  # project_id -> [total, completed]
+    for p_id, status, n in rows:
+        if not p_id and project_ids is None:
+            continue
+        done = completed_cache.get(status)
+        if done is None:
+            done = completed_cache[status] = _is_completed_status(status)
+        entry = counts.setdefault(p_id, [0, 0])
+        entry[0] += n
+        if done:
+            entry[1] += n
+
+    statuses = {p_id: _build_status(total, completed) for p_id, (total, completed) in counts.items()}
+
+    if project_ids is not None:
+        missing = [p_id for p_id in wanted if p_id not in statuses]
+        notes = {}
+        for chunk in _chunks([p_id for p_id in missing if p_id is not None]):
+            for note in ProjectNote.query.filter(ProjectNote.project_task_no.in_(chunk)).all():
+                notes[note.project_task_no] = note
+        for p_id in missing:
+            # Check if it's in notes even if no work orders exist
+            note = notes.get(p_id)
+            status_text = note.pause_status if note and note.pause_status else "No Data"
+            statuses[p_id] = {"status": status_text, "percentage": 0, "total": 0, "completed": 0}
+
+    return statuses
+
+# --- 4. PROJECT DETAILS ---
+@timed('orm')
+def get_work_order_rows(project_id):
+    """Work orders of one project as response dicts."""
+    orders = db.session.execute(work_orders_query(project_id)).scalars().all()
+    result = []
+    for wo in orders:
+        is_completed = wo.status in ['Zaključeno', 'Completed', 'Finished']
+        result.append({
+            "work_order_no": wo.work_order_no,
+            "description": wo.description,
+            "status": wo.status,
+            "quantity": wo.quantity,
+            "is_completed": is_completed,
+            "completion_source": "auto" if is_completed else "none"
+        })
+    return result
+
+@lru_cache(maxsize=None)
+def _part_state():
+    from sqlalchemy import and_, case, func
+    from .models import Component
+    remaining = func.coalesce(Component.quantity_remaining, 0)
+    stock = func.coalesce(Component.inventory_stock, 0)
+    return case(
+        (and_(remaining > 0, stock <= 0), 'missing'),  # still needed, nothing in stock
+        (stock > 0, 'arrived'),
+        else_=None,
+    )
+
+@timed('orm')
+def get_project_parts(project_id):
+    """
+    Missing and arrived components of one project in a single query.
+    The classification runs in SQL and rows come back as plain tuples,
+    so no ORM objects are built. Returns {"missing": [...], "arrived": [...]}.
+    """
+    rows = db.session.execute(project_parts_query(project_id)).all()
+
+    parts = {"missing": [], "arrived": []}
+    for state, item_no, description, shelf_code, remaining in rows:
+        parts[state].append({
+            "item_no": item_no,
+            "description": description,
+            "sifra_regala": shelf_code or "N/A",
+            "quantity_needed": remaining
+        })
+    return parts
+
+# --- 5. PERMISSIONS ---
 def check_layout_item_ownership(item_id, layout_data, username):
     return None, None 
 
-# --- 4. UPDATES ---
+# --- 6. UPDATES ---
 def update_project_status(project_id, field, value):
+    from .models import ProjectNote
     try:
         note = ProjectNote.query.get(project_id)
         if not note:
@@ -74,9 +205,10 @@ def update_project_status(project_id, field, value):
             db.session.add(note)
         
         if field == 'priority': note.priority = value
-        elif field == 'pause_status': note.status = value
+        elif field == 'pause_status': note.pause_status = value
             
         db.session.commit()
+        mark_changed('project_notes', project_id)
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": str(e)}, 500
\ No newline at end of file
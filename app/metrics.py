@@ -0,0 +1,412 @@
+# app/metrics.py
+"""
+Per-request performance metrics, kept in process memory.
+
+init_app() measures every request: wall time, SQL statements and their time
+(pooled sqlite connections through db.py's statement observers, SQLAlchemy
+through engine events once the ORM is loaded), shared cache hits/misses and
+the response size. Parts of a request can be timed as named sections with
+section() or @timed(): 'orm' (queries plus building rows), 'actual_time'
+(calculate_actual_time_totals), 'json' (serialization). Sections include
+the SQL they run, so they overlap with the SQL time.
+
+Values go into RollingHistograms per endpoint (method + URL rule) that only
+cover the last WINDOW_SECONDS, so /api/admin/metrics shows how the app
+behaves now rather than since start. Every worker process keeps its own.
+
+Requests slower than SLOW_REQUEST_MS (config, 0 turns the log off) are kept
+in a short log with their slowest statements and EXPLAIN QUERY PLAN output,
+captured after the response has been sent.
+"""
+import bisect
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, wraps
+from urllib.parse import quote
+
+from flask import current_app, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+WINDOW_SECONDS = 600
+SLOTS = 10
+DEFAULT_SLOW_REQUEST_MS = 1000
+SLOW_LOG_SIZE = 50
+SLOWEST_STATEMENTS = 5
+
+# Upper bucket bounds (inclusive); values above the last one share an open bucket
+MS_BOUNDS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+COUNT_BOUNDS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BOUNDS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class RollingHistogram:
+    """
+    Fixed-bucket histogram over the last `window` seconds, kept as `slots`
+    time slices; a slice is reset when it is reused for a newer interval.
+    Percentiles are interpolated inside the bucket they fall into.
+    """
+
+    def __init__(self, bounds, window=WINDOW_SECONDS, slots=SLOTS):
+        self.bounds = bounds
+        self.slot_seconds = window / slots
+        self._slots = [self._empty(-1) for _ in range(slots)]
+
+    def _empty(self, index):
+        return {"index": index, "buckets": [0] * (len(self.bounds) + 1), "count": 0, "sum": 0.0, "max": 0.0}
+
+    def _index(self, now):
+        return int((time.time() if now is None else now) // self.slot_seconds)
+
+    def add(self, value, now=None):
+        index = self._index(now)
+        position = index % len(self._slots)
+        slot = self._slots[position]
+        if slot["index"] != index:
+            slot = self._slots[position] = self._empty(index)
+        slot["buckets"][bisect.bisect_left(self.bounds, value)] += 1
+        slot["count"] += 1
+        slot["sum"] += value
+        slot["max"] = max(slot["max"], value)
+
+    def _percentile(self, buckets, count, q, maximum):
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(buckets):
+            if n and seen + n >= rank:
+                upper = min(self.bounds[i] if i < len(self.bounds) else maximum, maximum)
+                lower = min(self.bounds[i - 1] if i else 0, upper)
+                return round(lower + (upper - lower) * (rank - seen) / n, 2)
+            seen += n
+        return round(maximum, 2)
+
+    def summary(self, now=None):
+        index = self._index(now)
+        live = [s for s in self._slots if index - len(self._slots) < s["index"] <= index and s["count"]]
+        count = sum(s["count"] for s in live)
+        if not count:
+            return {"count": 0}
+        buckets = [sum(column) for column in zip(*(s["buckets"] for s in live))]
+        total = sum(s["sum"] for s in live)
+        maximum = max(s["max"] for s in live)
+        return {
+            "count": count,
+            "mean": round(total / count, 2),
+            "p50": self._percentile(buckets, count, 0.50, maximum),
+            "p90": self._percentile(buckets, count, 0.90, maximum),
+            "p99": self._percentile(buckets, count, 0.99, maximum),
+            "max": round(maximum, 2),
+            "total": round(total, 2),
+        }
+
+
+class EndpointMetrics:
+    """Histograms and counters of one endpoint."""
+
+    def __init__(self):
+        self.wall_ms = RollingHistogram(MS_BOUNDS)
+        self.sql_ms = RollingHistogram(MS_BOUNDS)
+        self.sql_statements = RollingHistogram(COUNT_BOUNDS)
+        self.response_bytes = RollingHistogram(BYTES_BOUNDS)
+        self.sections = {}
+        # Counted since start (or the last reset)
+        self.statuses = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.errors = 0
+        self.last_error = None
+
+    def summary(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "wall_ms": self.wall_ms.summary(),
+            "sql_ms": self.sql_ms.summary(),
+            "sql_statements": self.sql_statements.summary(),
+            "response_bytes": self.response_bytes.summary(),
+            "sections_ms": {name: h.summary() for name, h in sorted(self.sections.items())},
+            "statuses": dict(sorted(self.statuses.items())),
+            "cache": {"hits": self.cache_hits, "misses": self.cache_misses,
+                      "hit_ratio": round(self.cache_hits / lookups, 4) if lookups else None},
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+class RequestMetrics:
+    """What one request has used so far; lives in a context variable while it runs."""
+
+    _sequence = itertools.count()
+
+    def __init__(self, keep_statements):
+        self.started = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.sections = {}
+        self.open_sections = set()
+        self.keep_statements = keep_statements
+        self.slowest = []  # heap of (seconds, seq, sql, params, db_path)
+
+    def add_statement(self, sql, seconds, params, db_path):
+        self.sql_statements += 1
+        self.sql_seconds += seconds
+        if self.keep_statements:
+            item = (seconds, next(self._sequence), sql, params, db_path)
+            if len(self.slowest) < SLOWEST_STATEMENTS:
+                heapq.heappush(self.slowest, item)
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.slow_requests = deque(maxlen=SLOW_LOG_SIZE)
+        self.started = time.time()
+
+    def _endpoint(self, key):
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints[key] = EndpointMetrics()
+        return endpoint
+
+    def record(self, key, current, wall_ms, status, size):
+        with self._lock:
+            endpoint = self._endpoint(key)
+            endpoint.wall_ms.add(wall_ms)
+            endpoint.sql_ms.add(current.sql_seconds * 1000)
+            endpoint.sql_statements.add(current.sql_statements)
+            if size is not None:
+                endpoint.response_bytes.add(size)
+            for name, seconds in current.sections.items():
+                histogram = endpoint.sections.get(name)
+                if histogram is None:
+                    histogram = endpoint.sections[name] = RollingHistogram(MS_BOUNDS)
+                histogram.add(seconds * 1000)
+            status_class = f"{status // 100}xx"
+            endpoint.statuses[status_class] = endpoint.statuses.get(status_class, 0) + 1
+            endpoint.cache_hits += current.cache_hits
+            endpoint.cache_misses += current.cache_misses
+
+    def error(self, key, exc):
+        with self._lock:
+            endpoint = self._endpoint(key)
+            endpoint.errors += 1
+            endpoint.last_error = {"at": time.strftime('%Y-%m-%dT%H:%M:%S'), "type": type(exc).__name__,
+                                   "message": str(exc)[:500]}
+
+    def snapshot(self, slow=True):
+        """Endpoints ordered by total time spent in the window, busiest first."""
+        with self._lock:
+            endpoints = [dict(endpoint=key, **endpoint.summary()) for key, endpoint in self._endpoints.items()]
+            slow_requests = list(self.slow_requests) if slow else None
+        endpoints.sort(key=lambda e: e["wall_ms"].get("total", 0), reverse=True)
+        data = {
+            "pid": os.getpid(),
+            "window_seconds": WINDOW_SECONDS,
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "endpoints": endpoints,
+        }
+        if slow:
+            data["slow_requests"] = slow_requests
+        return data
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self.slow_requests.clear()
+            self.started = time.time()
+
+
+registry = MetricsRegistry()
+_current = ContextVar('request_metrics', default=None)
+_installed = False
+
+
+# --- 1. SECTIONS ---
+@contextmanager
+def section(name):
+    """Adds the block's duration to the current request's section `name` (nested repeats count once)."""
+    current = _current.get()
+    if current is None or name in current.open_sections:
+        yield
+        return
+    current.open_sections.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.open_sections.discard(name)
+        current.sections[name] = current.sections.get(name, 0.0) + time.perf_counter() - started
+
+
+def timed(name):
+    """Decorator form of section()."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with jsonify()/json.dumps timed as the 'json' section."""
+
+    def dumps(self, obj, **kwargs):
+        with section('json'):
+            return super().dumps(obj, **kwargs)
+
+
+# --- 2. ERRORS ---
+def _endpoint_key():
+    rule = request.url_rule
+    return f"{request.method} {rule.rule if rule is not None else '<unmatched>'}"
+
+
+def record_exception(exc):
+    """For exceptions a view catches and answers itself: prints the traceback and counts it for the endpoint."""
+    traceback.print_exception(type(exc), exc, exc.__traceback__)
+    if has_request_context() and current_app.config.get('METRICS_ENABLED'):
+        registry.error(_endpoint_key(), exc)
+
+
+# --- 3. OBSERVERS ---
+def _on_statement(sql, seconds, params, db_path):
+    current = _current.get()
+    if current is not None:
+        current.add_statement(sql, seconds, params, db_path)
+
+
+def _on_cache_lookup(key, hit):
+    current = _current.get()
+    if current is not None:
+        if hit:
+            current.cache_hits += 1
+        else:
+            current.cache_misses += 1
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    current = _current.get()
+    started = conn.info.get('metrics_started')
+    if current is not None and started:
+        current.add_statement(statement, time.perf_counter() - started.pop(),
+                              None if executemany else parameters, conn.engine.url.database)
+
+
+def _listen_to_engines(real_db):
+    # Class-level listeners also cover engines created after this point (binds)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _before_cursor)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor)
+
+
+# --- 4. SLOW REQUEST LOG ---
+def explain(sql, params, db_path):
+    """EXPLAIN QUERY PLAN lines for a SELECT on a read-only connection; None for other statements."""
+    if params is None or not db_path or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+        try:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+
+
+def _log_slow_request(entry, statements):
+    entry["statements"] = [
+        {"ms": round(seconds * 1000, 2), "sql": " ".join(sql.split())[:2000], "plan": explain(sql, params, db_path)}
+        for seconds, _, sql, params, db_path in sorted(statements, reverse=True)
+    ]
+    print(f"WARNING: slow request {entry['method']} {entry['path']} took {entry['wall_ms']:.0f} ms "
+          f"({entry['sql_statements']} SQL statements, {entry['sql_ms']:.0f} ms SQL)")
+    registry.slow_requests.append(entry)
+
+
+# --- 5. REQUEST HOOKS ---
+def _before_request():
+    current = RequestMetrics(keep_statements=current_app.config['SLOW_REQUEST_MS'] > 0)
+    request.environ['app.metrics_token'] = _current.set(current)
+
+
+def _after_request(response):
+    current = _current.get()
+    if current is None:
+        return response
+    wall_ms = (time.perf_counter() - current.started) * 1000
+    key = _endpoint_key()
+    registry.record(key, current, wall_ms, response.status_code, response.content_length)
+
+    slow_ms = current_app.config['SLOW_REQUEST_MS']
+    if slow_ms and wall_ms >= slow_ms:
+        entry = {
+            "at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "method": request.method,
+            "path": request.full_path.rstrip('?'),
+            "endpoint": key,
+            "status": response.status_code,
+            "wall_ms": round(wall_ms, 2),
+            "sql_statements": current.sql_statements,
+            "sql_ms": round(current.sql_seconds * 1000, 2),
+            "sections_ms": {name: round(s * 1000, 2) for name, s in current.sections.items()},
+        }
+        # Query plans are read once the client has its response
+        response.call_on_close(partial(_log_slow_request, entry, list(current.slowest)))
+    return response
+
+
+def _teardown_request(exc):
+    if exc is not None and _current.get() is not None:
+        registry.error(_endpoint_key(), exc)
+    token = request.environ.pop('app.metrics_token', None)
+    if token is not None:
+        _current.reset(token)
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+    if not app.config['METRICS_ENABLED']:
+        return
+    global _installed
+    if not _installed:
+        from .db import add_statement_observer
+        from .shared_cache import add_lookup_observer
+        from .extensions import db
+        add_statement_observer(_on_statement)
+        add_lookup_observer(_on_cache_lookup)
+        db.on_load(_listen_to_engines)
+        _installed = True
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.extensions['metrics'] = registry
+
+
+def snapshot(slow=True):
+    return registry.snapshot(slow=slow)
+
+
+def reset():
+    registry.reset()
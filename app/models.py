@@ -24,6 +24,7 @@ class Component(db.Model):
     item_no = db.Column('Št. Artikla', db.Float, index=True)
     description = db.Column('Opis', db.String)
     work_order_no = db.Column('DNI', db.String, index=True) # Link to WorkOrder
+    project_task_no = db.Column('Št.Projektne naloge', db.String, index=True)
     quantity_needed = db.Column('Pričakovana količina', db.Float)
     quantity_remaining = db.Column('Preostala količina', db.Float)
     inventory_stock = db.Column('Zaloga', db.Float)
@@ -40,8 +41,10 @@ class TimeEntry(db.Model):
     work_order_no = db.Column('DNI', db.String)
 
 # --- 4. ADMIN & NOTES (Rescued Tables) ---
+# These live in velika_montaza.db (SQLALCHEMY_BINDS['velika_montaza']), not in the ERP snapshot
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __bind_key__ = 'velika_montaza'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150))
     password_hash = db.Column(db.String(200))
@@ -49,8 +52,9 @@ class User(UserMixin, db.Model):
 
 class ProjectNote(db.Model):
     __tablename__ = 'project_notes'
+    __bind_key__ = 'velika_montaza'
     # This table came from the old DB, so it might use English names
     project_task_no = db.Column(db.String, primary_key=True)
     notes = db.Column(db.Text)
     priority = db.Column(db.String)
-    status = db.Column(db.String)
\ No newline at end of file
+    pause_status = db.Column(db.String)
\ No newline at end of file
@@ -0,0 +1,265 @@
+# app/photos.py
+"""
+Project photo storage.
+
+Uploads are streamed to a temp file in UPLOAD_FOLDER chunk by chunk and
+hashed while they are written. The finished file is renamed to
+<sha256>.<ext>, so a photo uploaded twice is stored once and its URL never
+changes meaning, which is what lets the browser cache it forever.
+
+Phones upload multi-megabyte originals, but the detail panel only needs a
+small tile. A background pool renders a thumbnail and a medium-size JPEG
+per photo into UPLOAD_FOLDER/_derived. Pillow is optional: without it no
+derivatives are made, the photo list offers only the original and a
+warning is printed at startup.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+CHUNK_SIZE = 256 * 1024
+MAX_PHOTO_BYTES = 40 * 1024 * 1024
+# variant -> longest edge in pixels
+DERIVATIVES = {"thumb": 320, "medium": 1600}
+JPEG_QUALITY = 82
+DERIVED_DIR = "_derived"
+PHOTO_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# Magic bytes -> extension; anything else is rejected
+_SIGNATURES = (
+    (0, b'\xff\xd8\xff', 'jpg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'GIF8', 'gif'),
+    (8, b'WEBP', 'webp'),
+    (4, b'ftypheic', 'heic'),
+    (4, b'ftypheix', 'heic'),
+    (4, b'ftypmif1', 'heic'),
+)
+_CONTENT_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z]+$')
+
+_pool = {"executor": None, "pid": None}
+_pool_lock = threading.Lock()
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+class UnsupportedPhoto(ValueError):
+    pass
+
+
+def is_content_addressed(filename):
+    """Content-addressed names never change content, so they may be cached forever."""
+    return bool(_CONTENT_NAME.match(filename))
+
+
+def _upload_dir():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def original_path(filename):
+    path = safe_join(_upload_dir(), filename)
+    if path is None or os.path.normpath(os.path.dirname(path)) != os.path.normpath(_upload_dir()):
+        raise NotFound()
+    return path
+
+
+def derived_path(filename, variant):
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(_upload_dir(), DERIVED_DIR, f"{stem}_{variant}.jpg")
+
+
+def warn_if_unavailable():
+    if Image is None:
+        print("WARNING: Pillow is not installed; photos are served at full size only (pip install Pillow)")
+
+
+def photo_urls(filename):
+    """URLs for the photo list: thumbnail, medium size and the untouched original."""
+    if Image is None:
+        # A size URL would only serve the original under another name, uncacheable
+        original = f"/api/photos/original/{filename}"
+        return {"url": original, "original_url": original}
+    return {
+        "url": f"/api/photos/thumb/{filename}",
+        "medium_url": f"/api/photos/medium/{filename}",
+        "original_url": f"/api/photos/original/{filename}",
+    }
+
+
+def list_photos(conn, project_id):
+    """Photo dicts for a project from project_photos (velika_montaza.db), oldest first."""
+    return [{"filename": filename, **photo_urls(filename), "uploaded_at": uploaded_at}
+            for filename, uploaded_at in conn.execute(
+                "SELECT filename, uploaded_at FROM project_photos WHERE project_task_no = ? ORDER BY id",
+                (project_id,))]
+
+
+# --- 1. STREAMING UPLOADS ---
+class HashingWriter:
+    """
+    Temp file in the upload folder that hashes and counts what is written to
+    it. Used as werkzeug's multipart stream_factory target and for raw bodies.
+    """
+
+    def __init__(self, directory, limit=MAX_PHOTO_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.limit = limit
+        self.size = 0
+        self.head = b''
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            raise RequestEntityTooLarge(f"Photos are limited to {self.limit // (1024 * 1024)} MB")
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # seek/read/flush/close for werkzeug's FileStorage
+        return getattr(self._file, name)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def stream_to_writer(stream, writer):
+    """Copies a raw request body into writer in CHUNK_SIZE pieces."""
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return writer
+        writer.write(chunk)
+
+
+def _extension(head):
+    for offset, magic, ext in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return ext
+    return None
+
+
+def commit_upload(writer):
+    """
+    Moves a finished upload to its content-addressed name and returns that
+    name. An identical file already on disk is kept and the upload dropped.
+    """
+    ext = _extension(writer.head)
+    if ext is None:
+        writer.discard()
+        raise UnsupportedPhoto("Unsupported image type (expected JPEG, PNG, GIF, WebP or HEIC)")
+    filename = f"{writer.hexdigest()}.{ext}"
+    target = original_path(filename)
+    writer.flush()
+    os.fsync(writer.fileno())
+    writer.close()
+    if os.path.exists(target):
+        os.remove(writer.path)
+    else:
+        os.replace(writer.path, target)
+    return filename
+
+
+# --- 2. DERIVATIVES ---
+def _executor():
+    with _pool_lock:
+        # After a fork the parent's worker threads don't exist in this process
+        if _pool["executor"] is None or _pool["pid"] != os.getpid():
+            _pool["executor"] = ThreadPoolExecutor(max_workers=PHOTO_WORKERS, thread_name_prefix="photo-derivatives")
+            _pool["pid"] = os.getpid()
+        return _pool["executor"]
+
+
+def _render(source, target, size):
+    with Image.open(source) as img:
+        img.draft('RGB', (size, size))  # JPEG: decode at reduced scale, much faster on phone photos
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.derive-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                img.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            os.replace(tmp, target)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def generate_derivatives(source, targets):
+    """Renders {variant: target path} from source; runs on the pool."""
+    try:
+        for variant, target in targets.items():
+            if not os.path.exists(target):
+                _render(source, target, DERIVATIVES[variant])
+    except Exception as e:
+        print(f"⚠️ Could not create photo derivatives for {os.path.basename(source)}: {e}")
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(source)
+
+
+def schedule_derivatives(filename):
+    """Queues thumbnail/medium rendering for a stored photo; no-op without Pillow or when already done."""
+    if Image is None:
+        return False
+    source = original_path(filename)
+    targets = {variant: derived_path(filename, variant) for variant in DERIVATIVES}
+    if all(os.path.exists(t) for t in targets.values()):
+        return False
+    with _in_flight_lock:
+        if source in _in_flight:
+            return True
+        _in_flight.add(source)
+    os.makedirs(os.path.join(_upload_dir(), DERIVED_DIR), exist_ok=True)
+    _executor().submit(generate_derivatives, source, targets)
+    return True
+
+
+def variant_path(filename, variant):
+    """
+    (path, is_final) for serving one size of a photo. A derivative that does
+    not exist yet falls back to the original and is queued; is_final is then
+    False so the fallback isn't cached under the derivative's URL.
+    """
+    source = original_path(filename)
+    if variant == 'original':
+        return source, True
+    target = derived_path(filename, variant)
+    if os.path.exists(target):
+        return target, True
+    if os.path.exists(source):
+        schedule_derivatives(filename)
+    return source, False
+
+
+def remove_files(filename):
+    """Deletes the original and its derivatives."""
+    for path in [original_path(filename)] + [derived_path(filename, v) for v in DERIVATIVES]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
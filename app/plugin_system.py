@@ -1,66 +1,165 @@
 # app/plugin_system.py
+"""
+Plugin discovery and loading.
+
+Plugins are packages in PLUGINS_DIR (the top-level plugins/ folder), imported
+as plugins.<name>. Discovery never executes plugin code: PLUGIN_META is read
+from an optional plugin.json manifest or, failing that, parsed out of
+__init__.py with ast.literal_eval. Results are cached per plugin on the
+file mtimes and the folder listing on the directory mtime, so listing
+dozens of plugins costs a few stat() calls. Only enabled plugins are
+imported, and each load records its import and register() timings.
+"""
+import ast
+import copy
 import importlib
 import json
 import os
-from typing import Dict, Any
+import sys
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+from . import startup_profile
+
+MANIFEST_NAME = "plugin.json"
+
+_cache_lock = threading.Lock()
+_dir_cache: Dict[str, Any] = {"path": None, "stamp": None, "names": []}
+_meta_cache: Dict[str, Tuple[Any, Dict[str, Any]]] = {}   # package dir -> (file stamps, entry)
+_state_cache: Dict[str, Any] = {"path": None, "stamp": None, "state": {}}
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
 
 def _read_state(app) -> Dict[str, Any]:
     path = app.config['PLUGINS_STATE_FILE']
-    if not os.path.exists(path):
-        return {}
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f) or {}
-    except Exception:
-        return {}
+    stamp = _mtime(path)
+    with _cache_lock:
+        if _state_cache["path"] == path and _state_cache["stamp"] == stamp:
+            return copy.deepcopy(_state_cache["state"])  # callers may modify their copy
+    state: Dict[str, Any] = {}
+    if stamp is not None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f) or {}
+        except Exception:
+            state = {}
+    with _cache_lock:
+        _state_cache.update(path=path, stamp=stamp, state=state)
+    return copy.deepcopy(state)
 
 
 def _write_state(app, state: Dict[str, Any]) -> None:
     path = app.config['PLUGINS_STATE_FILE']
-    with open(path, 'w', encoding='utf-8') as f:
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
         json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _static_meta(package_dir: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """(PLUGIN_META, error) without importing: plugin.json first, then a literal in __init__.py."""
+    manifest = os.path.join(package_dir, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        try:
+            with open(manifest, 'r', encoding='utf-8') as f:
+                return json.load(f) or {}, None
+        except Exception as e:
+            return {}, f"{MANIFEST_NAME}: {e}"
+    try:
+        with open(os.path.join(package_dir, '__init__.py'), 'rb') as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError) as e:
+        return {}, f"__init__.py: {e}"
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == 'PLUGIN_META' for t in targets):
+            try:
+                return ast.literal_eval(value) or {}, None
+            except ValueError:
+                return {}, "PLUGIN_META is not a literal; move it to plugin.json"
+    return {}, None
 
 
 def _discover_packages(app) -> Dict[str, str]:
     """
-    Returns {plugin_name: module_path}, scanning app/plugins/* packages that have __init__.py
+    Returns {plugin_name: package_dir} for the PLUGINS_DIR/* packages that have
+    __init__.py. The listing is cached until the directory mtime changes.
     """
     base_dir = app.config['PLUGINS_DIR']
-    results: Dict[str, str] = {}
-    if not os.path.isdir(base_dir):
-        return results
-    for entry in os.listdir(base_dir):
-        full = os.path.join(base_dir, entry)
-        if os.path.isdir(full) and os.path.exists(os.path.join(full, '__init__.py')):
-            results[entry] = f"app.plugins.{entry}"
-    return results
+    stamp = _mtime(base_dir)
+    with _cache_lock:
+        if _dir_cache["path"] == base_dir and _dir_cache["stamp"] == stamp:
+            return {name: os.path.join(base_dir, name) for name in _dir_cache["names"]}
+    names = []
+    if stamp is not None and os.path.isdir(base_dir):
+        for entry in sorted(os.listdir(base_dir)):
+            full = os.path.join(base_dir, entry)
+            if os.path.isdir(full) and os.path.exists(os.path.join(full, '__init__.py')):
+                names.append(entry)
+    with _cache_lock:
+        _dir_cache.update(path=base_dir, stamp=stamp, names=names)
+    return {name: os.path.join(base_dir, name) for name in names}
+
+
+def _module_path(package_dir: str) -> str:
+    # plugins/<name> -> "plugins.<name>"; the folder's parent must be on sys.path
+    return '.'.join(os.path.normpath(package_dir).split(os.sep)[-2:])
+
+
+def _plugin_entry(name: str, package_dir: str) -> Dict[str, Any]:
+    stamps = (_mtime(package_dir), _mtime(os.path.join(package_dir, '__init__.py')),
+              _mtime(os.path.join(package_dir, MANIFEST_NAME)))
+    with _cache_lock:
+        cached = _meta_cache.get(package_dir)
+        if cached is not None and cached[0] == stamps:
+            return cached[1]
+    meta, error = _static_meta(package_dir)
+    entry = {"module": _module_path(package_dir), "meta": meta, "meta_error": error}
+    with _cache_lock:
+        _meta_cache[package_dir] = (stamps, entry)
+    return entry
 
 
 def get_installed_plugins(app) -> Dict[str, Dict[str, Any]]:
     """
-    Returns metadata for all discovered plugins:
+    Returns metadata for all discovered plugins without importing any of them:
       {
         name: {
           "enabled": bool,
-          "module": "app.plugins.name",
-          "meta": {.}  # PLUGIN_META if provided
+          "module": "plugins.name",
+          "meta": {.},        # PLUGIN_META from plugin.json or __init__.py
+          "meta_error": str | None,
+          "loaded": bool,     # imported in this process
+          "load": {.} | None  # timings/error of the load, see load_plugins()
         }, .
       }
     """
-    discovered = _discover_packages(app)
     state = _read_state(app)
+    loaded = app.extensions.get("loaded_plugins", {})
+    failed = app.extensions.get("failed_plugins", {})
     out: Dict[str, Dict[str, Any]] = {}
-    for name, modpath in discovered.items():
-        enabled = bool(state.get(name, {}).get("enabled", False))
-        meta = {}
-        try:
-            mod = importlib.import_module(modpath)
-            meta = getattr(mod, "PLUGIN_META", {}) or {}
-        except Exception:
-            # Do not fail listing if a plugin has import issues
-            pass
-        out[name] = {"enabled": enabled, "module": modpath, "meta": meta}
+    for name, package_dir in _discover_packages(app).items():
+        entry = _plugin_entry(name, package_dir)
+        record = loaded.get(name) or failed.get(name)
+        out[name] = {
+            "enabled": bool(state.get(name, {}).get("enabled", False)),
+            "module": entry["module"],
+            "meta": entry["meta"],
+            "meta_error": entry["meta_error"],
+            "loaded": name in loaded,
+            "load": {k: v for k, v in record.items() if k.endswith("_ms") or k == "error"} if record else None,
+        }
     return out
 
 
@@ -77,11 +176,14 @@ def load_plugins(app) -> None:
     Imports and registers all ENABLED plugins.
     Each plugin package can export: PLUGIN_META, and def register(app) -> dict
     The register() function is expected to call app.register_blueprint(...) internally,
-    and may return metadata to record.
+    and may return metadata to record. Import and register() times are kept
+    in app.extensions["loaded_plugins"][name].
     """
-    if "loaded_plugins" not in app.extensions:
-        app.extensions["loaded_plugins"] = {}
-    loaded = app.extensions["loaded_plugins"]
+    loaded = app.extensions.setdefault("loaded_plugins", {})
+    failed = app.extensions.setdefault("failed_plugins", {})
+    root = os.path.dirname(os.path.normpath(app.config['PLUGINS_DIR']))
+    if root not in sys.path:
+        sys.path.insert(0, root)
 
     for name, info in get_installed_plugins(app).items():
         if not info["enabled"]:
@@ -89,16 +191,31 @@ def load_plugins(app) -> None:
         if name in loaded:
             continue  # already loaded
 
+        started = time.perf_counter()
         try:
             mod = importlib.import_module(info["module"])
+            imported = time.perf_counter()
             register = getattr(mod, "register", None)
             if callable(register):
                 result = register(app) or {}
             else:
                 result = {}
-            loaded[name] = {"module": info["module"], "meta": info.get("meta", {}), "register_result": result}
-            print(f"[plugins] loaded '{name}' from {info['module']}")
+            done = time.perf_counter()
+            loaded[name] = {
+                "module": info["module"],
+                "meta": getattr(mod, "PLUGIN_META", None) or info.get("meta", {}),
+                "register_result": result,
+                "import_ms": round((imported - started) * 1000, 2),
+                "register_ms": round((done - imported) * 1000, 2),
+                "total_ms": round((done - started) * 1000, 2),
+            }
+            failed.pop(name, None)
+            startup_profile.record("plugin", name, loaded[name]["total_ms"])
+            print(f"[plugins] loaded '{name}' from {info['module']} in {loaded[name]['total_ms']} ms")
         except Exception as e:
+            failed[name] = {"module": info["module"], "error": str(e),
+                            "total_ms": round((time.perf_counter() - started) * 1000, 2)}
+            startup_profile.record("plugin", f"{name} (failed)", failed[name]["total_ms"])
             print(f"[plugins] FAILED to load '{name}': {e}")
 
 
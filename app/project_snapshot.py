@@ -0,0 +1,243 @@
+# app/project_snapshot.py
+"""
+Pre-serialized project documents for the detail panel.
+
+Opening a project used to cost five requests that each queried the database
+on their own. build_snapshot() gathers everything the panel shows (work
+orders with DNI status, parts availability with ETAs, notes, photos and
+actual hours) into one compact JSON document. The encoded bytes and their
+ETag are stored in the shared cache, so serving a snapshot is a cache read.
+
+Snapshots are kept fresh in two ways:
+  * app-side writes (notes, DNI status, photos) call mark_changed(kind,
+    project_id); the cache listener drops the entry and the background
+    worker here rebuilds it right away.
+  * ERP imports change master_unified.db. The worker's poll refreshes the
+    actual hours and queues the affected projects. An entry remembers the DB stamp
+    and PRAGMA user_version it was built from. When only the stamp moved,
+    erp_import.changed_projects_since() tells whether this project was
+    touched by the delta imports in between. If it wasn't, the entry is
+    re-stamped instead of rebuilt.
+"""
+import datetime
+import hashlib
+import os
+import queue
+import threading
+from flask import current_app
+from .db import get_db_connection
+from .data_version import get_erp_version
+from .erp_import import changed_projects_since
+from .extensions import db, shared_cache
+from .helpers import get_project_parts, get_work_order_rows
+from .purchase_eta import add_etas
+from .photos import list_photos
+from .responses import dumps
+
+ERP_POLL_INTERVAL = 5.0
+
+_rebuild_queue = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_worker = {"thread": None, "pid": None, "app": None}
+_worker_lock = threading.Lock()
+_known_projects = set()  # projects this process has built, for the ERP poll
+# Queued by the ERP poll; every worker process polls, so whichever gets to a
+# project first rebuilds it and the others find it current (see _is_current)
+_erp_queued = set()
+
+
+def _key(project_id):
+    return f"snapshot:{project_id}"
+
+
+def _app_data(project_id):
+    """notes row, manual DNI completions and photos from velika_montaza.db."""
+    conn = get_db_connection(current_app.config['VELIKA_MONTAZA_DB_PATH'])
+    if conn is None:
+        return {}, {}, []
+    try:
+        note = conn.execute("SELECT * FROM project_notes WHERE project_task_no = ?", (project_id,)).fetchone()
+        dni_status = {row[0]: bool(row[1]) for row in conn.execute(
+            "SELECT work_order_no, is_completed FROM dni_status WHERE project_task_no = ?", (project_id,))}
+        photos = list_photos(conn, project_id)
+        return (dict(note) if note else {}), dni_status, photos
+    finally:
+        conn.close()
+
+
+def build_snapshot(project_id):
+    """
+    The detail-panel document for one project, as compact UTF-8 JSON bytes,
+    and whether its actual hours were current (see actual_hours.ensure_fresh).
+    """
+    work_orders = get_work_order_rows(project_id)
+    notes, dni_status, photos = _app_data(project_id)
+    for wo in work_orders:
+        manual = dni_status.get(wo["work_order_no"], False)
+        auto = wo["completion_source"] == "auto"
+        wo["is_completed"] = auto or manual
+        wo["completion_source"] = "both" if auto and manual else "auto" if auto else "manual" if manual else "none"
+
+    parts = get_project_parts(project_id)
+    master = get_db_connection(current_app.config['DATABASE_PATH'])
+    if master is not None:
+        try:
+            add_etas(master, parts["missing"])
+        finally:
+            master.close()
+
+    from . import actual_hours  # time calculation modules load on first use
+    hours_fresh = actual_hours.ensure_fresh()
+    per_dni = actual_hours.get_dni_seconds([wo["work_order_no"] for wo in work_orders])
+
+    document = {
+        "project": project_id,
+        "built_at": datetime.datetime.now().isoformat(timespec='seconds'),
+        "work_orders": work_orders,
+        "dni_status": dni_status,
+        "parts": parts,
+        "notes": notes,
+        "photos": photos,
+        "actual_hours": {
+            "total": round(sum(per_dni.values()) / 3600, 2),
+            "dni": {dni: round(s / 3600, 2) for dni, s in per_dni.items()}
+        },
+    }
+    return dumps(document), hours_fresh
+
+
+def _erp_user_version():
+    conn = get_db_connection(current_app.config['DATABASE_PATH'])
+    if conn is None:
+        return None
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _changed_since(user_version):
+    """Projects touched by ERP imports after user_version, or None when unknown."""
+    if user_version is None:
+        return None
+    conn = get_db_connection(current_app.config['DATABASE_PATH'])
+    if conn is None:
+        return None
+    try:
+        return changed_projects_since(conn, user_version)
+    finally:
+        conn.close()
+
+
+def _store(project_id, erp_stamp, user_version, body):
+    etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+    entry = (erp_stamp, user_version, etag, body)
+    shared_cache.set(_key(project_id), entry, tags=("snapshot", f"project:{project_id}"), timeout=0)
+    _known_projects.add(project_id)
+    return entry
+
+
+def _rebuild(project_id):
+    erp_stamp, user_version = get_erp_version(), _erp_user_version()
+    body, hours_fresh = build_snapshot(project_id)
+    if not hours_fresh:
+        # Built while actual hours were still being refreshed: never current, rebuilt on the next read
+        erp_stamp = user_version = None
+    return _store(project_id, erp_stamp, user_version, body)
+
+
+def _is_current(project_id):
+    """True when the stored entry was built or re-stamped for the current master_unified.db."""
+    entry = shared_cache.get(_key(project_id))
+    return entry is not None and entry[0] == get_erp_version()
+
+
+def get_snapshot(project_id):
+    """(body bytes, etag) for a project; built inline only when no usable entry exists."""
+    _ensure_worker()
+    entry = shared_cache.get(_key(project_id))
+    erp_stamp = get_erp_version()
+    if entry is not None and entry[0] != erp_stamp:
+        # master_unified.db changed since the build: keep the entry if no import touched this project
+        changed = _changed_since(entry[1])
+        if changed is not None and project_id not in changed:
+            entry = _store(project_id, erp_stamp, _erp_user_version(), entry[3])
+        else:
+            entry = None
+    if entry is None:
+        entry = _rebuild(project_id)
+    return entry[3], entry[2]
+
+
+# --- BACKGROUND REBUILDS ---
+def schedule_rebuild(project_id):
+    """Queues a background rebuild; repeated requests for the same project collapse into one."""
+    if not project_id:
+        return
+    with _pending_lock:
+        if project_id in _pending:
+            return
+        _pending.add(project_id)
+    _rebuild_queue.put(project_id)
+    _ensure_worker()
+
+
+def on_data_change(kind, project_id=None):
+    """data_version listener; runs after the shared cache dropped the project's entry."""
+    if project_id:
+        schedule_rebuild(project_id)
+
+
+def init_app(app):
+    """Remembers the app for the worker thread, which starts on first use in each process."""
+    _worker["app"] = app
+
+
+def _ensure_worker():
+    if _worker["app"] is None:
+        return
+    with _worker_lock:
+        thread = _worker["thread"]
+        if thread is not None and thread.is_alive() and _worker["pid"] == os.getpid():
+            return
+        # After a fork the parent's thread doesn't exist in this process
+        _worker["pid"] = os.getpid()
+        _worker["thread"] = threading.Thread(target=_run, name="project-snapshots", daemon=True)
+        _worker["thread"].start()
+
+
+def _run():
+    app = _worker["app"]
+    with app.app_context():
+        seen_stamp, seen_version = get_erp_version(), _erp_user_version()
+        while True:
+            try:
+                project_id = _rebuild_queue.get(timeout=ERP_POLL_INTERVAL)
+            except queue.Empty:
+                project_id = None
+            try:
+                if project_id is not None:
+                    with _pending_lock:
+                        _pending.discard(project_id)
+                        from_erp_poll = project_id in _erp_queued
+                        _erp_queued.discard(project_id)
+                    if not (from_erp_poll and _is_current(project_id)):
+                        _rebuild(project_id)
+                    continue
+                stamp = get_erp_version()
+                if stamp == seen_stamp:
+                    continue
+                # Actual hours first, so the rebuilt snapshots include them
+                from . import actual_hours
+                actual_hours.refresh_actual_hours()
+                changed = _changed_since(seen_version)
+                seen_stamp, seen_version = stamp, _erp_user_version()
+                for p_id in (set(_known_projects) if changed is None else changed & _known_projects):
+                    with _pending_lock:
+                        _erp_queued.add(p_id)
+                    schedule_rebuild(p_id)
+            except Exception as e:
+                print(f"⚠️ Project snapshot rebuild failed for '{project_id}': {e}")
+            finally:
+                db.session.remove()
@@ -0,0 +1,125 @@
+# app/purchase_eta.py
+"""
+Purchase-order ETA index.
+
+purchase_eta in master_unified.db lists the open purchase lines
+(Odprta količina > 0) per article, ordered by arrival date, with a running
+total of the open quantity. It is rebuilt by every ERP import, so a missing
+part's ETA is a lookup on (item_key, eta) instead of a search through
+purchase_orders. The earliest *covering* ETA is the first line at which the
+running total reaches the quantity the part still needs.
+"""
+import bisect
+import os
+import sqlite3
+
+# Confirmed arrival date wins over the expected one when purchasing has it
+ETA_SQL = '''
+    SELECT "Št. Artikla", COALESCE("Zagotovljeni datum prevzema", "Pričakovani datum prevzema"),
+           "Odprta količina", "Št. dokumenta", "Zagotovljeni datum prevzema" IS NOT NULL
+    FROM purchase_orders
+    WHERE "Odprta količina" > 0 AND "Št. Artikla" IS NOT NULL
+'''
+LOAD_ETAS_SQL = "SELECT item_key, eta, cumulative_qty FROM purchase_eta WHERE item_key IN (%s) ORDER BY item_key, rowid"
+_IN_CHUNK = 500
+
+
+def item_key(value):
+    """Article numbers are REAL in components, INTEGER in purchase_orders and TEXT in inventory."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    text = str(value).strip()
+    try:
+        number = float(text.replace(',', '.'))
+    except ValueError:
+        return text
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def rebuild_eta_index(conn):
+    """Recreates purchase_eta from purchase_orders; runs inside the caller's transaction."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS purchase_eta (
+            item_key TEXT NOT NULL,
+            eta TEXT,
+            open_qty REAL NOT NULL,
+            cumulative_qty REAL NOT NULL,
+            document_no TEXT,
+            confirmed INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchase_eta_item ON purchase_eta (item_key, eta)")
+    conn.execute("DELETE FROM purchase_eta")
+    try:
+        lines = conn.execute(ETA_SQL).fetchall()
+    except sqlite3.OperationalError:
+        return 0  # no purchase_orders table in this database
+
+    by_item = {}
+    for item, eta, qty, document_no, confirmed in lines:
+        by_item.setdefault(item_key(item), []).append((eta or '9999-12-31', float(qty), document_no, int(confirmed)))
+    rows = []
+    for key, item_lines in by_item.items():
+        item_lines.sort(key=lambda line: line[0])
+        total = 0.0
+        for eta, qty, document_no, confirmed in item_lines:
+            total += qty
+            rows.append((key, None if eta == '9999-12-31' else eta, qty, total, document_no, confirmed))
+    conn.executemany("INSERT INTO purchase_eta VALUES (?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def ensure_eta_index(db_path):
+    """Startup hook for databases that were not produced by erp_import."""
+    if not db_path or not os.path.exists(db_path):
+        return
+    try:
+        conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'purchase_eta'").fetchone():
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            rows = rebuild_eta_index(conn)
+            conn.execute("COMMIT")
+            print(f"Built purchase ETA index ({rows} open lines) in {db_path}")
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not build the purchase ETA index in {db_path}: {e}")
+
+
+def load_etas(conn, item_nos):
+    """{item_key: ([eta, ...], [cumulative_qty, ...])} for the given articles, from purchase_eta."""
+    keys = [k for k in dict.fromkeys(item_key(i) for i in item_nos) if k is not None]
+    index = {}
+    for i in range(0, len(keys), _IN_CHUNK):
+        chunk = keys[i:i + _IN_CHUNK]
+        for key, eta, cumulative in conn.execute(LOAD_ETAS_SQL % ','.join('?' * len(chunk)), chunk):
+            etas, totals = index.setdefault(key, ([], []))
+            etas.append(eta)
+            totals.append(cumulative)
+    return index
+
+
+def covering_eta(index, item_no, quantity_needed):
+    """(earliest ETA whose running open quantity covers quantity_needed or None, total open quantity)."""
+    entry = index.get(item_key(item_no))
+    if not entry:
+        return None, 0
+    etas, totals = entry
+    pos = bisect.bisect_left(totals, quantity_needed or 0)
+    return (etas[pos] if pos < len(etas) else None), totals[-1]
+
+
+def add_etas(conn, parts):
+    """Adds 'eta' and 'open_quantity' to missing-part dicts (item_no, quantity_needed) with one indexed query."""
+    try:
+        index = load_etas(conn, [p["item_no"] for p in parts])
+    except sqlite3.OperationalError as e:
+        print(f"WARNING: Purchase ETA index unavailable: {e}")
+        index = {}
+    for part in parts:
+        part["eta"], part["open_quantity"] = covering_eta(index, part["item_no"], part["quantity_needed"])
+    return parts
@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import json
+from functools import wraps
+from flask import g, request, make_response, jsonify
+from .data_version import get_data_version
+from .extensions import shared_cache
+from .metrics import record_exception, section
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this aren't worth a compression round trip
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def make_etag(*parts):
+    return hashlib.blake2b('\x1f'.join(str(p) for p in parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes; orjson when installed, the stdlib encoder otherwise."""
+    with section('json'):
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass  # types orjson refuses (e.g. Decimal) go through the stdlib encoder
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def error_response(exc, status=500):
+    """{"error": message} for an exception the view caught; the traceback is printed and counted in metrics."""
+    record_exception(exc)
+    return jsonify({"error": str(exc)}), status
+
+
+def uncacheable():
+    """
+    Marks the current conditional_json response as not to be cached: the body
+    is sent without an ETag and kept out of the shared cache, e.g. while it is
+    built from data that is still being brought up to date.
+    """
+    g.uncacheable = True
+
+
+def _columns_of(rows):
+    keys = list(dict.fromkeys(k for row in rows for k in row))
+    return {"length": len(rows), "columns": {k: [row.get(k) for row in rows] for k in keys}}
+
+
+def to_columns(data):
+    """
+    "Array of columns" form of a list payload: [{a:1,b:2},{a:3,b:4}] becomes
+    {"length": 2, "columns": {"a": [1,3], "b": [2,4]}}, so each key is sent once.
+    A dict of row dicts gets its keys as an extra "_key" column; lists of rows
+    one level down (e.g. layout "items") are converted in place.
+    """
+    if isinstance(data, list):
+        return _columns_of(data) if all(isinstance(row, dict) for row in data) else data
+    if isinstance(data, dict):
+        if data and all(isinstance(v, dict) for v in data.values()):
+            return _columns_of([{"_key": k, **v} for k, v in data.items()])
+        return {k: _columns_of(v) if isinstance(v, list) and v and all(isinstance(r, dict) for r in v) else v
+                for k, v in data.items()}
+    return data
+
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def _encoded_response(body, encoding):
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def conditional_json(view):
+    """
+    Adds a strong ETag derived from the request URL and the current data version.
+    A matching If-None-Match is answered with 304 before the view runs, so a poll
+    on unchanged data never rebuilds its body.
+
+    Views may return plain data (dict/list) instead of jsonify(): it is then
+    encoded compactly, compressed for the client's Accept-Encoding and the
+    bytes are kept in the shared cache for this data version, so the next
+    client on the same version gets them without running the view.
+    ?format=columns returns list payloads as arrays of columns (see to_columns).
+    A view that called uncacheable() gets neither the cache nor an ETag.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        version = get_data_version()
+        encoding = _negotiate_encoding()
+        # Each content-coding is its own representation, so it gets its own ETag
+        etag = make_etag(request.full_path, version, encoding)
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.headers['Vary'] = 'Accept-Encoding'
+        else:
+            cache_key = f"response:{encoding or 'identity'}:{request.full_path}"
+            cached = shared_cache.get(cache_key, version=version)
+            if cached is not None:
+                response = _encoded_response(cached[1], cached[0])
+            else:
+                rv = view(*args, **kwargs)
+                if isinstance(rv, (dict, list)):
+                    body = dumps(to_columns(rv) if request.args.get('format') == 'columns' else rv)
+                else:
+                    response = make_response(rv)
+                    if response.status_code != 200 or response.mimetype != 'application/json':
+                        return response
+                    body = response.get_data()
+                if len(body) < MIN_COMPRESS_BYTES:
+                    encoding = None
+                body = compress(body, encoding)
+                response = _encoded_response(body, encoding)
+                if g.pop('uncacheable', False):
+                    response.headers['Cache-Control'] = 'no-store'
+                    return response
+                shared_cache.set(cache_key, (encoding, body), tags=("responses",), version=version)
+        response.set_etag(etag)
+        # Let browsers keep the body but revalidate it on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return decorated_function
+
+
+def prebuilt_json(body, etag):
+    """Response for already-encoded JSON bytes with a content ETag; 304 when the client has them."""
+    encoding = _negotiate_encoding() if len(body) >= MIN_COMPRESS_BYTES else None
+    etag = f"{etag}-{encoding}" if encoding else etag
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.headers['Vary'] = 'Accept-Encoding'
+    else:
+        response = _encoded_response(compress(body, encoding), encoding)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
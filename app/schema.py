@@ -0,0 +1,181 @@
+# app/schema.py
+"""
+Index maintenance and query-plan audit for master_unified.db.
+
+The ERP database is produced outside this app, so the index=True columns of
+the models never exist there. ensure_indexes() creates the indexes the hot
+endpoint queries need (composite/covering where the query reads only a few
+columns) and refreshes the planner statistics with ANALYZE. audit_query_plans()
+runs EXPLAIN QUERY PLAN over hot_queries(), the statements the app actually
+runs, and reports any that fall back to a full table SCAN.
+"""
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+# (index name, table, columns) -- the leading columns are the lookup keys,
+# trailing ones make the index covering for the queries below
+INDEXES = (
+    ('idx_work_orders_no', 'work_orders', ('Št.',)),
+    ('idx_work_orders_project', 'work_orders', ('Št.Projekta',)),
+    ('idx_work_orders_project_task', 'work_orders', ('Št.Projektne naloge', 'Stanje', 'Št.')),
+    ('idx_components_dni', 'components', ('DNI',)),
+    ('idx_components_item', 'components', ('Št. Artikla',)),
+    ('idx_components_project_stock', 'components', ('Št.Projektne naloge', 'Zaloga', 'Preostala količina')),
+    ('idx_time_entries_worker_from', 'time_entries', ('Št. delavca', 'Od datuma in ure')),
+    ('idx_time_entries_dni', 'time_entries', ('DNI',)),
+    ('idx_time_entries_project', 'time_entries', ('Št.Projektne naloge',)),
+    ('idx_time_entries_guid', 'time_entries', ('Time Entry GUID',)),
+    ('idx_purchase_orders_item', 'purchase_orders', ('Št. Artikla',)),
+    ('idx_inventory_item', 'inventory', ('Št. Artikla',)),
+)
+
+# Scan policy of an audited query: a lookup must not SCAN at all, an aggregate
+# may scan a covering index but not the table, a bulk read is meant to read
+# the whole table (audited for the rest of its plan and that it still runs).
+LOOKUP, AGGREGATE, BULK = 'lookup', 'aggregate', 'bulk'
+
+
+def _compiled(statement):
+    """SQLite SQL of a SQLAlchemy statement, with ? placeholders."""
+    from sqlalchemy.dialects import sqlite
+    return str(statement.compile(dialect=sqlite.dialect(), compile_kwargs={"render_postcompile": True}))
+
+
+def hot_queries():
+    """
+    (name, sql, policy) for the queries the endpoints and background jobs run,
+    taken from the modules that run them, so the audit can't drift from the
+    code. The modules are imported here, not at startup.
+    """
+    import datetime
+    from . import actual_hours, allocation, helpers, purchase_eta, time_calculator
+    from .models import WorkOrder
+    day = datetime.date(2000, 1, 3)
+    window = time_calculator.time_entry_range_filter(day, day)[0]
+    two = '?, ?'
+    return (
+        ('project_statuses', _compiled(helpers.status_counts_query()), AGGREGATE),
+        ('project_statuses_subset',
+         _compiled(helpers.status_counts_query().where(WorkOrder.project_task_no.in_(['a', 'b']))), LOOKUP),
+        ('project_work_orders', _compiled(helpers.work_orders_query('a')), LOOKUP),
+        ('project_parts', _compiled(helpers.project_parts_query('a')), LOOKUP),
+        ('time_entry_events', time_calculator.TIME_ENTRY_EVENTS_SQL.format(range_filter=''), BULK),
+        ('time_entry_events_window', time_calculator.TIME_ENTRY_EVENTS_SQL.format(range_filter=window), LOOKUP),
+        ('planned_quantities', time_calculator.PLANNED_QUANTITIES_SQL, BULK),
+        ('actual_hours_new_entries', actual_hours.ENTRIES_AFTER_SQL, LOOKUP),
+        ('actual_hours_entries_by_guid', actual_hours.ENTRIES_BY_GUID_SQL % two, LOOKUP),
+        ('actual_hours_worker_day', actual_hours.WORKER_DAY_SQL, LOOKUP),
+        ('allocation_demand', allocation.DEMAND_SQL, BULK),
+        ('allocation_due_dates', allocation.DUE_SQL, BULK),
+        ('allocation_stock', allocation.STOCK_SQL, BULK),
+        ('allocation_details', allocation.DETAIL_SQL % two, LOOKUP),
+        ('purchase_eta_rebuild', purchase_eta.ETA_SQL, BULK),
+        ('part_etas', purchase_eta.LOAD_ETAS_SQL % two, LOOKUP),
+    )
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")}
+
+
+def ensure_indexes(conn, indexes=INDEXES, analyze=True):
+    """
+    Creates the missing indexes (skipping tables/columns this database lacks)
+    and runs ANALYZE when anything was created. Returns the created index names.
+    """
+    wanted = set(missing_indexes(conn, indexes))
+    created = []
+    for name, table, columns in indexes:
+        if name not in wanted:
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(name)} ON {_quote(table)} "
+                     f"({', '.join(_quote(c) for c in columns)})")
+        created.append(name)
+    if analyze and created:
+        conn.execute("ANALYZE")
+    return created
+
+
+def _is_table_scan(detail):
+    # "SCAN t" / "SCAN TABLE t" read the whole table; "SCAN t USING COVERING INDEX i" only the index
+    return detail.startswith('SCAN') and 'COVERING INDEX' not in detail and 'CONSTANT ROW' not in detail
+
+
+def audit_query_plans(conn, queries=None):
+    """
+    EXPLAIN QUERY PLAN for each query (default: hot_queries()). Returns a list
+    of dicts with the plan lines and the SCAN lines its policy forbids; a query
+    that can't be planned (e.g. a missing table or column) is reported as skipped.
+    """
+    report = []
+    for name, sql, policy in (hot_queries() if queries is None else queries):
+        params = (None,) * sql.count('?')
+        try:
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        except sqlite3.OperationalError as e:
+            report.append({"name": name, "plan": [], "scans": [], "skipped": str(e)})
+            continue
+        if policy == BULK:
+            scans = []
+        elif policy == AGGREGATE:
+            scans = [d for d in plan if _is_table_scan(d)]
+        else:
+            scans = [d for d in plan if d.startswith('SCAN') and 'CONSTANT ROW' not in d]
+        report.append({"name": name, "plan": plan, "scans": scans, "skipped": None})
+    return report
+
+
+def missing_indexes(conn, indexes=INDEXES):
+    """Names of the indexes ensure_indexes() would create (tables/columns this database lacks don't count)."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    columns_by_table = {}
+    missing = []
+    for name, table, columns in indexes:
+        if name in existing:
+            continue
+        if table not in columns_by_table:
+            columns_by_table[table] = _table_columns(conn, table)
+        if set(columns) <= columns_by_table[table]:
+            missing.append(name)
+    return missing
+
+
+def master_schema_current(db_path):
+    """
+    True when master_unified.db already has every index and the purchase ETA
+    table, checked over a read-only connection; startup then runs no DDL on it.
+    """
+    if not db_path or not os.path.exists(db_path):
+        return True
+    try:
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True, timeout=5)
+        try:
+            has_eta = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'purchase_eta'").fetchone()
+            return bool(has_eta) and not missing_indexes(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+
+def ensure_database_indexes(db_path):
+    """Startup hook: adds missing indexes to an externally produced master_unified.db."""
+    if not db_path or not os.path.exists(db_path):
+        return []
+    try:
+        conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        try:
+            created = ensure_indexes(conn)
+        finally:
+            conn.close()
+        if created:
+            print(f"Created {len(created)} indexes on {db_path}: {', '.join(created)}")
+        return created
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not create indexes on {db_path}: {e}")
+        return []
@@ -0,0 +1,255 @@
+# app/shared_cache.py
+"""
+Cross-process cache backed by a local SQLite file.
+
+Flask-Caching's SimpleCache lives in one process, so every WSGI worker keeps
+its own cold copy. SharedCache stores pickled values in shared_cache.db
+instead (WAL mode, one connection per thread), so all workers on the box
+share entries without an external service.
+
+Each entry carries tags (e.g. 'project:<id>', 'erp') and an optional data
+version. get() treats an entry written for another version as a miss, and
+invalidate_tags() drops everything carrying a tag. The store is bounded by
+total size and evicts the least recently used entries first. Hit/miss
+counters are kept per process and merged into the file every few seconds,
+so stats() shows totals for all workers.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TIMEOUT = 600
+_TOUCH_INTERVAL = 5.0     # seconds between last_access updates of one entry
+_COUNTER_FLUSH_INTERVAL = 5.0
+_COUNTERS = ('hits', 'misses', 'sets', 'evictions', 'invalidations')
+
+# Callables (key, hit) told about every get() in this process, e.g. per-request
+# hit ratios (see metrics.py)
+_lookup_observers = []
+
+
+def add_lookup_observer(callback):
+    _lookup_observers.append(callback)
+
+
+def remove_lookup_observer(callback):
+    if callback in _lookup_observers:
+        _lookup_observers.remove(callback)
+
+
+class SharedCache:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, default_timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_timeout = default_timeout
+        self._local = threading.local()
+        self._counts = dict.fromkeys(_COUNTERS, 0)
+        self._counts_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._pid = os.getpid()
+
+    def init_app(self, app):
+        self.path = app.config.get('SHARED_CACHE_PATH', self.path)
+        self.max_bytes = app.config.get('SHARED_CACHE_MAX_BYTES', self.max_bytes)
+        self.default_timeout = app.config.get('SHARED_CACHE_DEFAULT_TIMEOUT', self.default_timeout)
+        self._local = threading.local()
+        app.extensions['shared_cache'] = self
+
+    # --- connection ---
+    def _conn(self):
+        if os.getpid() != self._pid:
+            # Forked worker: never reuse the parent's sqlite handles
+            self._pid = os.getpid()
+            self._local = threading.local()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    version TEXT,
+                    expires_at REAL,
+                    last_access REAL NOT NULL,
+                    value BLOB NOT NULL  -- last, so size/LRU scans never read overflow pages
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_access ON cache_entries (last_access);
+                CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (tag, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags (key);
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            self._counts[name] += n
+            due = time.monotonic() - self._flushed_at >= _COUNTER_FLUSH_INTERVAL
+        if due:
+            self._flush_counters()
+
+    def _flush_counters(self):
+        with self._counts_lock:
+            pending = [(name, n) for name, n in self._counts.items() if n]
+            self._counts = dict.fromkeys(_COUNTERS, 0)
+            self._flushed_at = time.monotonic()
+        if pending:
+            try:
+                self._conn().executemany(
+                    "INSERT INTO cache_stats (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", pending)
+            except sqlite3.Error as e:
+                print(f"WARNING: Could not store cache counters: {e}")
+
+    def _looked_up(self, key, hit):
+        self._count('hits' if hit else 'misses')
+        for callback in list(_lookup_observers):
+            callback(key, hit)
+
+    # --- API ---
+    def get(self, key, version=None, default=None):
+        """Cached value for key, or default when missing, expired or written for another version."""
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT value, version, expires_at, last_access FROM cache_entries WHERE key = ?",
+                               (key,)).fetchone()
+            now = time.time()
+            if row is None or (row[2] is not None and row[2] < now) or \
+                    (version is not None and row[1] != str(version)):
+                self._looked_up(key, False)
+                return default
+            if now - row[3] > _TOUCH_INTERVAL:
+                conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+            value = pickle.loads(row[0])
+        except (sqlite3.Error, pickle.PickleError) as e:
+            print(f"WARNING: Shared cache read failed for '{key}': {e}")
+            self._looked_up(key, False)
+            return default
+        self._looked_up(key, True)
+        return value
+
+    def set(self, key, value, tags=(), version=None, timeout=None):
+        """Stores value under key with the given tags; timeout=0 means no expiry."""
+        timeout = self.default_timeout if timeout is None else timeout
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, size, version, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), None if version is None else str(version),
+                     now + timeout if timeout else None, now))
+                conn.executemany("INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)",
+                                 [(tag, key) for tag in dict.fromkeys(tags)])
+                evicted = self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"WARNING: Shared cache write failed for '{key}': {e}")
+            return False
+        self._count('sets')
+        if evicted:
+            self._count('evictions', evicted)
+        return True
+
+    def get_or_set(self, key, producer, tags=(), version=None, timeout=None):
+        """get(); on a miss calls producer() and stores its result."""
+        sentinel = object()
+        value = self.get(key, version=version, default=sentinel)
+        if value is sentinel:
+            value = producer()
+            self.set(key, value, tags=tags, version=version, timeout=timeout)
+        return value
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM cache_entries ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._delete_keys(conn, victims)
+        return len(victims)
+
+    @staticmethod
+    def _delete_keys(conn, keys):
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", keys)
+        conn.executemany("DELETE FROM cache_tags WHERE key = ?", keys)
+
+    def delete(self, key):
+        try:
+            self._delete_keys(self._conn(), [(key,)])
+        except sqlite3.Error as e:
+            print(f"WARNING: Shared cache delete failed for '{key}': {e}")
+
+    def invalidate_tags(self, *tags):
+        """Drops every entry carrying any of the tags; returns how many were dropped."""
+        tags = [t for t in dict.fromkeys(tags) if t]
+        if not tags:
+            return 0
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                keys = set()
+                for tag in tags:
+                    keys.update(row[0] for row in conn.execute("SELECT key FROM cache_tags WHERE tag = ?", (tag,)))
+                self._delete_keys(conn, [(k,) for k in keys])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"WARNING: Shared cache invalidation failed for {tags}: {e}")
+            return 0
+        if keys:
+            self._count('invalidations', len(keys))
+        return len(keys)
+
+    def clear(self):
+        try:
+            self._conn().executescript("DELETE FROM cache_entries; DELETE FROM cache_tags;")
+        except sqlite3.Error as e:
+            print(f"WARNING: Could not clear the shared cache: {e}")
+
+    def stats(self):
+        """Counters summed over all processes plus the current entry count and size."""
+        self._flush_counters()
+        conn = self._conn()
+        result = dict.fromkeys(_COUNTERS, 0)
+        result.update(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        lookups = result['hits'] + result['misses']
+        result.update({
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": round(result['hits'] / lookups, 4) if lookups else None,
+        })
+        return result
+
+
+def invalidate_for_change(cache, kind, project_id=None):
+    """data_version listener: drops entries tagged with the changed kind and, if given, the project."""
+    cache.invalidate_tags(f"kind:{kind}", f"project:{project_id}" if project_id else None)
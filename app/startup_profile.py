@@ -0,0 +1,61 @@
+# app/startup_profile.py
+"""
+Startup timings.
+
+create_app() and load_plugins() wrap each step (module imports, blueprint
+registration, schema checks, plugin loads) in step(), which always records
+the duration. With STARTUP_PROFILE=1 in the environment (or
+`python run.py --profile-startup`) report() prints the table, slowest first.
+The same list is served by /api/admin/startup. For a per-module import
+breakdown of a step, run Python with -X importtime.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+ENV_VAR = "STARTUP_PROFILE"
+
+# Measured from the first import of the app package
+_started = time.perf_counter()
+_steps = []
+
+
+def enabled():
+    return os.environ.get(ENV_VAR, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def record(kind, name, ms):
+    _steps.append({"kind": kind, "name": name, "ms": round(ms, 2)})
+
+
+@contextmanager
+def step(kind, name):
+    """Times the block as one startup step of the given kind ('import', 'blueprint', 'init', 'plugin')."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, name, (time.perf_counter() - started) * 1000)
+
+
+def elapsed_ms():
+    return round((time.perf_counter() - _started) * 1000, 2)
+
+
+def snapshot():
+    """Recorded steps plus per-kind totals and the time since the app package was first imported."""
+    totals = {}
+    for entry in _steps:
+        totals[entry["kind"]] = round(totals.get(entry["kind"], 0) + entry["ms"], 2)
+    return {"steps": list(_steps), "totals": totals, "since_import_ms": elapsed_ms()}
+
+
+def report(title="Startup profile", force=False):
+    """Prints the steps, slowest first; only in profiling mode unless force=True."""
+    if not (force or enabled()):
+        return
+    data = snapshot()
+    print(f"--- {title}: {data['since_import_ms']:.1f} ms since import ---")
+    for entry in sorted(data["steps"], key=lambda e: e["ms"], reverse=True):
+        print(f"  {entry['ms']:9.2f} ms  {entry['kind']:<9} {entry['name']}")
+    print("  totals: " + ", ".join(f"{kind} {ms:.1f} ms" for kind, ms in data["totals"].items()))
@@ -0,0 +1,339 @@
+# app/synthetic_data.py
+"""
+Deterministic synthetic datasets for benchmarks.
+
+The repo ships SCHEMA_master_unified.txt but no ERP data. generate_dataset()
+builds a master_unified.db with exactly those tables and column types, a
+matching velika_montaza.db (notes, DNI completions, photo rows) and a
+layout_data.json with one item per project, at a configurable size.
+
+Every table draws from its own random.Random seeded with "<seed>:<table>",
+and all dates are relative to a fixed BASE_DATE, so the same seed and sizes
+always produce the same rows, and growing one table doesn't reshuffle the
+others. The finished master database gets the hot-path indexes and the
+purchase ETA index, like a database produced by erp_import.
+"""
+import datetime
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import time
+import uuid
+
+from .db import close_all_connections, init_velika_montaza_db
+from .purchase_eta import rebuild_eta_index
+from .schema import ensure_indexes
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SCHEMA_master_unified.txt")
+BASE_DATE = datetime.datetime(2025, 1, 6)  # a Monday
+
+# name -> sizes; time entries dominate the file size (~250 bytes per row)
+SCALES = {
+    "tiny": dict(projects=20, work_orders_per_project=10, components_per_work_order=5,
+                 time_entries=20_000, workers=15, articles=300, purchase_lines=300),
+    "small": dict(projects=200, work_orders_per_project=20, components_per_work_order=8,
+                  time_entries=200_000, workers=60, articles=3_000, purchase_lines=4_000),
+    "medium": dict(projects=1_000, work_orders_per_project=25, components_per_work_order=10,
+                   time_entries=1_000_000, workers=150, articles=15_000, purchase_lines=20_000),
+    "large": dict(projects=3_000, work_orders_per_project=30, components_per_work_order=12,
+                  time_entries=5_000_000, workers=300, articles=40_000, purchase_lines=60_000),
+}
+
+WORK_ORDER_STATES = (('Izdano', 45), ('Zaključeno', 30), ('Planirano', 12), ('Potrjeno', 8), ('Sproščeno', 5))
+PRIORITIES = ('Urgent', 'High', 'Normal', 'Low', None)
+ENTRIES_PER_WORKER_DAY = 6
+_INSERT_CHUNK = 10_000
+
+
+def read_schema(path=SCHEMA_FILE):
+    """{table: [(column, declared type), ...]} from the SCHEMA_master_unified.txt dump."""
+    tables, current = {}, None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = re.match(r'TABLE: (\w+)', line)
+            if match:
+                current = tables.setdefault(match.group(1), [])
+                continue
+            match = re.match(r'\s{4}(.+) \((\w+)\)\s*$', line)
+            if match and current is not None:
+                current.append((match.group(1), match.group(2)))
+    return tables
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _rng(seed, table):
+    return random.Random(f"{seed}:{table}")
+
+
+def _ts(value):
+    return value.isoformat(' ', timespec='seconds')
+
+
+def _insert(conn, table, columns, rows):
+    sql = f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) VALUES ({', '.join('?' * len(columns))})"
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= _INSERT_CHUNK:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+# --- 1. MASTER TABLES ---
+def _project_ids(sizes):
+    return [f"PN{n:05d}" for n in range(1, sizes["projects"] + 1)]
+
+
+def _project_no(project):
+    # Four project tasks (PN...) per project (P...)
+    return f"P{(int(project[2:]) - 1) // 4 + 1:04d}"
+
+
+def _work_orders(seed, sizes):
+    """(columns, rows, [(dni, project, due date)]) -- 50%..150% of the average work orders per project."""
+    rng = _rng(seed, 'work_orders')
+    states, weights = zip(*WORK_ORDER_STATES)
+    rows, dnis = [], []
+    n = 0
+    for project in _project_ids(sizes):
+        project_no = _project_no(project)
+        avg = sizes["work_orders_per_project"]
+        for _ in range(max(1, rng.randint(avg // 2, avg + avg // 2))):
+            n += 1
+            dni = f"DNI{n:07d}"
+            start = BASE_DATE + datetime.timedelta(days=rng.randrange(0, 120))
+            due = start + datetime.timedelta(days=rng.randrange(5, 60))
+            quantity = rng.randint(1, 20)
+            state = rng.choices(states, weights)[0]
+            done = quantity if state == 'Zaključeno' else rng.randint(0, quantity)
+            rows.append((state, dni, project_no, f"Projekt {project_no}", project, f"Sestav {n}",
+                         str(100000 + rng.randrange(sizes["articles"])), float(rng.randint(1, 9)), quantity, done,
+                         _ts(start), _ts(due), _ts(due), f"R{rng.randint(1, 40):02d}", f"MS{rng.randint(1, 8)}",
+                         f"Naloga {project}"))
+            dnis.append((dni, project, due))
+    columns = ('Stanje', 'Št.', 'Št.Projekta', 'Opis projekta', 'Št.Projektne naloge', 'Opis', 'Št. Artikla',
+               'Upravljalni center', 'Količina', 'Zakljucena kol.', 'Začetni datum', 'Končni datum',
+               'Datum zapadlosti', 'Šifra regala', 'Montazna Skupina', 'Opis naloge projekta')
+    return columns, rows, dnis
+
+
+def _components(seed, sizes, dnis):
+    rng = _rng(seed, 'components')
+    avg = sizes["components_per_work_order"]
+    columns = ('Št. Artikla', 'Opis', 'Št.Projekta', 'Št.Projektne naloge', 'DNI', 'Pričakovana količina',
+               'Preostala količina', 'Zaloga', 'Razpoložljivost artikla', 'Šifra regala', 'Šifra merske enote',
+               'Datum zapadlosti', 'Stanje', 'Št. vrstice delovnega naloga')
+
+    def rows():
+        line = 0
+        for dni, project, due in dnis:
+            for _ in range(rng.randint(max(1, avg // 2), avg + avg // 2)):
+                line += 10
+                article = 100000 + int(rng.paretovariate(1.2) * 7) % sizes["articles"]  # a few articles are everywhere
+                expected = float(rng.randint(1, 50))
+                remaining = 0.0 if rng.random() < 0.55 else float(rng.randint(1, int(expected)))
+                stock = 0.0 if rng.random() < 0.35 else float(rng.randint(1, 200))
+                yield (float(article), f"Artikel {article}", _project_no(project), project, dni, expected, remaining,
+                       stock, stock - remaining, f"R{article % 60:02d}-{article % 7}", 'KOS', _ts(due),
+                       'Odprto' if remaining else 'Izdano', line)
+    return columns, rows()
+
+
+def _inventory(seed, sizes):
+    rng = _rng(seed, 'inventory')
+    columns = ('Št. Artikla', 'Opis', 'Šifra lokacije', 'Šifra regala', 'Zaloga', 'Strošek enote',
+               'Vrednost zaloge', 'Prosta zaloga', 'Zadnji datum prejema')
+    rows = []
+    for n in range(sizes["articles"]):
+        article = 100000 + n
+        stock = 0.0 if rng.random() < 0.3 else float(rng.randint(1, 500))
+        free = max(0.0, stock - rng.randint(0, 100))
+        cost = round(rng.uniform(0.1, 250.0), 2)
+        rows.append((str(article), f"Artikel {article}", 'GLAVNO', f"R{article % 60:02d}-{article % 7}", stock, cost,
+                     round(stock * cost, 2), free, _ts(BASE_DATE - datetime.timedelta(days=rng.randrange(1, 400)))))
+    return columns, rows
+
+
+def _purchase_orders(seed, sizes):
+    rng = _rng(seed, 'purchase_orders')
+    columns = ('Vrsta dokumenta', 'Št. dokumenta', 'Nabava - št. dobavitelja', 'Ime dobavitelja', 'Št. Artikla',
+               'Opis', 'Količina', 'Pričakovani datum prevzema', 'Zahtevani datum prevzema',
+               'Zagotovljeni datum prevzema', 'Odprta količina', 'Datum naloga')
+    rows = []
+    for n in range(sizes["purchase_lines"]):
+        article = 100000 + rng.randrange(sizes["articles"])
+        quantity = rng.randint(1, 300)
+        ordered = BASE_DATE + datetime.timedelta(days=rng.randrange(0, 90))
+        expected = ordered + datetime.timedelta(days=rng.randrange(7, 60))
+        confirmed = expected + datetime.timedelta(days=rng.randrange(-3, 10)) if rng.random() < 0.4 else None
+        open_qty = 0 if rng.random() < 0.3 else rng.randint(1, quantity)
+        supplier = rng.randint(1, 120)
+        rows.append(('Naročilo', f"NN{n // 5 + 1:06d}", supplier, f"Dobavitelj {supplier}", article,
+                     f"Artikel {article}", float(quantity), _ts(expected), _ts(expected),
+                     confirmed and _ts(confirmed), open_qty, _ts(ordered)))
+    return columns, rows
+
+
+def _time_entries(seed, sizes, dnis):
+    """
+    Chronological bookings: each worker fills ENTRIES_PER_WORKER_DAY (4..8)
+    back-to-back entries per working day on DNIs of a few projects, until
+    sizes["time_entries"] rows exist. ~5% are still open, ~3% cancelled.
+    """
+    rng = _rng(seed, 'time_entries')
+    columns = ('Št. postavke', 'Preklican', 'Št. delavca', 'Ime delavca', 'Šifra vrste časa', 'Opis vrste časa',
+               'Datum knjiženja', 'Od datuma', 'Od datuma in ure', 'Do datuma', 'Do datuma in ure', 'Trajanje',
+               'Alociran nominalni čas', 'DNI', 'Št.Projekta', 'Št.Projektne naloge', 'Time Entry GUID',
+               'Montazna Skupina')
+    target = sizes["time_entries"]
+    workers = sizes["workers"]
+    days_needed = math.ceil(target / (workers * ENTRIES_PER_WORKER_DAY))
+    by_project = {}
+    for dni, project, _ in dnis:
+        by_project.setdefault(project, []).append(dni)
+    projects = sorted(by_project)
+
+    def rows():
+        n = 0
+        day = BASE_DATE
+        for _ in range(days_needed * 2):  # weekends are skipped
+            if day.weekday() >= 5:
+                day += datetime.timedelta(days=1)
+                continue
+            for worker in range(1, workers + 1):
+                clock = day + datetime.timedelta(hours=6, minutes=rng.randrange(0, 60))
+                crew = [projects[(worker * 7 + k) % len(projects)] for k in range(3)]
+                for _ in range(rng.randint(ENTRIES_PER_WORKER_DAY - 2, ENTRIES_PER_WORKER_DAY + 2)):
+                    if n >= target:
+                        return
+                    n += 1
+                    project = rng.choice(crew)
+                    dni = rng.choice(by_project[project])
+                    minutes = rng.randint(15, 150)
+                    end = clock + datetime.timedelta(minutes=minutes)
+                    still_open = rng.random() < 0.05
+                    yield (n, 1 if rng.random() < 0.03 else 0, worker, f"Delavec {worker}", 'DELO', 'Delo',
+                           _ts(day), _ts(day), _ts(clock), None if still_open else _ts(day),
+                           None if still_open else _ts(end), None if still_open else round(minutes / 60, 4),
+                           round(minutes / 60 * rng.uniform(0.7, 1.2), 4), dni, _project_no(project), project,
+                           str(uuid.UUID(int=rng.getrandbits(128))), f"MS{worker % 8 + 1}")
+                    clock = end + datetime.timedelta(minutes=rng.choice((0, 0, 5, 10, 30)))
+            day += datetime.timedelta(days=1)
+    return columns, rows()
+
+
+def generate_master(path, seed=0, sizes=None):
+    """Builds master_unified.db at path (replacing it); returns {table: rows}."""
+    sizes = dict(SCALES["small"], **(sizes or {}))
+    tmp = f"{path}.building"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    counts = {}
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-200000")
+        conn.execute("BEGIN")
+        for table, columns in read_schema().items():
+            conn.execute(f"CREATE TABLE {_quote(table)} ({', '.join(f'{_quote(c)} {t}' for c, t in columns)})")
+
+        columns, rows, dnis = _work_orders(seed, sizes)
+        counts["work_orders"] = _insert(conn, 'work_orders', columns, rows)
+        counts["components"] = _insert(conn, 'components', *_components(seed, sizes, dnis))
+        counts["inventory"] = _insert(conn, 'inventory', *_inventory(seed, sizes))
+        counts["purchase_orders"] = _insert(conn, 'purchase_orders', *_purchase_orders(seed, sizes))
+        counts["time_entries"] = _insert(conn, 'time_entries', *_time_entries(seed, sizes, dnis))
+
+        ensure_indexes(conn, analyze=False)
+        rebuild_eta_index(conn)
+        conn.execute("PRAGMA user_version = 1")
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+    return counts
+
+
+# --- 2. APP DATABASE AND LAYOUT ---
+def generate_app_db(path, master_path, seed=0):
+    """velika_montaza.db with notes/priorities for ~60% of projects, manual DNI completions and photo rows."""
+    if os.path.exists(path):
+        os.remove(path)
+    init_velika_montaza_db(force=True, db_path=path)
+    close_all_connections()
+    rng = _rng(seed, 'velika_montaza')
+    master = sqlite3.connect(master_path)
+    try:
+        work_orders = master.execute(
+            'SELECT "Št.", "Št.Projektne naloge", "Opis" FROM work_orders ORDER BY rowid').fetchall()
+    finally:
+        master.close()
+    projects = sorted({project for _, project, _ in work_orders})
+
+    conn = sqlite3.connect(path)
+    try:
+        notes, photos = [], []
+        for project in projects:
+            if rng.random() < 0.6:
+                stamp = _ts(BASE_DATE + datetime.timedelta(days=rng.randrange(0, 120)))
+                notes.append((project, f"Opomba za {project}", rng.choice(PRIORITIES),
+                              rng.choice((None, None, 'Paused')), rng.choice((None, 'In Progress', 'Completed')),
+                              rng.choice((None, 'Ready', 'Completed')), stamp))
+            for _ in range(rng.choice((0, 0, 1, 3))):
+                photos.append((project, f"{rng.getrandbits(256):064x}.jpg", _ts(BASE_DATE)))
+        conn.executemany(
+            "INSERT INTO project_notes (project_task_no, notes, priority, pause_status, electrification_status,"
+            " control_status, last_note_updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)", notes)
+        conn.executemany(
+            "INSERT INTO dni_status (work_order_no, project_task_no, description, is_completed) VALUES (?, ?, ?, 1)",
+            [(dni, project, description) for dni, project, description in work_orders if rng.random() < 0.1])
+        conn.executemany("INSERT INTO project_photos (project_task_no, filename, uploaded_at) VALUES (?, ?, ?)", photos)
+        conn.commit()
+    finally:
+        conn.close()
+    return {"project_notes": len(notes), "project_photos": len(photos)}
+
+
+def generate_layout(path, projects, columns=20):
+    """layout_data.json with one project box per project on a grid."""
+    items = [{
+        "id": project, "name": project, "type": "project",
+        "x": 40 + (n % columns) * 140, "y": 40 + (n // columns) * 100, "width": 120, "height": 80,
+        "owner": None,
+    } for n, project in enumerate(projects)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"items": items, "background": {}}, f)
+    return len(items)
+
+
+def generate_dataset(out_dir, seed=0, scale="small", **overrides):
+    """
+    Writes master_unified.db, velika_montaza.db and layout_data.json to out_dir.
+    overrides replace single sizes of the scale (e.g. time_entries=2_000_000).
+    Returns a summary with row counts, sizes and seconds.
+    """
+    started = time.perf_counter()
+    sizes = dict(SCALES[scale], **{k: v for k, v in overrides.items() if v is not None})
+    os.makedirs(out_dir, exist_ok=True)
+    master_path = os.path.join(out_dir, "master_unified.db")
+    counts = generate_master(master_path, seed=seed, sizes=sizes)
+    counts.update(generate_app_db(os.path.join(out_dir, "velika_montaza.db"), master_path, seed=seed))
+    counts["layout_items"] = generate_layout(os.path.join(out_dir, "layout_data.json"), _project_ids(sizes))
+    with open(os.path.join(out_dir, "dataset.json"), 'w', encoding='utf-8') as f:
+        json.dump({"seed": seed, "scale": scale, "sizes": sizes, "rows": counts}, f, indent=2)
+    return {"seed": seed, "scale": scale, "sizes": sizes, "rows": counts,
+            "seconds": round(time.perf_counter() - started, 1)}
@@ -0,0 +1,144 @@
+# app/time_batch.py
+"""
+Batch recomputation of actual-time totals across a process pool.
+
+Worker-days are independent, so time_entries are sharded by worker, every
+shard streams its rows through stream_actual_time_totals in its own process,
+and the per-DNI / per-worker dictionaries are merged. Worker shards give
+exactly the totals of a single run; date shards are faster to plan but
+approximate (see _date_shards).
+"""
+import datetime
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .time_calculator import TIME_ENTRY_EVENTS_SQL, stream_actual_time_totals, time_entry_range_filter
+
+# More shards than processes keeps all cores busy when shards are uneven
+SHARDS_PER_PROCESS = 4
+
+
+def _connect_readonly(db_path):
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def _run_shard(db_path, extra_sql, params):
+    conn = _connect_readonly(db_path)
+    try:
+        cursor = conn.execute(TIME_ENTRY_EVENTS_SQL.format(range_filter=extra_sql), params)
+        return stream_actual_time_totals(cursor)
+    finally:
+        conn.close()
+
+
+def _worker_shards(conn, n_shards, range_sql, range_params):
+    """Greedy bin packing of workers by entry count, so shards carry similar work."""
+    counts = conn.execute(
+        'SELECT "Št. delavca", COUNT(*) FROM time_entries'
+        ' WHERE COALESCE("Preklican", 0) = 0 AND "DNI" IS NOT NULL AND "DNI" != \'\'' + range_sql +
+        ' GROUP BY "Št. delavca" ORDER BY COUNT(*) DESC', range_params).fetchall()
+    bins = [[0, []] for _ in range(max(1, min(n_shards, len(counts))))]
+    for worker_no, n in counts:
+        target = min(bins, key=lambda b: b[0])
+        target[0] += n
+        target[1].append(worker_no)
+    shards = []
+    for _, workers in bins:
+        if not workers:
+            continue
+        non_null = [w for w in workers if w is not None]
+        clauses = []
+        if non_null:
+            clauses.append('"Št. delavca" IN (%s)' % ','.join('?' * len(non_null)))
+        if len(non_null) != len(workers):
+            clauses.append('"Št. delavca" IS NULL')
+        shards.append((range_sql + ' AND (' + ' OR '.join(clauses) + ')', range_params + non_null))
+    return shards
+
+
+def _date_shards(conn, n_shards, start_date, end_date):
+    """
+    Splits the time window into whole-day ranges. An entry belongs to the shard of
+    its start day. Not exact: an entry that crosses midnight at a shard border has
+    its stop computed in a worker-day bucket of its own instead of together with
+    the next day's entries, so that day's lunch deduction and totals can differ
+    from a single run. Use worker shards when the totals must match.
+    """
+    if start_date is None or end_date is None:
+        low, high = conn.execute(
+            'SELECT MIN("Od datuma in ure"), MAX("Od datuma in ure") FROM time_entries').fetchone()
+        if low is None:
+            return []
+        start_date = start_date or datetime.date.fromisoformat(str(low)[:10])
+        end_date = end_date or datetime.date.fromisoformat(str(high)[:10])
+    days = (end_date - start_date).days + 1
+    step = max(1, -(-days // n_shards))
+    shards = []
+    day = start_date
+    while day <= end_date:
+        last = min(end_date, day + datetime.timedelta(days=step - 1))
+        shards.append(time_entry_range_filter(day, last))
+        day = last + datetime.timedelta(days=1)
+    return shards
+
+
+def recompute_totals(db_path, processes=None, shard_by='worker', start_date=None, end_date=None):
+    """
+    Recomputes (dni_actual_times, worker_dni_actual_times, stats) for the whole
+    history or for [start_date, end_date]. shard_by='worker' (the default)
+    matches calculate_actual_time_totals exactly; 'date' may differ on
+    worker-days that cross a shard border (see _date_shards). stats holds
+    shard/event counts, wall time and throughput in events per second.
+    """
+    processes = processes or os.cpu_count() or 1
+    n_shards = processes * SHARDS_PER_PROCESS
+    started = time.perf_counter()
+
+    conn = _connect_readonly(db_path)
+    try:
+        if shard_by == 'worker':
+            range_sql, range_params = time_entry_range_filter(start_date, end_date)
+            shards = _worker_shards(conn, n_shards, range_sql, range_params)
+        elif shard_by == 'date':
+            shards = _date_shards(conn, n_shards, start_date, end_date)
+        else:
+            raise ValueError(f"Unknown shard mode '{shard_by}' (use 'worker' or 'date').")
+    finally:
+        conn.close()
+
+    dni_totals = defaultdict(float)
+    worker_totals = defaultdict(lambda: defaultdict(float))
+    events = 0
+    if processes == 1:
+        results = (_run_shard(db_path, sql, params) for sql, params in shards)
+        for shard_dni, shard_workers, shard_events in results:
+            events += _merge(dni_totals, worker_totals, shard_dni, shard_workers, shard_events)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_run_shard, db_path, sql, params) for sql, params in shards]
+            for future in futures:
+                events += _merge(dni_totals, worker_totals, *future.result())
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "shard_by": shard_by,
+        "shards": len(shards),
+        "processes": processes,
+        "events": events,
+        "seconds": round(elapsed, 3),
+        "events_per_second": round(events / elapsed) if elapsed > 0 else None,
+    }
+    return dict(dni_totals), {w: dict(d) for w, d in worker_totals.items()}, stats
+
+
+def _merge(dni_totals, worker_totals, shard_dni, shard_workers, shard_events):
+    for dni, seconds in shard_dni.items():
+        dni_totals[dni] += seconds
+    for worker_no, per_dni in shard_workers.items():
+        target = worker_totals[worker_no]
+        for dni, seconds in per_dni.items():
+            target[dni] += seconds
+    return shard_events
@@ -1,19 +1,59 @@
 # app/plugins/timetable/time_calculator.py
 import datetime
-import functools
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
+from flask import current_app
+from .db import get_db_connection
+from .helpers import get_project_statuses, priority_rank
+from .metrics import timed
 
-@functools.lru_cache(maxsize=128)
-def calculate_actual_time_totals(events_list_tuple):
+START_KEYS = ['start', 'začetek', 'zacitek']
+STOP_KEYS = ['stop', 'zaključi', 'zaključek', 'konec', 'zakljuci']
+
+# Results of calculate_worker_day_totals per (worker_no, date), reused while the
+# day's events are unchanged: a repeated call over the whole history only
+# recomputes the days that got new or changed events. Least recently used
+# days are dropped beyond DAY_CACHE_SIZE.
+DAY_CACHE_SIZE = 50_000
+_day_cache = OrderedDict()
+_day_cache_lock = threading.Lock()
+
+def _day_totals(worker_no, date, day_events):
+    key = (worker_no, date)
+    signature = tuple((e[2], e[3], e[4]) for e in day_events)
+    with _day_cache_lock:
+        cached = _day_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            _day_cache.move_to_end(key)
+            return cached[1]
+    totals = calculate_worker_day_totals(date, day_events)
+    with _day_cache_lock:
+        _day_cache[key] = (signature, totals)
+        _day_cache.move_to_end(key)
+        while len(_day_cache) > DAY_CACHE_SIZE:
+            _day_cache.popitem(last=False)
+    return totals
+
+def clear_day_cache():
+    with _day_cache_lock:
+        _day_cache.clear()
+
+@timed('actual_time')
+def calculate_actual_time_totals(events_list_tuple, backend='python'):
     """
     Calculates actual time using a timeline approach to accurately handle
     task switching and lunch deductions.
+    backend='numpy' runs the vectorized implementation in time_calculator_np,
+    which returns bit-identical totals. The python backend reuses the cached
+    result of every worker-day whose events are unchanged (see _day_totals).
     """
-    events_list = list(events_list_tuple)
+    if backend == 'numpy':
+        from . import time_calculator_np  # imported lazily: it imports this module
+        return time_calculator_np.calculate_actual_time_totals(events_list_tuple)
 
     # Group by worker and date
     events_by_worker_day = defaultdict(list)
-    for event in events_list:
+    for event in events_list_tuple:
         # event format: (worker_no, worker_name, datetime_obj, event_type, ref_doc_no)
         if not event[4]: continue
         key = (event[0], event[2].date())
@@ -22,121 +62,310 @@ def calculate_actual_time_totals(events_list_tuple):
     dni_actual_times = defaultdict(float)
     worker_dni_actual_times = defaultdict(lambda: defaultdict(float))
 
-    START_KEYS = ['start', 'začetek', 'zacitek']
-    STOP_KEYS = ['stop', 'zaključi', 'zaključek', 'konec', 'zakljuci']
-
     for (worker_no, date), day_events in events_by_worker_day.items():
-        day_events.sort(key=lambda x: x[2])
-        
-        # 1. Build segments of work
-        work_segments = [] # list of (start_time, end_time, dni)
-        current_start = None
-        current_dni = None
-        
-        for event in day_events:
-            evt_type = str(event[3]).strip().lower()
-            evt_time = event[2]
-            evt_dni = event[4]
-            
-            if evt_type in START_KEYS:
-                # If we are already working, close the previous segment first (Task Switch)
-                if current_start is not None:
-                    work_segments.append((current_start, evt_time, current_dni))
-                
-                # Start new segment
-                current_start = evt_time
-                current_dni = evt_dni
-                
-            elif evt_type in STOP_KEYS:
-                if current_start is not None:
-                    work_segments.append((current_start, evt_time, current_dni))
-                    current_start = None
-                    current_dni = None
-
-        # Handle forgotten clock-out at end of day
-        if current_start is not None:
-            # Auto-close at 15:00 if still running
-            # But if start was AFTER 15:00, assume 0 duration or valid until now? 
-            # Let's stick to the 15:00 rule for consistency with previous logic.
-            limit_time = current_start.replace(hour=15, minute=0, second=0, microsecond=0)
-            if current_start < limit_time:
-                work_segments.append((current_start, limit_time, current_dni))
-
-        # 2. Calculate total raw duration per DNI
-        day_dni_totals = defaultdict(float)
-        total_day_seconds = 0.0
-        
-        for start, end, dni in work_segments:
-            duration = (end - start).total_seconds()
-            if duration > 0:
-                day_dni_totals[dni] += duration
-                total_day_seconds += duration
-
-        # 3. Analyze Lunch Break (11:00 - 13:00)
-        # We look for GAPS between segments in this window.
-        lunch_start = datetime.datetime.combine(date, datetime.time(11, 0))
-        lunch_end = datetime.datetime.combine(date, datetime.time(13, 0))
-        
-        # Find gaps
-        gaps_in_lunch_window = 0.0
-        
-        # Check gap before first segment (if started after 11:00)
-        if work_segments:
-            first_start = work_segments[0][0]
-            if first_start > lunch_start:
-                 # The gap is from 11:00 to first_start (capped at 13:00)
-                 gap_end = min(first_start, lunch_end)
-                 if gap_end > lunch_start:
-                     gaps_in_lunch_window += (gap_end - lunch_start).total_seconds()
-
-            # Check gap after last segment (if ended before 13:00)
-            last_end = work_segments[-1][1]
-            if last_end < lunch_end:
-                # The gap is from last_end to 13:00 (capped at 11:00 start)
-                gap_start = max(last_end, lunch_start)
-                if lunch_end > gap_start:
-                    gaps_in_lunch_window += (lunch_end - gap_start).total_seconds()
-
-            # Check gaps BETWEEN segments
-            for i in range(len(work_segments) - 1):
-                seg_end = work_segments[i][1]
-                next_start = work_segments[i+1][0]
-                
-                # Overlap of (seg_end, next_start) with (11:00, 13:00)
-                gap_s = max(seg_end, lunch_start)
-                gap_e = min(next_start, lunch_end)
-                
-                if gap_e > gap_s:
-                    gaps_in_lunch_window += (gap_e - gap_s).total_seconds()
-        
-        # 4. Apply Deduction Logic
-        # Rule: Deduct remainder of 30 mins if working > 6h
-        WORK_THRESHOLD = 21600 # 6 hours
-        FULL_BREAK = 1800.0 # 30 mins
-        
-        deduction_seconds = 0.0
-        if total_day_seconds > WORK_THRESHOLD:
-            # If gaps are less than 30 mins, deduct the difference
-            if gaps_in_lunch_window < FULL_BREAK:
-                deduction_seconds = FULL_BREAK - gaps_in_lunch_window
-        
-        # 5. Distribute deduction proportionally across tasks
-        # If we need to deduct 10 mins, we remove it proportionally from all tasks done that day
-        adjustment_ratio = 1.0
-        if deduction_seconds > 0 and total_day_seconds > 0:
-            # Prevent negative time
-            if total_day_seconds <= deduction_seconds:
-                adjustment_ratio = 0.0
-            else:
-                adjustment_ratio = (total_day_seconds - deduction_seconds) / total_day_seconds
-
         # Store final values
-        for dni, seconds in day_dni_totals.items():
-            final_seconds = seconds * adjustment_ratio
+        for dni, final_seconds in _day_totals(worker_no, date, day_events).items():
             worker_dni_actual_times[worker_no][dni] += final_seconds
             dni_actual_times[dni] += final_seconds
 
     final_worker_times = {w: dict(d) for w, d in worker_dni_actual_times.items()}
     final_dni_times = dict(dni_actual_times)
 
-    return final_dni_times, final_worker_times
\ No newline at end of file
+    return final_dni_times, final_worker_times
+
+def calculate_worker_day_totals(date, day_events):
+    """
+    Actual seconds per DNI for one worker on one day, after the lunch deduction.
+    day_events are the worker's events dated `date` (any order).
+    """
+    day_events = sorted(day_events, key=lambda x: x[2])
+
+    # 1. Build segments of work
+    work_segments = [] # list of (start_time, end_time, dni)
+    current_start = None
+    current_dni = None
+    
+    for event in day_events:
+        evt_type = str(event[3]).strip().lower()
+        evt_time = event[2]
+        evt_dni = event[4]
+        
+        if evt_type in START_KEYS:
+            # If we are already working, close the previous segment first (Task Switch)
+            if current_start is not None:
+                work_segments.append((current_start, evt_time, current_dni))
+            
+            # Start new segment
+            current_start = evt_time
+            current_dni = evt_dni
+            
+        elif evt_type in STOP_KEYS:
+            if current_start is not None:
+                work_segments.append((current_start, evt_time, current_dni))
+                current_start = None
+                current_dni = None
+
+    # Handle forgotten clock-out at end of day
+    if current_start is not None:
+        # Auto-close at 15:00 if still running
+        # But if start was AFTER 15:00, assume 0 duration or valid until now? 
+        # Let's stick to the 15:00 rule for consistency with previous logic.
+        limit_time = current_start.replace(hour=15, minute=0, second=0, microsecond=0)
+        if current_start < limit_time:
+            work_segments.append((current_start, limit_time, current_dni))
+
+    # 2. Calculate total raw duration per DNI
+    day_dni_totals = defaultdict(float)
+    total_day_seconds = 0.0
+    
+    for start, end, dni in work_segments:
+        duration = (end - start).total_seconds()
+        if duration > 0:
+            day_dni_totals[dni] += duration
+            total_day_seconds += duration
+
+    # 3. Analyze Lunch Break (11:00 - 13:00)
+    # We look for GAPS between segments in this window.
+    lunch_start = datetime.datetime.combine(date, datetime.time(11, 0))
+    lunch_end = datetime.datetime.combine(date, datetime.time(13, 0))
+    
+    # Find gaps
+    gaps_in_lunch_window = 0.0
+    
+    # Check gap before first segment (if started after 11:00)
+    if work_segments:
+        first_start = work_segments[0][0]
+        if first_start > lunch_start:
+             # The gap is from 11:00 to first_start (capped at 13:00)
+             gap_end = min(first_start, lunch_end)
+             if gap_end > lunch_start:
+                 gaps_in_lunch_window += (gap_end - lunch_start).total_seconds()
+
+        # Check gap after last segment (if ended before 13:00)
+        last_end = work_segments[-1][1]
+        if last_end < lunch_end:
+            # The gap is from last_end to 13:00 (capped at 11:00 start)
+            gap_start = max(last_end, lunch_start)
+            if lunch_end > gap_start:
+                gaps_in_lunch_window += (lunch_end - gap_start).total_seconds()
+
+        # Check gaps BETWEEN segments
+        for i in range(len(work_segments) - 1):
+            seg_end = work_segments[i][1]
+            next_start = work_segments[i+1][0]
+            
+            # Overlap of (seg_end, next_start) with (11:00, 13:00)
+            gap_s = max(seg_end, lunch_start)
+            gap_e = min(next_start, lunch_end)
+            
+            if gap_e > gap_s:
+                gaps_in_lunch_window += (gap_e - gap_s).total_seconds()
+    
+    # 4. Apply Deduction Logic
+    # Rule: Deduct remainder of 30 mins if working > 6h
+    WORK_THRESHOLD = 21600 # 6 hours
+    FULL_BREAK = 1800.0 # 30 mins
+    
+    deduction_seconds = 0.0
+    if total_day_seconds > WORK_THRESHOLD:
+        # If gaps are less than 30 mins, deduct the difference
+        if gaps_in_lunch_window < FULL_BREAK:
+            deduction_seconds = FULL_BREAK - gaps_in_lunch_window
+    
+    # 5. Distribute deduction proportionally across tasks
+    # If we need to deduct 10 mins, we remove it proportionally from all tasks done that day
+    adjustment_ratio = 1.0
+    if deduction_seconds > 0 and total_day_seconds > 0:
+        # Prevent negative time
+        if total_day_seconds <= deduction_seconds:
+            adjustment_ratio = 0.0
+        else:
+            adjustment_ratio = (total_day_seconds - deduction_seconds) / total_day_seconds
+
+    return {dni: seconds * adjustment_ratio for dni, seconds in day_dni_totals.items()}
+
+# --- STREAMING PIPELINE OVER time_entries ---
+
+# One row per time entry, ordered so that every worker-day arrives contiguously
+TIME_ENTRY_EVENTS_SQL = """
+    SELECT "Št. delavca", "Ime delavca", "Od datuma in ure", "Do datuma in ure", "DNI", "Št.Projektne naloge"
+    FROM time_entries
+    WHERE COALESCE("Preklican", 0) = 0 AND "DNI" IS NOT NULL AND "DNI" != ''{range_filter}
+    ORDER BY "Št. delavca", "Od datuma in ure"
+"""
+
+# Planned quantities per work order for get_planning_data
+PLANNED_QUANTITIES_SQL = 'SELECT "Št.", "Št.Projektne naloge", "Količina", "Zakljucena kol." FROM work_orders'
+
+def parse_timestamp(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+def time_entry_range_filter(start_date=None, end_date=None):
+    """SQL fragment and params limiting time entries to [start_date, end_date] (dates, inclusive)."""
+    sql, params = "", []
+    if start_date:
+        sql += ' AND "Od datuma in ure" >= ?'
+        params.append(start_date.isoformat())
+    if end_date:
+        sql += ' AND "Od datuma in ure" < ?'
+        params.append((end_date + datetime.timedelta(days=1)).isoformat())
+    return sql, params
+
+def time_entry_events(row):
+    """Turns a time_entries row (worker_no, worker_name, from, to, dni, ...) into start/stop events."""
+    worker_no, worker_name, t_from, t_to, dni = row[:5]
+    t_from, t_to = parse_timestamp(t_from), parse_timestamp(t_to)
+    events = []
+    if t_from is not None:
+        events.append((worker_no, worker_name, t_from, 'start', dni))
+    if t_to is not None:
+        events.append((worker_no, worker_name, t_to, 'stop', dni))
+    return events
+
+@timed('actual_time')
+def stream_actual_time_totals(rows, on_row=None):
+    """
+    Same totals as calculate_actual_time_totals, computed from time_entries rows
+    ordered by worker and start time without materializing the event list.
+
+    A worker-day is handed to calculate_worker_day_totals as soon as a row of a
+    later day (or another worker) arrives: rows are ordered by start time and an
+    entry never ends before it starts, so no later row can add events to it.
+    Memory is bounded by one worker's open days plus the per-DNI totals.
+    on_row(row) is called for every row, e.g. to collect side information.
+    """
+    dni_actual_times = defaultdict(float)
+    worker_dni_actual_times = defaultdict(lambda: defaultdict(float))
+    pending = {}  # date -> events of the current worker
+    current_worker = None
+    event_count = 0
+
+    def flush(before=None):
+        for date in sorted(d for d in pending if before is None or d < before):
+            for dni, final_seconds in _day_totals(current_worker, date, pending.pop(date)).items():
+                worker_dni_actual_times[current_worker][dni] += final_seconds
+                dni_actual_times[dni] += final_seconds
+
+    for row in rows:
+        if on_row is not None:
+            on_row(row)
+        events = time_entry_events(row)
+        if row[0] != current_worker:
+            flush()
+            current_worker = row[0]
+        elif events and events[0][3] == 'start':
+            flush(events[0][2].date())
+        for event in events:
+            if not event[4]: continue
+            pending.setdefault(event[2].date(), []).append(event)
+            event_count += 1
+    flush()
+
+    final_worker_times = {w: dict(d) for w, d in worker_dni_actual_times.items()}
+    return dict(dni_actual_times), final_worker_times, event_count
+
+def _completion_label(status, completed_at):
+    if completed_at:
+        return f"Completed ({completed_at})"
+    return 'Ready' if status == 'Ready' else 'Pending'
+
+def _load_project_notes():
+    """project_notes rows and photo counts from velika_montaza.db, keyed by project."""
+    db_path = current_app.config.get('VELIKA_MONTAZA_DB_PATH')
+    if not db_path:
+        return {}, {}
+    conn = get_db_connection(db_path)
+    if conn is None:
+        return {}, {}
+    try:
+        notes = {row['project_task_no']: dict(row) for row in conn.execute("SELECT * FROM project_notes")}
+        photos = dict(conn.execute(
+            "SELECT project_task_no, COUNT(*) FROM project_photos GROUP BY project_task_no").fetchall())
+        return notes, photos
+    finally:
+        conn.close()
+
+def get_planning_data(start_date=None, end_date=None):
+    """
+    Rows for the planning board: per project actual vs. planned hours plus the
+    note/priority columns planning.html shows.
+
+    Actual seconds, planned (allocated nominal) hours and worker names come
+    from the materialized tables in actual_hours.py; callers check
+    actual_hours.ensure_fresh() first. Planned quantities are summed from
+    work_orders. start_date/end_date (datetime.date, inclusive) limit the time
+    window to the worker-days (planned hours: entry starts) in it; with a
+    window only projects that had time booked in it are returned.
+    """
+    from . import actual_hours  # it imports this module
+    conn = get_db_connection(current_app.config['DATABASE_PATH'])
+    try:
+        dni_projects = {}
+        planned = {}
+        for dni, project, quantity, completed in conn.execute(PLANNED_QUANTITIES_SQL):
+            if not project:
+                continue
+            if dni:
+                dni_projects[dni] = project
+            entry = planned.setdefault(project, [0.0, 0.0])
+            entry[0] += quantity or 0
+            entry[1] += completed or 0
+    finally:
+        conn.close()
+
+    worker_dni_seconds = actual_hours.get_worker_dni_seconds(start_date, end_date)
+    planned_hours = {p: h for p, h in actual_hours.get_planned_hours(start_date, end_date).items() if p}
+    # DNIs without a work order count for the project their time entries name
+    dni_projects.update(actual_hours.get_entry_projects(
+        {dni for _, dni, _ in worker_dni_seconds if dni not in dni_projects}))
+    worker_names = actual_hours.get_worker_names()
+
+    # Roll DNI seconds up to projects, remembering who worked most on each
+    project_seconds = defaultdict(float)
+    project_workers = defaultdict(lambda: defaultdict(float))
+    for worker_no, dni, seconds in worker_dni_seconds:
+        project = dni_projects.get(dni)
+        if project:
+            project_seconds[project] += seconds
+            project_workers[project][worker_no] += seconds
+
+    if start_date or end_date:
+        project_ids = set(project_seconds) | set(planned_hours)
+    else:
+        project_ids = set(planned) | set(project_seconds)
+
+    notes, photo_counts = _load_project_notes()
+    statuses = get_project_statuses(list(project_ids))
+
+    rows = []
+    for project in project_ids:
+        note = notes.get(project, {})
+        workers = project_workers.get(project)
+        top_worker = max(workers, key=workers.get) if workers else None
+        quantity, completed = planned.get(project, (0.0, 0.0))
+        rows.append({
+            "name": project,
+            "worker": worker_names.get(top_worker),
+            "priority": note.get('priority'),
+            "pause_status": note.get('pause_status') if note.get('pause_status') != 'none' else None,
+            "status_percentage": statuses[project]["percentage"],
+            "electrification_status": _completion_label(note.get('electrification_status'), note.get('electrification_completed_at')),
+            "control_status": _completion_label(note.get('control_status'), note.get('control_completed_at')),
+            "packaging_status": note.get('packaging_status'),
+            "has_notes": bool(note.get('notes') or note.get('electrification_notes') or note.get('control_notes')),
+            "photo_count": photo_counts.get(project, 0),
+            "last_updated_at": max(filter(None, (note.get('last_note_updated_at'), note.get('last_dni_updated_at'))), default=None),
+            "actual_hours": round(project_seconds.get(project, 0.0) / 3600, 2),
+            "planned_hours": round(planned_hours.get(project, 0.0), 2),
+            "planned_quantity": quantity,
+            "completed_quantity": completed,
+        })
+    rows.sort(key=lambda r: (priority_rank(r["priority"]), r["name"]))
+    return rows
@@ -0,0 +1,172 @@
+# app/time_calculator_np.py
+"""
+NumPy backend for calculate_actual_time_totals.
+
+Events are converted once to int64 microsecond arrays; segment building,
+lunch-window gaps, the 6 h / 30 min deduction and the per-DNI sums are
+then array operations over all worker-days at once. Every floating point
+sum is done with np.bincount, which adds in input order, and the inputs
+are ordered exactly like the loop implementation visits them, so the
+results are bit-identical (see check_time_backends.py).
+"""
+import datetime
+from itertools import repeat
+from operator import floordiv, sub
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from .time_calculator import START_KEYS, STOP_KEYS
+
+US_PER_DAY = 86_400_000_000
+US_PER_HOUR = 3_600_000_000
+WORK_THRESHOLD = 21600 # 6 hours
+FULL_BREAK = 1800.0 # 30 mins
+
+_START, _STOP = 1, 2
+_EPOCH = datetime.datetime(1970, 1, 1)
+_ONE_US = datetime.timedelta(microseconds=1)
+
+
+def is_available():
+    return np is not None
+
+
+def _first_seen_ids(keys):
+    """Dense ids for keys, numbered in order of first occurrence."""
+    _, first_idx, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_idx), dtype=np.int64)
+    rank[np.argsort(first_idx, kind='stable')] = np.arange(len(first_idx))
+    return rank[inverse.ravel()], len(first_idx)
+
+
+def _factorize(values):
+    """(codes array, distinct values in first-seen order) without a Python-level loop body."""
+    distinct = list(dict.fromkeys(values))
+    index = {v: i for i, v in enumerate(distinct)}
+    return np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values)), distinct
+
+
+def _type_code(raw):
+    evt_type = str(raw).strip().lower()
+    return _START if evt_type in START_KEYS else _STOP if evt_type in STOP_KEYS else 0
+
+
+def calculate_actual_time_totals(events_list_tuple):
+    """Drop-in replacement for time_calculator.calculate_actual_time_totals."""
+    if np is None:
+        raise RuntimeError("The numpy time backend requires numpy to be installed.")
+
+    # --- 1. Columns to arrays; the per-event work runs in C-level map()s ---
+    events = [e for e in events_list_tuple if e[4]]
+    if not events:
+        return {}, {}
+    worker_col, _, times, type_col, dni_col = zip(*events)
+    workers, worker_values = _factorize(worker_col)
+    dnis, dni_values = _factorize(dni_col)
+    type_codes = {raw: _type_code(raw) for raw in set(type_col)}
+    types = np.fromiter(map(type_codes.__getitem__, type_col), dtype=np.int8, count=len(type_col))
+    ts = np.fromiter(map(floordiv, map(sub, times, repeat(_EPOCH)), repeat(_ONE_US)),
+                     dtype=np.int64, count=len(times))
+    return calculate_totals_from_arrays(workers, ts, types, dnis, worker_values, dni_values)
+
+
+def calculate_totals_from_arrays(workers, ts, types, dnis, worker_values, dni_values):
+    """
+    Core of the backend, for callers that already hold column arrays
+    (e.g. straight from a SQL cursor): workers/dnis are dense int codes into
+    worker_values/dni_values, ts are naive-local epoch microseconds and types
+    are 1 = start, 2 = stop, 0 = ignored. Events with an empty DNI must
+    already be filtered out.
+    """
+    if len(ts) == 0:
+        return {}, {}
+    days = ts // US_PER_DAY
+
+    # --- 2. Worker-day buckets, numbered like the loop's dict insertion order ---
+    span = int(days.max() - days.min()) + 1
+    bucket, n_buckets = _first_seen_ids(workers * span + (days - days.min()))
+    bucket_worker = np.empty(n_buckets, dtype=np.int64)
+    bucket_worker[bucket] = workers
+    bucket_day = np.empty(n_buckets, dtype=np.int64)
+    bucket_day[bucket] = days
+
+    # Stable sort by time inside each bucket; only start/stop events matter
+    order = np.lexsort((np.arange(len(ts)), ts, bucket))
+    order = order[types[order] != 0]
+    b, t, typ, dni = bucket[order], ts[order], types[order], dnis[order]
+
+    # --- 3. Segments: an event closes a segment when the previous event of its bucket was a start ---
+    prev_start = np.zeros(len(b), dtype=bool)
+    prev_start[1:] = (typ[:-1] == _START) & (b[:-1] == b[1:])
+    close_idx = np.nonzero(prev_start)[0]
+    # Forgotten clock-out: the bucket's last event is a start -> auto-close at 15:00
+    last_in_bucket = np.ones(len(b), dtype=bool)
+    last_in_bucket[:-1] = b[:-1] != b[1:]
+    open_idx = np.nonzero(last_in_bucket & (typ == _START))[0]
+    limit = bucket_day[b[open_idx]] * US_PER_DAY + 15 * US_PER_HOUR
+    keep = t[open_idx] < limit
+    open_idx, limit = open_idx[keep], limit[keep]
+
+    seg_b = np.concatenate([b[close_idx], b[open_idx]])
+    seg_s = np.concatenate([t[close_idx - 1], t[open_idx]])
+    seg_e = np.concatenate([t[close_idx], limit])
+    seg_d = np.concatenate([dni[close_idx - 1], dni[open_idx]])
+    seg_pos = np.concatenate([close_idx * 2, open_idx * 2 + 1])
+    seg_order = np.argsort(seg_pos, kind='stable')
+    seg_b, seg_s, seg_e, seg_d = seg_b[seg_order], seg_s[seg_order], seg_e[seg_order], seg_d[seg_order]
+
+    # --- 4. Raw durations per bucket and per (bucket, DNI) ---
+    dur_us = seg_e - seg_s
+    positive = dur_us > 0
+    dur = dur_us[positive] / 1e6
+    pos_b, pos_d = seg_b[positive], seg_d[positive]
+    total_day = np.bincount(pos_b, weights=dur, minlength=n_buckets)
+    pair, n_pairs = _first_seen_ids(pos_b * len(dni_values) + pos_d)
+    pair_seconds = np.bincount(pair, weights=dur, minlength=n_pairs)
+    pair_bucket = np.empty(n_pairs, dtype=np.int64)
+    pair_bucket[pair] = pos_b
+    pair_dni = np.empty(n_pairs, dtype=np.int64)
+    pair_dni[pair] = pos_d
+
+    # --- 5. Gaps inside the 11:00 - 13:00 lunch window ---
+    gaps = np.zeros(n_buckets)
+    if len(seg_b):
+        first = np.ones(len(seg_b), dtype=bool)
+        first[1:] = seg_b[1:] != seg_b[:-1]
+        last = np.ones(len(seg_b), dtype=bool)
+        last[:-1] = seg_b[:-1] != seg_b[1:]
+        seg_day0 = bucket_day[seg_b] * US_PER_DAY
+        ls, le = seg_day0 + 11 * US_PER_HOUR, seg_day0 + 13 * US_PER_HOUR
+        before = np.maximum(np.minimum(seg_s, le) - ls, 0)[first] / 1e6
+        after = np.maximum(le - np.maximum(seg_e, ls), 0)[last] / 1e6
+        inner = ~last
+        between = np.maximum(np.minimum(np.roll(seg_s, -1), le) - np.maximum(seg_e, ls), 0)[inner] / 1e6
+        # Same summation order as the loop: before, after, then the inner gaps
+        gaps = np.bincount(np.concatenate([seg_b[first], seg_b[last], seg_b[inner]]),
+                           weights=np.concatenate([before, after, between]), minlength=n_buckets)
+
+    # --- 6. Deduction and proportional distribution ---
+    deduction = np.where((total_day > WORK_THRESHOLD) & (gaps < FULL_BREAK), FULL_BREAK - gaps, 0.0)
+    apply = (deduction > 0) & (total_day > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = (total_day - deduction) / total_day
+    ratio = np.where(apply, np.where(total_day <= deduction, 0.0, scaled), 1.0)
+    final = pair_seconds * ratio[pair_bucket]
+
+    # --- 7. Fold into per-DNI and per-worker totals in bucket order ---
+    dni_totals = np.bincount(pair_dni, weights=final, minlength=len(dni_values))
+    wd, n_wd = _first_seen_ids(bucket_worker[pair_bucket] * len(dni_values) + pair_dni)
+    wd_totals = np.bincount(wd, weights=final, minlength=n_wd)
+    wd_worker = np.empty(n_wd, dtype=np.int64)
+    wd_worker[wd] = bucket_worker[pair_bucket]
+    wd_dni = np.empty(n_wd, dtype=np.int64)
+    wd_dni[wd] = pair_dni
+
+    final_dni_times = {dni_values[d]: float(dni_totals[d]) for d in np.unique(pair_dni)}
+    final_worker_times = {}
+    for w, d, seconds in zip(wd_worker.tolist(), wd_dni.tolist(), wd_totals.tolist()):
+        final_worker_times.setdefault(worker_values[w], {})[dni_values[d]] = seconds
+    return final_dni_times, final_worker_times
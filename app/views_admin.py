@@ -1,26 +1,29 @@
 import os
 from flask import Blueprint, jsonify, request
 from werkzeug.security import generate_password_hash
-from .extensions import db
-from .models import User
+from .extensions import db, shared_cache
 from .auth import admin_required
+from .responses import error_response
+from . import metrics
 
 bp = Blueprint('admin_bp', __name__, url_prefix='/api/admin')
 
 @bp.route('/users', methods=['GET'])
 @admin_required
 def get_users():
+    from .models import User
     try:
         users = User.query.all()
         # Don't send password hashes back!
         user_list = [{"id": u.id, "username": u.username, "role": u.role} for u in users]
         return jsonify(user_list)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 @bp.route('/users', methods=['POST'])
 @admin_required
 def create_user():
+    from .models import User
     data = request.json
     username = data.get('username')
     password = data.get('password')
@@ -39,11 +42,12 @@ def create_user():
         db.session.commit()
         return jsonify({"status": "success"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 @bp.route('/users/<int:user_id>', methods=['DELETE'])
 @admin_required
 def delete_user(user_id):
+    from .models import User
     try:
         user = User.query.get(user_id)
         if not user:
@@ -53,4 +57,31 @@ def delete_user(user_id):
         db.session.commit()
         return jsonify({"status": "success"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return error_response(e)
+
+@bp.route('/cache_stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Shared cache hit/miss counters (all workers) and current size."""
+    try:
+        return jsonify(shared_cache.stats())
+    except Exception as e:
+        return error_response(e)
+
+@bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """
+    Rolling per-endpoint timings of the worker that answers (see metrics.py):
+    wall time, SQL, sections, response sizes, cache hits, errors and the
+    slow-request log (?slow=0 leaves it out). Shared cache totals cover all workers.
+    """
+    data = metrics.snapshot(slow=request.args.get('slow', '1') != '0')
+    data["shared_cache"] = shared_cache.stats()
+    return jsonify(data)
+
+@bp.route('/metrics', methods=['DELETE'])
+@admin_required
+def reset_metrics():
+    metrics.reset()
+    return jsonify({"status": "success"})
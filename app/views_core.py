@@ -1,6 +1,7 @@
 import os
 from flask import Blueprint, render_template, current_app, send_from_directory
 from .helpers import get_project_statuses_from_db
+from .responses import conditional_json, error_response
 
 bp = Blueprint('core', __name__)
 
@@ -11,9 +12,13 @@ def serve_app():
     return send_from_directory(current_app.config['APP_ROOT'], 'mobile_app.html')
 
 @bp.route('/api/project_statuses')
+@conditional_json
 def get_project_statuses():
     # Fetch statuses for the home page dashboard
-    return get_project_statuses_from_db()
+    try:
+        return get_project_statuses_from_db()
+    except Exception as e:
+        return error_response(e)
 
 @bp.route('/<path:filename>')
 def serve_static_files(filename):
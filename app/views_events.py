@@ -0,0 +1,34 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+from .events import broker, event_stream, poll_changes
+
+bp = Blueprint('events', __name__)
+
+@bp.route('/api/events')
+def stream_events():
+    # Each open stream holds a server thread unless the server runs gevent (see serve.py), so
+    # by default none are served; a refused page long-polls /api/events/poll (js/live_updates.js)
+    if not broker.open_stream(current_app.config.get('SSE_MAX_STREAMS')):
+        response = jsonify({"error": "Too many open event streams"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    # Resume after a dropped connection from the id the browser saw last
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    app = current_app._get_current_object()
+    response = Response(event_stream(app, last_event_id), mimetype='text/event-stream')
+    response.call_on_close(broker.close_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@bp.route('/api/events/poll')
+def poll_events():
+    # ?version=<the version of the previous answer>; the first poll omits it
+    since = request.args.get('version')
+    version = poll_changes(current_app._get_current_object(), since,
+                           current_app.config.get('EVENTS_POLL_WAIT', 1.0))
+    response = jsonify({"version": version, "changed": since is not None and version != since})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
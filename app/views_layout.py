@@ -1,42 +1,121 @@
 from flask import Blueprint, jsonify, current_app, request
 import json
 import os
-from .helpers import get_project_inventory_status
+import shutil
+import tempfile
+import threading
+from .helpers import get_project_statuses
+from .data_version import mark_changed
+from .metrics import record_exception
+from .responses import conditional_json, uncacheable
 
 bp = Blueprint('layout', __name__)
 
+# Parsed layout document, reused until the file on disk changes
+_layout_cache = {"path": None, "stamp": None, "data": {}}
+_layout_lock = threading.Lock()
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _load_layout(path):
+    """Returns the parsed layout JSON, re-reading the file only when its mtime/size changed."""
+    stamp = _file_stamp(path)
+    with _layout_lock:
+        if _layout_cache["path"] == path and _layout_cache["stamp"] == stamp:
+            return _layout_cache["data"]
+    data = {}
+    if stamp is not None:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    with _layout_lock:
+        _layout_cache.update(path=path, stamp=stamp, data=data)
+    return data
+
+def _copy_with_project_items(layout_data):
+    """
+    Copies the cached document one level deep so statuses can be attached
+    without touching the cache, and returns (copy, project_items).
+    Items may be stored either as a top-level mapping or as an 'items' list.
+    """
+    copy = {}
+    project_items = []
+    for key, value in layout_data.items():
+        if isinstance(value, dict):
+            value = dict(value)
+            if value.get('type') == 'project':
+                project_items.append(value)
+        elif key == 'items' and isinstance(value, list):
+            value = [dict(item) if isinstance(item, dict) else item for item in value]
+            project_items.extend(item for item in value
+                                 if isinstance(item, dict) and item.get('type') == 'project')
+        copy[key] = value
+    return copy, project_items
+
+def _project_id(item):
+    return item.get('id') or item.get('name')
+
 @bp.route('/api/layout')
+@conditional_json
 def get_layout():
     layout_data = {}
     try:
         path = current_app.config['LAYOUT_DATA_FILE_PATH']
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                layout_data = json.load(f)
-        
-        # Link Layout Items to Database Status
-        for key, item in layout_data.items():
-            if item.get('type') == 'project':
-                pid = item.get('id')
-                # Calculate status on the fly
-                status = get_project_inventory_status(pid)
-                item['db_status'] = status
+        layout_data, project_items = _copy_with_project_items(_load_layout(path))
+
+        # Link Layout Items to Database Status (one batched lookup for all items)
+        try:
+            statuses = get_project_statuses([_project_id(item) for item in project_items])
+        except Exception as e:
+            print(f"⚠️ Layout status error: {e}")
+            record_exception(e)
+            # Served so the floor plan still renders, but never cached or ETagged as the real thing
+            uncacheable()
+            statuses = {}
+        for item in project_items:
+            item['db_status'] = statuses.get(_project_id(item)) or {"status": "Error", "percentage": 0, "error": "status lookup failed"}
                 
-        return jsonify(layout_data)
+        return layout_data
 
     except Exception as e:
         print(f"CRITICAL LAYOUT ERROR: {e}")
+        record_exception(e)
         # Return whatever data we managed to load, preventing the gray screen
-        return jsonify(layout_data)
+        uncacheable()
+        return layout_data
 
 @bp.route('/api/save_layout', methods=['POST'])
 def save_layout():
-    # Simple save functionality
+    new_data = request.get_json(silent=True)
+    if not isinstance(new_data, dict):
+        return jsonify({"status": "error", "message": "Layout must be a JSON object"}), 400
+    # Write to a temp file of our own and swap it in, so readers never see a
+    # half-written layout and concurrent saves never share a temp file
+    tmp_path = None
     try:
-        new_data = request.json
         path = current_app.config['LAYOUT_DATA_FILE_PATH']
-        with open(path, 'w', encoding='utf-8') as f:
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path) or '.', prefix='.layout-',
+                                         suffix='.tmp', delete=False, encoding='utf-8') as f:
+            tmp_path = f.name
             json.dump(new_data, f, indent=4)
+        if os.path.exists(path):
+            # NamedTemporaryFile is private (0600); keep the layout file's permissions
+            shutil.copymode(path, tmp_path)
+        with _layout_lock:
+            os.replace(tmp_path, path)
+            tmp_path = None
+            _layout_cache.update(path=path, stamp=_file_stamp(path), data=new_data)
+        mark_changed('layout')
         return jsonify({"status": "success"})
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
\ No newline at end of file
+        record_exception(e)
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -0,0 +1,141 @@
+import datetime
+from flask import Blueprint, jsonify, request, current_app, send_file
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.formparser import parse_form_data
+from .auth import admin_required
+from .db import get_db_connection
+from .data_version import mark_changed
+from .responses import conditional_json, error_response
+from .photos import (HashingWriter, UnsupportedPhoto, stream_to_writer, commit_upload, schedule_derivatives,
+                     variant_path, photo_urls, list_photos, is_content_addressed, remove_files, warn_if_unavailable,
+                     DERIVATIVES)
+
+bp = Blueprint('photos', __name__, url_prefix='/api')
+bp.record_once(lambda state: warn_if_unavailable())
+
+# Content-addressed files never change under their URL
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+def _photos_conn():
+    conn = get_db_connection(current_app.config['VELIKA_MONTAZA_DB_PATH'])
+    if conn is None:
+        raise RuntimeError("Application database is not available")
+    return conn
+
+
+def _receive_upload():
+    """Streams the uploaded photo to disk; multipart field 'photo' or a raw image body."""
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    writers = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        writer = HashingWriter(upload_dir)
+        writers.append(writer)
+        return writer
+
+    try:
+        if request.mimetype.startswith('multipart/'):
+            _, _, files = parse_form_data(request.environ, stream_factory=stream_factory)
+            storage = files.get('photo')
+            if storage is None:
+                return None
+            writer = storage.stream
+        else:
+            writer = stream_to_writer(request.stream, stream_factory(None, request.mimetype, None))
+        if writer.size == 0:
+            return None
+        writers.remove(writer)
+        return commit_upload(writer)
+    finally:
+        for leftover in writers:
+            leftover.discard()
+
+
+@bp.route('/project/<project_id>/upload', methods=['POST'])
+@admin_required
+def upload_photo(project_id):
+    try:
+        filename = _receive_upload()
+    except UnsupportedPhoto as e:
+        return jsonify({"error": str(e)}), 400
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
+    if filename is None:
+        return jsonify({"error": "No photo in request"}), 400
+
+    conn = _photos_conn()
+    try:
+        exists = conn.execute("SELECT 1 FROM project_photos WHERE project_task_no = ? AND filename = ?",
+                              (project_id, filename)).fetchone()
+        if not exists:
+            conn.execute("INSERT INTO project_photos (project_task_no, filename, uploaded_at) VALUES (?, ?, ?)",
+                         (project_id, filename, datetime.datetime.now().isoformat(timespec='seconds')))
+            conn.commit()
+    finally:
+        conn.close()
+
+    schedule_derivatives(filename)
+    mark_changed('photos', project_id)
+    return jsonify({"status": "success", "filename": filename, **photo_urls(filename)})
+
+
+@bp.route('/project/<project_id>/photos')
+@conditional_json
+def get_project_photos(project_id):
+    """Photo list with thumbnail URLs; the panel loads 'url' and opens 'medium_url' (originals only without Pillow)."""
+    try:
+        conn = _photos_conn()
+        try:
+            return list_photos(conn, project_id)
+        finally:
+            conn.close()
+    except Exception as e:
+        return error_response(e)
+
+
+@bp.route('/project/<project_id>/photo/<filename>', methods=['DELETE'])
+@admin_required
+def delete_photo(project_id, filename):
+    conn = _photos_conn()
+    try:
+        cursor = conn.execute("DELETE FROM project_photos WHERE project_task_no = ? AND filename = ?",
+                              (project_id, filename))
+        still_used = conn.execute("SELECT 1 FROM project_photos WHERE filename = ? LIMIT 1", (filename,)).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    if cursor.rowcount == 0:
+        return jsonify({"error": "Photo not found"}), 404
+    # The same content may be attached to another project under the same name
+    if not still_used:
+        remove_files(filename)
+    mark_changed('photos', project_id)
+    return jsonify({"status": "success"})
+
+
+@bp.route('/project/<project_id>/photo/<filename>')
+def get_project_photo(project_id, filename):
+    """Older links to the original upload."""
+    return serve_photo('original', filename)
+
+
+@bp.route('/photos/<variant>/<filename>')
+def serve_photo(variant, filename):
+    """
+    Photo files with Range support (send_file(conditional=True)). Content-addressed
+    names are cached for a year; a derivative still being rendered is served as the
+    original with no-cache, so the browser asks again later.
+    """
+    if variant != 'original' and variant not in DERIVATIVES:
+        raise NotFound()
+    path, is_final = variant_path(filename, variant)
+    try:
+        response = send_file(path, conditional=True, max_age=0)
+    except FileNotFoundError:
+        raise NotFound()
+    if is_final and is_content_addressed(filename):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    else:
+        response.headers['Cache-Control'] = "no-cache"
+    return response
@@ -1,62 +1,99 @@
 import os
-from flask import Blueprint, jsonify, request
-from .extensions import db, cache
-from .models import WorkOrder, Component, TimeEntry, ProjectNote
+from flask import Blueprint, jsonify, request, current_app
+from .extensions import shared_cache
+from .responses import conditional_json, prebuilt_json, error_response
+from .data_version import get_erp_version
+from .helpers import get_project_parts, get_work_order_rows
+from .db import get_db_connection
+from .purchase_eta import add_etas
+from .project_snapshot import get_snapshot
 
 bp = Blueprint('project', __name__, url_prefix='/api')
 
 @bp.route('/project/<project_id>/work_orders')
-@cache.cached(timeout=60, query_string=True)
+@conditional_json
 def get_project_work_orders(project_id):
     try:
-        orders = WorkOrder.query.filter_by(project_task_no=project_id).all()
-        result = []
-        for wo in orders:
-            is_completed = wo.status in ['Zaključeno', 'Completed', 'Finished']
-            result.append({
-                "work_order_no": wo.work_order_no,
-                "description": wo.description,
-                "status": wo.status,
-                "quantity": wo.quantity,
-                "is_completed": is_completed,
-                "completion_source": "auto" if is_completed else "none"
-            })
-        return jsonify(result)
+        # Keyed on the master DB stamp, so a write that bypasses import_erp.py can't leave it stale;
+        # import_erp.py also drops it by tag: "erp" after a snapshot, project:<id> when a delta touched it
+        result = shared_cache.get_or_set(
+            f"work_orders:{project_id}", lambda: get_work_order_rows(project_id),
+            tags=("erp", f"project:{project_id}"), version=get_erp_version())
+        return result
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
+
+@bp.route('/project/<project_id>/snapshot')
+def get_project_snapshot(project_id):
+    """Everything the detail panel shows, served from pre-serialized bytes (see project_snapshot.py)."""
+    try:
+        body, etag = get_snapshot(project_id)
+    except Exception as e:
+        return error_response(e)
+    return prebuilt_json(body, etag)
+
+def _with_etas(missing):
+    """Earliest covering purchase ETA per missing part, from the purchase_eta index."""
+    conn = get_db_connection(current_app.config['DATABASE_PATH'])
+    if conn is None:
+        return missing
+    try:
+        return add_etas(conn, missing)
+    finally:
+        conn.close()
+
+@bp.route('/project/<project_id>/parts')
+@conditional_json
+def get_project_parts_status(project_id):
+    """Missing and arrived parts in one round trip: {"missing": [...], "arrived": [...]}."""
+    try:
+        parts = get_project_parts(project_id)
+        _with_etas(parts["missing"])
+        return jsonify(parts)
+    except Exception as e:
+        return error_response(e)
 
 @bp.route('/project/<project_id>/detailed_missing_parts')
+@conditional_json
 def get_project_detailed_missing_parts(project_id):
     try:
-        # Logic: Remaining > 0 AND Inventory <= 0
-        components = Component.query.filter_by(project_task_no=project_id).all()
-        missing = []
-        for comp in components:
-            if (comp.quantity_remaining or 0) > 0 and (comp.inventory_stock or 0) <= 0:
-                missing.append({
-                    "item_no": comp.item_no,
-                    "description": comp.description,
-                    "sifra_regala": comp.shelf_code or "N/A", # FIX: Maps to frontend key
-                    "quantity_needed": comp.quantity_remaining
-                })
-        return jsonify(missing)
+        # Logic: Remaining > 0 AND Inventory <= 0 (classified in SQL)
+        return jsonify(_with_etas(get_project_parts(project_id)["missing"]))
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 @bp.route('/project/<project_id>/detailed_arrived_parts')
+@conditional_json
 def get_project_detailed_arrived_parts(project_id):
     try:
-        # Logic: Inventory > 0
-        components = Component.query.filter_by(project_task_no=project_id).all()
-        arrived = []
-        for comp in components:
-            if (comp.inventory_stock or 0) > 0:
-                arrived.append({
-                    "item_no": comp.item_no,
-                    "description": comp.description,
-                    "sifra_regala": comp.shelf_code or "N/A", # FIX: Maps to frontend key
-                    "quantity_needed": comp.quantity_remaining
-                })
-        return jsonify(arrived)
+        # Logic: Inventory > 0 (classified in SQL)
+        return jsonify(get_project_parts(project_id)["arrived"])
+    except Exception as e:
+        return error_response(e)
+
+@bp.route('/allocation')
+@conditional_json
+def get_allocation_summary():
+    """Shortage counts per project after allocating free stock by priority and due date."""
+    from .allocation import get_allocation
+    try:
+        allocation = get_allocation()
+        projects = {
+            project: {
+                "short_lines": len(lines),
+                "short_quantity": sum(need - take for _, _, _, need, take, _ in lines)
+            }
+            for project, lines in allocation["projects"].items()
+        }
+        return jsonify({"projects": projects, "stats": allocation["stats"]})
+    except Exception as e:
+        return error_response(e)
+
+@bp.route('/project/<project_id>/shortages')
+@conditional_json
+def get_project_shortage_list(project_id):
+    from .allocation import get_project_shortages
+    try:
+        return jsonify(get_project_shortages(project_id))
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return error_response(e)
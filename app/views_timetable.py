@@ -1,6 +1,9 @@
+import datetime
 from flask import Blueprint, render_template, jsonify, request
-from . import time_calculator # <--- FIX: Added dot for relative import
 from .extensions import db
+from .responses import conditional_json, error_response, uncacheable
+
+# time_calculator, actual_hours and the models are imported on first use
 
 bp = Blueprint('timetable', __name__)
 
@@ -9,10 +12,55 @@ def planning():
     return render_template('planning.html')
 
 @bp.route('/api/planning_data')
+@conditional_json
 def get_planning_data():
+    # Optional window, e.g. ?start=2025-11-01&end=2025-11-30 (inclusive)
+    try:
+        start, end = (datetime.date.fromisoformat(request.args[k]) if request.args.get(k) else None
+                      for k in ('start', 'end'))
+    except ValueError:
+        return jsonify({"error": "start/end must be YYYY-MM-DD"}), 400
+    from . import actual_hours, time_calculator
     try:
+        if not actual_hours.ensure_fresh():
+            uncacheable()
         # This uses the logic from your time_calculator.py
-        data = time_calculator.get_planning_data()
-        return jsonify(data)
+        return time_calculator.get_planning_data(start, end)
+    except Exception as e:
+        return error_response(e)
+
+
+@bp.route('/api/dni/<dni>/actual_time')
+@conditional_json
+def get_dni_actual_time(dni):
+    from . import actual_hours
+    try:
+        if not actual_hours.ensure_fresh():
+            uncacheable()
+        seconds = actual_hours.get_dni_seconds([dni]).get(dni, 0.0)
+        workers = actual_hours.get_worker_seconds(dni)
+        return jsonify({
+            "dni": dni,
+            "actual_hours": round(seconds / 3600, 2),
+            "workers": {str(w): round(s / 3600, 2) for w, s in workers.items()}
+        })
+    except Exception as e:
+        return error_response(e)
+
+@bp.route('/api/project/<project_id>/actual_hours')
+@conditional_json
+def get_project_actual_hours(project_id):
+    from . import actual_hours
+    from .models import WorkOrder
+    try:
+        if not actual_hours.ensure_fresh():
+            uncacheable()
+        dnis = [dni for (dni,) in db.session.query(WorkOrder.work_order_no).filter_by(project_task_no=project_id)]
+        per_dni = actual_hours.get_dni_seconds(dnis)
+        return jsonify({
+            "project": project_id,
+            "actual_hours": round(sum(per_dni.values()) / 3600, 2),
+            "dni": {dni: round(s / 3600, 2) for dni, s in per_dni.items()}
+        })
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return error_response(e)
@@ -0,0 +1,282 @@
+"""
+Endpoint benchmarks on a synthetic dataset (see generate_dataset.py).
+
+    python bench_endpoints.py [--data DIR] [--scale small] [--seed 0] [--requests 30] [--projects 20]
+                              [--warm] [--only NAME ...] [--time-entries-limit 200000]
+                              [--save bench_baseline.json] [--compare bench_baseline.json] [--tolerance 0.25]
+
+The dataset is generated into DIR (default: a folder per scale/seed in the
+temp directory) unless it already exists, and the app is pointed at it
+through APP_DATA_DIR, so the databases next to run.py are never touched.
+
+Every benchmark is run --requests times through the Flask test client with
+an admin session. By default the shared cache is cleared before each run
+(outside the timing), so the numbers are the cost of building a response;
+--warm keeps it and measures the cached path instead. Reported per
+benchmark: p50/p99/mean latency, SQL statements and SQL time per run (raw
+connections and SQLAlchemy), response bytes and the tracemalloc peak of one
+extra run. --save stores the results; --compare exits with status 1 when
+a p50 is more than --tolerance slower than the baseline or a benchmark
+issues more SQL statements than it did.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class SqlCounter:
+    """Counts statements and their time on the raw pool (db.py observers) and on the SQLAlchemy engines."""
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+    def reset(self):
+        self.statements, self.seconds = 0, 0.0
+
+    def observe(self, sql, seconds, params=None, db_path=None):
+        self.statements += 1
+        self.seconds += seconds
+
+    def _before_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('bench_started', []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        self.observe(statement, time.perf_counter() - conn.info['bench_started'].pop(), parameters)
+
+    def install(self, app):
+        from sqlalchemy import event
+        from app.db import add_statement_observer
+        from app.extensions import db
+        add_statement_observer(self.observe)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor)
+
+
+def ensure_dataset(data_dir, scale, seed):
+    marker = os.path.join(data_dir, "dataset.json")
+    if os.path.exists(marker):
+        with open(marker, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    from app.synthetic_data import generate_dataset
+    print(f"Generating '{scale}' dataset (seed {seed}) in {data_dir} ...")
+    summary = generate_dataset(data_dir, seed=seed, scale=scale)
+    print(f"  done in {summary['seconds']} s")
+    with open(marker, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def sample_projects(database_path, count):
+    """Every n-th project by number, so small and large projects are both represented."""
+    import sqlite3
+    conn = sqlite3.connect(database_path)
+    try:
+        projects = [r[0] for r in conn.execute(
+            'SELECT DISTINCT "Št.Projektne naloge" FROM work_orders'
+            ' WHERE "Št.Projektne naloge" IS NOT NULL ORDER BY 1')]
+    finally:
+        conn.close()
+    step = max(1, len(projects) // max(1, count))
+    return projects[::step][:count]
+
+
+def build_benchmarks(app, client, projects, events_limit):
+    """[(name, callable returning the response size in bytes)]."""
+    def endpoint(path_for):
+        calls = {"n": 0}
+
+        def run():
+            path = path_for(calls["n"])
+            calls["n"] += 1
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} -> HTTP {response.status_code}: {response.data[:200]!r}")
+            return len(response.data)
+        return run
+
+    def project(template):
+        return endpoint(lambda i: template.format(projects[i % len(projects)]))
+
+    benchmarks = [
+        ("project_statuses", endpoint(lambda i: "/api/project_statuses")),
+        ("layout", endpoint(lambda i: "/api/layout")),
+        ("project_work_orders", project("/api/project/{}/work_orders")),
+        ("project_parts", project("/api/project/{}/parts")),
+    ]
+
+    from app.db import get_db_connection
+    from app.time_calculator import TIME_ENTRY_EVENTS_SQL, calculate_actual_time_totals, time_entry_events
+    conn = get_db_connection(app.config['DATABASE_PATH'])
+    try:
+        sql = TIME_ENTRY_EVENTS_SQL.format(range_filter="") + f" LIMIT {int(events_limit)}"
+        events = tuple(e for row in conn.execute(sql) for e in time_entry_events(row))
+    finally:
+        conn.close()
+
+    def totals(backend):
+        def run():
+            calculate_actual_time_totals(events, backend=backend)
+            return 0
+        return run
+
+    benchmarks.append(("actual_time_totals", totals('python')))
+    try:
+        import numpy  # noqa: F401
+        benchmarks.append(("actual_time_totals_numpy", totals('numpy')))
+    except ImportError:
+        pass
+    return benchmarks
+
+
+def clear_caches():
+    from app import extensions, time_calculator
+    extensions.shared_cache.clear()
+    time_calculator.clear_day_cache()
+    if extensions._cache is not None:
+        extensions._cache.clear()
+
+
+def measure(name, run, counter, requests, warmup, warm):
+    for _ in range(warmup):
+        run()
+    latencies, statements, sql_ms, sizes = [], [], [], []
+    for _ in range(requests):
+        if not warm:
+            clear_caches()
+        counter.reset()
+        started = time.perf_counter()
+        size = run()
+        latencies.append((time.perf_counter() - started) * 1000)
+        statements.append(counter.statements)
+        sql_ms.append(counter.seconds * 1000)
+        sizes.append(size)
+
+    # Separate pass: tracemalloc slows allocation-heavy code down several times
+    if not warm:
+        clear_caches()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "queries": statistics.median(statements),
+        "sql_ms": round(statistics.median(sql_ms), 2),
+        "bytes": int(statistics.median(sizes)),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change per benchmark; returns the regressions."""
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"  {name:<26} (not in baseline)")
+            continue
+        change = (result["p50_ms"] / base["p50_ms"] - 1) * 100 if base["p50_ms"] else 0.0
+        print(f"  {name:<26} p50 {result['p50_ms']:8.2f} ms vs {base['p50_ms']:8.2f} ms ({change:+.1f}%)"
+              f"   queries {result['queries']:g} vs {base['queries']:g}")
+        if result["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            failures.append(f"{name}: p50 more than {tolerance:.0%} slower")
+        if result["queries"] > base["queries"]:
+            failures.append(f"{name}: {result['queries']:g} SQL statements, baseline {base['queries']:g}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot endpoints on a synthetic dataset.")
+    parser.add_argument('--data', metavar='DIR', help="dataset folder (generated if missing)")
+    parser.add_argument('--scale', default='small', help="dataset scale when generating (tiny, small, medium, large)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=30, help="timed runs per benchmark")
+    parser.add_argument('--warmup', type=int, default=2, help="untimed runs per benchmark")
+    parser.add_argument('--projects', type=int, default=20, help="projects sampled for the per-project endpoints")
+    parser.add_argument('--time-entries-limit', type=int, default=200_000,
+                        help="time entries fed to calculate_actual_time_totals")
+    parser.add_argument('--warm', action='store_true', help="keep the shared cache between runs")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="run only these benchmarks")
+    parser.add_argument('--save', metavar='FILE', help="store the results as a baseline")
+    parser.add_argument('--compare', metavar='FILE', help="fail on regressions against this baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown vs. baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    data_dir = os.path.abspath(args.data or os.path.join(
+        tempfile.gettempdir(), f"app123-bench-{args.scale}-{args.seed}"))
+    # Must be set before config.py is imported (it resolves the paths at import time)
+    os.environ["APP_DATA_DIR"] = data_dir
+    dataset = ensure_dataset(data_dir, args.scale, args.seed)
+
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+        session['username'] = 'bench'
+        session['role'] = 'admin'
+
+    counter = SqlCounter()
+    counter.install(app)
+    projects = sample_projects(app.config['DATABASE_PATH'], args.projects)
+    benchmarks = build_benchmarks(app, client, projects, args.time_entries_limit)
+    if args.only:
+        benchmarks = [(name, run) for name, run in benchmarks if name in args.only]
+
+    mode = "warm" if args.warm else "cold cache"
+    print(f"Dataset '{dataset['scale']}' (seed {dataset['seed']}) in {data_dir}; "
+          f"{args.requests} runs per benchmark, {mode}")
+    print(f"  {'benchmark':<26} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'queries':>8} {'sql ms':>8}"
+          f" {'bytes':>9} {'peak KB':>9}")
+    results = {}
+    for name, run in benchmarks:
+        r = results[name] = measure(name, run, counter, args.requests, args.warmup, args.warm)
+        print(f"  {name:<26} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} {r['mean_ms']:9.2f} {r['queries']:8g}"
+              f" {r['sql_ms']:8.2f} {r['bytes']:9d} {r['peak_kb']:9.1f}")
+    if resource is not None:
+        # ru_maxrss is in KB on Linux
+        print(f"  max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({"dataset": {k: dataset[k] for k in ("scale", "seed", "sizes")}, "warm": args.warm,
+                       "requests": args.requests, "results": results}, f, indent=2)
+        print(f"baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline["dataset"]["sizes"] != dataset["sizes"] or baseline.get("warm") != args.warm:
+            print("WARNING: baseline was recorded on a different dataset or cache mode")
+        failures = compare(results, baseline["results"], args.tolerance)
+        if failures:
+            for failure in failures:
+                print(f"FAIL: {failure}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Cold-start benchmark: a fresh interpreter imports the app, runs create_app()
+and load_plugins() and serves its first request (Flask test client).
+
+    python bench_startup.py [--runs 7] [--path /api/project_statuses]
+                            [--save bench_startup.json] [--compare bench_startup.json] [--tolerance 0.25]
+
+Each run is a separate process so nothing is warm. Prints the median and
+worst time per phase. --save stores the medians as a baseline; --compare
+exits with status 1 when the median total is more than --tolerance slower
+than the stored baseline. Use STARTUP_PROFILE=1 python run.py to see which
+step a regression comes from.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ('import_ms', 'create_app_ms', 'plugins_ms', 'first_request_ms', 'total_ms')
+
+
+def child(path):
+    started = time.perf_counter()
+    from app import create_app
+    from app.plugin_system import load_plugins
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    with app.app_context():
+        load_plugins(app)
+    plugins = time.perf_counter()
+    status = app.test_client().get(path).status_code
+    served = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "create_app_ms": (created - imported) * 1000,
+        "plugins_ms": (plugins - created) * 1000,
+        "first_request_ms": (served - plugins) * 1000,
+        "total_ms": (served - started) * 1000,
+        "status": status,
+    }))
+
+
+def run_once(path):
+    env = dict(os.environ)
+    env.pop("STARTUP_PROFILE", None)
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', path],
+                         capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{out.stderr}")
+    # create_app() may print schema/index messages first; the result is the last line
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start to first served request.")
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--path', default='/api/project_statuses', help="first request to serve")
+    parser.add_argument('--save', metavar='FILE', help="store the medians as a baseline")
+    parser.add_argument('--compare', metavar='FILE', help="fail if slower than this baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown vs. baseline (0.25 = 25%%)")
+    parser.add_argument('--child', metavar='PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    results = [run_once(args.path) for _ in range(args.runs)]
+    statuses = sorted({r["status"] for r in results})
+    medians = {phase: round(statistics.median(r[phase] for r in results), 1) for phase in PHASES}
+    print(f"{args.runs} cold starts, first request {args.path} -> HTTP {', '.join(map(str, statuses))}")
+    for phase in PHASES:
+        print(f"  {phase:<17} median {medians[phase]:8.1f}   max {max(r[phase] for r in results):8.1f}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({"path": args.path, "runs": args.runs, "medians": medians}, f, indent=2)
+        print(f"baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["medians"]
+        limit = baseline["total_ms"] * (1 + args.tolerance)
+        change = (medians["total_ms"] / baseline["total_ms"] - 1) * 100
+        print(f"total {medians['total_ms']:.1f} ms vs baseline {baseline['total_ms']:.1f} ms ({change:+.1f}%)")
+        if medians["total_ms"] > limit:
+            print(f"FAIL: more than {args.tolerance:.0%} slower than the baseline")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
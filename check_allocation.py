@@ -0,0 +1,67 @@
+"""
+Differential check: the numpy allocation path must find exactly the same
+shortages as the loop.
+
+    python check_allocation.py [--cases 500] [--seed 0]
+
+Generates random demand (few and many articles, decimal quantities such as
+0.1 or 2.35 whose sums round, stock that exactly covers a prefix of the
+queue, zero and missing stock, tied sort keys) and compares the short lines
+and allocated quantities of allocation._allocate_loop and _allocate_arrays
+with ==, i.e. bit for bit.
+"""
+import argparse
+import random
+import sys
+from array import array
+
+from app import allocation
+
+QUANTITIES = [1, 2, 5, 10, 0.1, 0.2, 0.3, 0.25, 2.35, 7.7, 1e-3, 1234.56]
+
+
+def random_case(rng, n_lines):
+    n_articles = rng.randint(1, max(1, n_lines // rng.choice([1, 3, 20])))
+    articles = array('l', [rng.randrange(n_articles) for _ in range(n_lines)])
+    needs = array('d', [rng.choice(QUANTITIES) * rng.randint(1, 40) for _ in range(n_lines)])
+    keys = [rng.randrange(rng.choice([1, 5, 1000])) for _ in range(n_lines)]
+    demand_of = [[] for _ in range(n_articles)]
+    for a, need in zip(articles, needs):
+        demand_of[a].append(need)
+    free = array('d', [0.0] * n_articles)
+    for a, demand in enumerate(demand_of):
+        kind = rng.random()
+        if kind < 0.3 and demand:
+            # Exactly the first k lines, summed in table order: lands on the rounding edge
+            free[a] = sum(demand[:rng.randint(1, len(demand))])
+        elif kind < 0.4:
+            free[a] = 0.0
+        else:
+            free[a] = rng.choice(QUANTITIES) * rng.randint(0, 200)
+    return free, articles, needs, keys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cases', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if allocation.np is None:
+        print("numpy is not installed; nothing to compare.")
+        return 1
+
+    rng = random.Random(args.seed)
+    for case in range(args.cases):
+        free, articles, needs, keys = random_case(rng, rng.choice([1, 2, 10, 100, 1000, 5000]))
+        expected = sorted(allocation._allocate_loop(array('d', free), articles, needs, keys))
+        actual = sorted(allocation._allocate_arrays(array('d', free), articles, needs, keys))
+        if actual != expected:
+            print(f"MISMATCH in case {case} (seed {args.seed}, {len(keys)} lines)")
+            return 1
+    print(f"OK: {args.cases} cases identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
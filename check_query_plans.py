@@ -0,0 +1,51 @@
+"""
+Audits the query plans of the hot queries on master_unified.db.
+
+    python check_query_plans.py [--db master_unified.db] [--apply] [--verbose]
+
+The queries come from the modules that run them (app.schema.hot_queries).
+--apply creates any missing indexes (and runs ANALYZE) first. Exits with
+status 1 if any hot query plans a SCAN its policy forbids or can't be
+planned at all (e.g. a column the code uses is missing from the database).
+"""
+import argparse
+import sqlite3
+import sys
+
+from config import DATABASE_PATH
+from app.schema import audit_query_plans, ensure_indexes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN audit of the hot queries.")
+    parser.add_argument('--db', default=DATABASE_PATH, help="path to master_unified.db")
+    parser.add_argument('--apply', action='store_true', help="create missing indexes and ANALYZE first")
+    parser.add_argument('--verbose', action='store_true', help="print every plan line")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        if args.apply:
+            created = ensure_indexes(conn)
+            print(f"created {len(created)} indexes{': ' + ', '.join(created) if created else ''}")
+        report = audit_query_plans(conn)
+    finally:
+        conn.close()
+
+    failed = 0
+    for entry in report:
+        if entry["skipped"]:
+            failed += 1
+            print(f"FAIL {entry['name']}: cannot be planned: {entry['skipped']}")
+            continue
+        status = "FAIL" if entry["scans"] else "ok  "
+        failed += bool(entry["scans"])
+        print(f"{status} {entry['name']}")
+        for detail in (entry["plan"] if args.verbose else entry["scans"]):
+            print(f"       {detail}")
+    print(f"{failed} of {len(report)} queries failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Differential check: the numpy time backend must return exactly the same
+totals as the loop implementation.
+
+    python check_time_backends.py [--cases 200] [--seed 0]
+
+Generates random worker-days (task switches, forgotten clock-outs, starts
+after 15:00, lunch gaps, unknown event types, empty DNIs, sub-second
+timestamps) and compares the results with ==, i.e. bit for bit.
+"""
+import argparse
+import datetime
+import random
+import sys
+
+from app import time_calculator, time_calculator_np
+
+EVENT_TYPES = ['start', 'Start ', 'Začetek', 'zacitek', 'stop', 'STOP', 'zaključi', 'konec', 'zakljuci', 'pause', None]
+
+
+def random_events(rng, n_events):
+    base = datetime.datetime(2025, 1, 6)
+    n_workers = rng.randint(1, 12)
+    n_days = rng.randint(1, 20)
+    dnis = [f"DNI{i:05d}" for i in range(rng.randint(1, 15))] + ['', None]
+    events = []
+    for _ in range(n_events):
+        when = base + datetime.timedelta(
+            days=rng.randrange(n_days),
+            seconds=rng.randrange(4 * 3600, 20 * 3600),
+            microseconds=rng.choice([0, 0, 0, rng.randrange(10**6)]),
+        )
+        worker = rng.randrange(n_workers)
+        events.append((worker, f"Worker {worker}", when, rng.choice(EVENT_TYPES), rng.choice(dnis)))
+    return tuple(events)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cases', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if not time_calculator_np.is_available():
+        print("numpy is not installed; nothing to compare.")
+        return 1
+
+    rng = random.Random(args.seed)
+    for case in range(args.cases):
+        events = random_events(rng, rng.choice([0, 1, 5, 50, 500, 5000]))
+        expected = time_calculator.calculate_actual_time_totals(events)
+        actual = time_calculator.calculate_actual_time_totals(events, backend='numpy')
+        if actual != expected:
+            print(f"MISMATCH in case {case} (seed {args.seed}, {len(events)} events)")
+            return 1
+    print(f"OK: {args.cases} cases identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,12 +2,32 @@ import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
-DATABASE_PATH = os.path.join(BASE_DIR, "master_unified.db")
+# APP_DATA_DIR points the databases, layout, cache and uploads at another
+# folder, e.g. a dataset from generate_dataset.py; defaults to this folder.
+DATA_DIR = os.path.abspath(os.environ.get("APP_DATA_DIR", BASE_DIR))
+
+DATABASE_PATH = os.path.join(DATA_DIR, "master_unified.db")
+VELIKA_MONTAZA_DB_PATH = os.path.join(DATA_DIR, "velika_montaza.db")
+# Derived from master_unified.db (see app/actual_hours.py); not part of the data version
+ACTUAL_HOURS_DB_PATH = os.path.join(DATA_DIR, "actual_hours.db")
 PLUGINS_DIR = os.path.join(BASE_DIR, "plugins")
-LAYOUT_JSON = os.path.join(BASE_DIR, "layout_data.json")
+LAYOUT_JSON = os.path.join(DATA_DIR, "layout_data.json")
+SHARED_CACHE_PATH = os.path.join(DATA_DIR, "shared_cache.db")
 
-UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+UPLOAD_FOLDER = os.path.join(DATA_DIR, "uploads")
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 SECRET_KEY = "super-secret-key-change-this"
+
+# Per-request timings, served by /api/admin/metrics (see app/metrics.py).
+# Requests slower than SLOW_REQUEST_MS are logged with their query plans; 0 disables the log.
+METRICS_ENABLED = True
+SLOW_REQUEST_MS = 1000
+
+# Open /api/events streams per process; None = no limit. An open stream holds a
+# server thread unless the server runs gevent, so by default there are none and
+# pages long-poll /api/events/poll instead; serve.py lifts the limit under gevent.
+SSE_MAX_STREAMS = 0
+# Seconds /api/events/poll waits for a change before answering "unchanged"
+EVENTS_POLL_WAIT = 1.0
@@ -0,0 +1,37 @@
+"""
+Builds a deterministic synthetic dataset for benchmarks and load tests.
+
+    python generate_dataset.py OUT_DIR [--scale tiny|small|medium|large] [--seed 0]
+                               [--projects N] [--work-orders-per-project N] [--components-per-work-order N]
+                               [--time-entries N] [--workers N] [--articles N] [--purchase-lines N]
+
+OUT_DIR receives master_unified.db (same tables and column types as
+SCHEMA_master_unified.txt, indexed like an imported snapshot),
+velika_montaza.db, layout_data.json and dataset.json describing the sizes.
+The same seed and sizes always produce the same rows.
+"""
+import argparse
+import sys
+
+from app.synthetic_data import SCALES, generate_dataset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic master_unified.db + velika_montaza.db.")
+    parser.add_argument('out_dir')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    for size in SCALES['small']:
+        parser.add_argument(f"--{size.replace('_', '-')}", dest=size, type=int, help=f"override {size}")
+    args = parser.parse_args(argv)
+
+    overrides = {size: getattr(args, size) for size in SCALES['small']}
+    summary = generate_dataset(args.out_dir, seed=args.seed, scale=args.scale, **overrides)
+    for table, rows in summary["rows"].items():
+        print(f"{table}: {rows} rows")
+    print(f"dataset '{summary['scale']}' (seed {summary['seed']}) written to {args.out_dir} in {summary['seconds']} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Imports an ERP export snapshot into master_unified.db.
+
+    python import_erp.py EXPORT_DIR [--db master_unified.db] [--encoding cp1250] [--delta]
+
+EXPORT_DIR holds one CSV per table: work_orders.csv, components.csv,
+time_entries.csv, purchase_orders.csv, inventory.csv (missing ones are
+kept from the current database). With --delta only changed rows are
+written, in place, and the affected projects are listed. Either way the
+cached responses (shared_cache.db) are invalidated and the materialized
+actual hours (actual_hours.db) refreshed afterwards; both are the files next
+to --db, i.e. those of the data directory the database belongs to.
+"""
+import argparse
+import os
+import sys
+
+from config import ACTUAL_HOURS_DB_PATH, DATABASE_PATH, SHARED_CACHE_PATH
+from app.actual_hours import refresh_actual_hours
+from app.erp_import import CHUNK_SIZE, import_delta, import_snapshot
+from app.shared_cache import SharedCache
+
+
+def data_dir_paths(db_path):
+    """(shared_cache.db, actual_hours.db) of the data directory db_path lives in; the app keeps them side by side."""
+    data_dir = os.path.dirname(os.path.abspath(db_path))
+    return (os.path.join(data_dir, os.path.basename(SHARED_CACHE_PATH)),
+            os.path.join(data_dir, os.path.basename(ACTUAL_HOURS_DB_PATH)))
+
+
+def invalidate_cache(db_path, *tags):
+    """Drops the tagged entries from the data directory's shared cache, if it has one."""
+    cache_path = data_dir_paths(db_path)[0]
+    if os.path.exists(cache_path):
+        SharedCache(cache_path).invalidate_tags(*tags)
+
+
+def refresh_hours(db_path):
+    """Brings the data directory's actual_hours.db up to date so the app's readers find it current."""
+    hours = refresh_actual_hours(database_path=db_path, db_path=data_dir_paths(db_path)[1])
+    if hours is not None:
+        print(f"actual hours: {hours['worker_days']} worker-days, {hours['dnis']} DNIs recalculated"
+              f"{' (full)' if hours['full'] else ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import an ERP snapshot and swap it in atomically.")
+    parser.add_argument('export_dir')
+    parser.add_argument('--db', default=DATABASE_PATH, help="path to master_unified.db")
+    parser.add_argument('--encoding', default='utf-8-sig')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--delta', action='store_true', help="apply only changed rows in place")
+    args = parser.parse_args(argv)
+
+    if args.delta:
+        summary = import_delta(args.export_dir, args.db, encoding=args.encoding, chunk_size=args.chunk_size)
+        for table, counts in summary["rows"].items():
+            print(f"{table}: {counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} deleted")
+        print(f"affected projects: {', '.join(summary['projects']) or '-'}")
+        invalidate_cache(args.db, *[f"project:{p}" for p in summary['projects']])
+        print(f"data version {summary['data_version']} after {summary['seconds']} s")
+        refresh_hours(args.db)
+        return 0
+
+    summary = import_snapshot(args.export_dir, args.db, encoding=args.encoding, chunk_size=args.chunk_size)
+    for table, rows in summary["rows"].items():
+        print(f"{table}: {rows} rows")
+    invalidate_cache(args.db, "erp")
+    print(f"data version {summary['data_version']} live after {summary['seconds']} s")
+    refresh_hours(args.db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function fetchApi(endpoint, options = {}, isJson = true) {
         if (!options.method || options.method.toUpperCase() === 'GET') {
-            options.cache = 'no-store';
+            options.cache = 'no-cache'; // revalidate with ETag, 304 when unchanged
         }
         try {
             const response = await fetch(endpoint, options);
@@ -394,14 +394,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
             const canModifyItem = isAdmin && (!item.owner || item.owner === currentUsername);
 
-            const workOrders = await fetchApi(`/api/project/${item.name}/work_orders`);
-
-            const [extraDetails, missingParts, arrivedParts, photos] = await Promise.all([
-                fetchApi(`/api/project/${item.name}/extra_details`),
-                fetchApi(`/api/project/${item.name}/missing_parts`), // Still fetch for count
-                fetchApi(`/api/project/${item.name}/arrived_parts`),
-                fetchApi(`/api/project/${item.name}/photos`)
-            ]);
+            // One pre-built document per project: work orders, parts, notes, photos, actual hours
+            const snapshot = await fetchApi(`/api/project/${item.name}/snapshot`);
+            const workOrders = snapshot.work_orders || [], photos = snapshot.photos || [];
+            const extraDetails = { notes: snapshot.notes || {} };
+            const missingParts = snapshot.parts.missing || [], arrivedParts = snapshot.parts.arrived || [];
 
             const isEleReady = item.electrification_status === 'Ready', isEleDone = !!item.electrification_completed_at;
             const isConReady = item.control_status === 'Ready', isConDone = !!item.control_completed_at;
@@ -427,7 +424,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             const photosHtml = photos.length > 0 ? photos.map(p => `
                 <div class="relative group">
-                    <img src="${p.url}" data-filename="${p.filename}" class="w-full h-20 object-cover rounded-md cursor-pointer">
+                    <img src="${p.url}" data-full="${p.medium_url || p.url}" data-filename="${p.filename}" loading="lazy" class="w-full h-20 object-cover rounded-md cursor-pointer">
                     ${canModifyItem ? `<button data-action="delete-photo" data-filename="${p.filename}" class="absolute top-1 right-1 bg-red-600 text-white rounded-full h-5 w-5 text-xs flex items-center justify-center opacity-0 group-hover:opacity-100 transition-opacity">&times;</button>` : ''}
                 </div>`).join('') : '<p class="text-xs text-gray-400 col-span-3">No photos uploaded.</p>';
 
@@ -497,11 +494,11 @@ document.addEventListener('DOMContentLoaded', () => {
                             <div class="mt-2 pt-2 border-t border-gray-700">
                                 ${partsStatusSummaryHtml}
                                 <div class="text-xs space-y-1 max-h-32 overflow-y-auto pr-2 mt-1">
-                                    ${missingParts.length > 0 ? missingParts.map(part => `<div class="truncate" title="${part.description} (${part.item_no})">- ${part.description} (${part.item_no})</div>`).join('') : '<p class="text-gray-400">No missing parts.</p>'}
+                                    ${missingParts.length > 0 ? missingParts.map(part => `<div class="truncate" title="${part.description} (${part.item_no})">- ${part.description} (${part.item_no})${part.eta ? ` <span class="text-gray-400">ETA ${part.eta.slice(0, 10)}</span>` : ''}</div>`).join('') : '<p class="text-gray-400">No missing parts.</p>'}
                                 </div>
                                 <h4 class="font-bold text-green-400 text-xs mb-1 mt-3">Arrived Parts (${arrivedParts.length})</h4>
                                 <div class="text-xs space-y-1 max-h-32 overflow-y-auto pr-2">
-                                    ${arrivedParts.length > 0 ? arrivedParts.map(part => `<div class="truncate" title="${part.part} (Loc: ${part.location})">- ${part.part} (Loc: ${part.location || 'N/A'})</div>`).join('') : '<p class="text-gray-400">No arrived parts.</p>'}
+                                    ${arrivedParts.length > 0 ? arrivedParts.map(part => `<div class="truncate" title="${part.description} (Loc: ${part.sifra_regala})">- ${part.description} (Loc: ${part.sifra_regala || 'N/A'})</div>`).join('') : '<p class="text-gray-400">No arrived parts.</p>'}
                                 </div>
                             </div>
                         </details>
@@ -579,7 +576,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const projectId = panelTitle.textContent;
 
             if (img && !button) {
-                fullscreenImage.src = img.src;
+                fullscreenImage.src = img.dataset.full || img.src;
                 imageViewerModal.classList.remove('hidden');
                 imageViewerModal.classList.add('flex');
                 return;
@@ -1074,7 +1071,7 @@ document.addEventListener('DOMContentLoaded', () => {
         window.addEventListener('resize', resizeCanvas);
         resizeCanvas();
         fetchAndDraw();
-        setInterval(fetchAndDraw, 10000); // Refresh data every 10 seconds
+        subscribeToChanges(fetchAndDraw, 10000); // Falls back to a 10 second refresh
     }
 
 });
\ No newline at end of file
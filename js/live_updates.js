@@ -0,0 +1,39 @@
+// Live updates shared by the dashboard (app.js) and planning.html:
+// refresh on server change events. The /api/events stream is used where the
+// server offers it (gevent, see serve.py); otherwise the page long-polls
+// /api/events/poll, which answers with the data version, and refreshes when it
+// moves. The full refresh every pollMs is only the fallback while neither works.
+const EVENTS_POLL_MS = 5000;
+
+function subscribeToChanges(onChange, pollMs) {
+    let pollTimer = null;
+    let pending = null;
+    const startPolling = () => { if (!pollTimer) pollTimer = setInterval(onChange, pollMs); };
+    const stopPolling = () => { clearInterval(pollTimer); pollTimer = null; };
+    const changed = () => {
+        // Coalesce bursts of events into a single refresh
+        clearTimeout(pending);
+        pending = setTimeout(onChange, 250);
+    };
+    let version = null;
+    const poll = () => {
+        fetch('/api/events/poll' + (version === null ? '' : '?version=' + encodeURIComponent(version)))
+            .then(response => response.ok ? response.json() : Promise.reject(response.status))
+            .then(body => {
+                stopPolling();
+                if (body.changed) changed();
+                version = body.version;
+            })
+            .catch(() => startPolling())
+            .finally(() => setTimeout(poll, EVENTS_POLL_MS));
+    };
+    if (!window.EventSource) { poll(); return; }
+    const source = new EventSource('/api/events');
+    source.onopen = stopPolling;
+    source.onerror = () => {
+        // Refused (the server serves no streams or its limit is reached): long-poll instead
+        if (source.readyState === EventSource.CLOSED) { poll(); return; }
+        startPolling(); // EventSource keeps reconnecting on its own
+    };
+    source.addEventListener('change', changed);
+}
@@ -0,0 +1,47 @@
+"""
+Recomputes actual-time totals for the whole plant on all cores.
+
+    python recompute_times.py [--processes 16] [--shard worker|date]
+                              [--start 2025-01-01] [--end 2025-12-31] [--output totals.json]
+
+--shard worker (the default) gives exactly the single-process totals.
+--shard date is approximate: worker-days with an entry crossing midnight at
+a shard border can come out differently (see app/time_batch.py).
+"""
+import argparse
+import datetime
+import json
+import sys
+
+from config import DATABASE_PATH
+from app.time_batch import recompute_totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute actual-time totals in parallel.")
+    parser.add_argument('--db', default=DATABASE_PATH, help="path to master_unified.db")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--shard', choices=('worker', 'date'), default='worker',
+                        help="worker: exact (default); date: approximate at shard borders")
+    parser.add_argument('--start', type=datetime.date.fromisoformat, default=None)
+    parser.add_argument('--end', type=datetime.date.fromisoformat, default=None)
+    parser.add_argument('--output', help="write {dni: seconds, workers: {...}} as JSON")
+    args = parser.parse_args(argv)
+
+    dni_totals, worker_totals, stats = recompute_totals(
+        args.db, processes=args.processes, shard_by=args.shard, start_date=args.start, end_date=args.end)
+
+    print(f"{stats['events']} events in {stats['seconds']} s "
+          f"({stats['events_per_second']} events/s, {stats['shards']} shards on {stats['processes']} processes)")
+    print(f"{len(dni_totals)} DNIs, {len(worker_totals)} workers")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"dni": dni_totals,
+                       "workers": {str(w): d for w, d in worker_totals.items()},
+                       "stats": stats}, f, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
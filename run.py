@@ -1,4 +1,11 @@
-from app import create_app
+import os
+import sys
+
+if __name__ == "__main__" and "--profile-startup" in sys.argv[1:]:
+    # Same as STARTUP_PROFILE=1: print import/init time per module, blueprint and plugin
+    os.environ["STARTUP_PROFILE"] = "1"
+
+from app import create_app, startup_profile
 from app.plugin_system import load_plugins
 
 app = create_app()
@@ -6,5 +13,8 @@ app = create_app()
 with app.app_context():
     load_plugins(app)
 
+startup_profile.report()
+
 if __name__ == "__main__":
+    # Development server; serve.py runs the preloaded multi-worker setup
     app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
@@ -0,0 +1,228 @@
+"""
+Production server: loads the app and plugins once, then serves them from
+several worker processes (gunicorn) or, without gunicorn, from a bounded
+thread pool.
+
+    python serve.py [--bind 0.0.0.0:5000] [--workers 4] [--worker-class gevent|gthread|sync]
+                    [--threads 8] [--worker-connections 200] [--timeout 60] [--graceful-timeout 30]
+                    [--keep-alive 5] [--max-requests 0] [--backlog 2048] [--max-streams N] [--access-log]
+    python serve.py --server threaded [--threads 32] ...
+
+run.py stays the development server (debug, one process).
+
+gunicorn: the app is created, the plugins loaded and the modules the views
+import on first use (models, time calculation) imported in the master before
+it forks, then the garbage collector is frozen so workers share all of it
+copy-on-write instead of each importing it again. After the fork every
+worker drops the database connections it inherited. The default worker
+class is gevent when installed (an idle /api/events stream is a greenlet,
+see events.py), otherwise gthread.
+
+Event streams: without gevent every open /api/events stream would hold a
+thread for as long as the page is open, so only the gevent worker class
+serves them (limited by --worker-connections alone). Elsewhere pages
+long-poll /api/events/poll, which holds a thread for EVENTS_POLL_WAIT at
+most (js/live_updates.js). --max-streams N allows N streams per process
+anyway, e.g. with a large --threads.
+
+Workers share the shared cache and the databases, so a write in one worker
+reaches the others: tag invalidation happens in shared_cache.db, and the
+data version behind ETags and SSE 'data' events is computed from the
+database and layout file stamps alone, so every worker answers the same
+ETag for the same data. Metrics (/api/admin/metrics) are per worker.
+
+--server threaded (the default where gunicorn can't run, e.g. Windows) is
+a single process with at most --threads open connections (a keep-alive
+connection holds its thread until it has been idle for --keep-alive
+seconds); further connections wait in the listen backlog. --timeout does
+not apply there.
+"""
+import argparse
+import os
+import sys
+
+LAZY_MODULES = ('app.models', 'app.time_calculator', 'app.actual_hours', 'app.allocation')
+
+
+def _installed(module):
+    import importlib.util
+    return importlib.util.find_spec(module) is not None
+
+
+def parse_args(argv=None):
+    can_fork = hasattr(os, 'fork') and _installed('gunicorn')
+    parser = argparse.ArgumentParser(description="Serve the app with preloaded multi-worker processes.")
+    parser.add_argument('--server', choices=('gunicorn', 'threaded'), default='gunicorn' if can_fork else 'threaded')
+    parser.add_argument('--bind', default='0.0.0.0:5000', help="HOST:PORT")
+    parser.add_argument('--workers', type=int, default=max(2, min(os.cpu_count() or 1, 8)),
+                        help="worker processes (gunicorn)")
+    parser.add_argument('--worker-class', choices=('gevent', 'gthread', 'sync'),
+                        default='gevent' if _installed('gevent') else 'gthread')
+    parser.add_argument('--threads', type=int, default=None,
+                        help="threads per worker (gthread, default 8) or in total (threaded, default 32)")
+    parser.add_argument('--worker-connections', type=int, default=200,
+                        help="concurrent connections per gevent worker")
+    parser.add_argument('--timeout', type=int, default=60,
+                        help="seconds a worker may stay silent before it is restarted (gunicorn)")
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help="seconds to finish running requests on restart/shutdown (gunicorn)")
+    parser.add_argument('--keep-alive', type=int, default=5, help="seconds an idle keep-alive connection stays open")
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help="restart a worker after this many requests, 0 = never (gunicorn)")
+    parser.add_argument('--backlog', type=int, default=2048, help="pending connections the socket queues")
+    parser.add_argument('--max-streams', type=int, default=None,
+                        help="open /api/events streams per process (default: none; no limit with gevent)")
+    parser.add_argument('--access-log', action='store_true', help="log every request to stdout")
+    return parser.parse_args(argv)
+
+
+def load(warm=True):
+    """The app with plugins loaded; warm=True also imports what the views would load on first use."""
+    import importlib
+    from app import create_app, startup_profile
+    from app.plugin_system import load_plugins
+
+    app = create_app()
+    with app.app_context():
+        load_plugins(app)
+        if warm:
+            with startup_profile.step("init", "preload lazy modules"):
+                for name in LAZY_MODULES:
+                    importlib.import_module(name)
+    startup_profile.report()
+    return app
+
+
+def stream_limit(args):
+    """Open event streams allowed per process; None = no limit."""
+    if args.max_streams is not None:
+        return args.max_streams
+    if args.server == 'gunicorn' and args.worker_class == 'gevent':
+        return None
+    return 0  # a stream would hold a thread; pages long-poll instead
+
+
+def release_connections(app):
+    """Closes pooled sqlite connections and SQLAlchemy pools; they must never cross a fork."""
+    from app.db import close_all_connections
+    from app.extensions import db
+    close_all_connections()
+    if db.loaded:
+        with app.app_context():
+            for engine in db.engines.values():
+                # close=False: the parent's connections belong to the parent
+                engine.dispose(close=False)
+
+
+# --- 1. GUNICORN ---
+def serve_gunicorn(app, args):
+    import gc
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        release_connections(app)
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': args.worker_class,
+        'threads': (args.threads or 8) if args.worker_class == 'gthread' else 1,
+        'worker_connections': args.worker_connections,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': args.keep_alive,
+        'max_requests': args.max_requests,
+        # Spread restarts so all workers don't recycle at once
+        'max_requests_jitter': args.max_requests // 10,
+        'backlog': args.backlog,
+        'accesslog': '-' if args.access_log else None,
+        'post_fork': post_fork,
+    }
+
+    class PreloadedApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    release_connections(app)
+    # Everything allocated so far is shared with the workers; keep the collector
+    # from writing to those pages (and thereby copying them) in every worker
+    gc.collect()
+    gc.freeze()
+    print(f"Serving on {args.bind}: {args.workers} {args.worker_class} workers")
+    PreloadedApplication().run()
+
+
+# --- 2. THREADED FALLBACK ---
+def serve_threaded(app, args):
+    import threading
+    from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+    max_threads = args.threads or 32
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+        timeout = args.keep_alive  # idle connections are closed after this many seconds
+
+        def log_request(self, *a, **kw):
+            if args.access_log:
+                super().log_request(*a, **kw)
+
+    class BoundedThreadedWSGIServer(ThreadedWSGIServer):
+        """One thread per connection, at most max_threads at a time; the accept loop waits for a free slot."""
+        request_queue_size = args.backlog
+
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self._slots = threading.BoundedSemaphore(max_threads)
+
+        def process_request(self, request, client_address):
+            self._slots.acquire()
+            try:
+                super().process_request(request, client_address)
+            except BaseException:
+                self._slots.release()
+                raise
+
+        def process_request_thread(self, request, client_address):
+            try:
+                super().process_request_thread(request, client_address)
+            finally:
+                self._slots.release()
+
+    host, _, port = args.bind.rpartition(':')
+    server = BoundedThreadedWSGIServer(host or '0.0.0.0', int(port), app, handler=KeepAliveHandler)
+    print(f"Serving on {args.bind}: 1 process, up to {max_threads} concurrent connections")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.server == 'gunicorn' and args.worker_class == 'gevent':
+        # Must precede every other import: the app's locks and sockets are created
+        # in the master and inherited by the workers, so they have to be gevent's
+        from gevent import monkey
+        monkey.patch_all()
+    app = load()
+    app.config['SSE_MAX_STREAMS'] = stream_limit(args)
+    if app.config['SSE_MAX_STREAMS'] == 0:
+        print("Event streams: off, pages long-poll /api/events/poll (install gevent to serve streams)")
+    elif app.config['SSE_MAX_STREAMS'] is not None:
+        print(f"Event streams: at most {app.config['SSE_MAX_STREAMS']} per process")
+    if args.server == 'gunicorn':
+        serve_gunicorn(app, args)
+    else:
+        serve_threaded(app, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())